@@ -0,0 +1,68 @@
+"""Decode JSON response bodies straight into Arrow backed dataframes. Requires pyarrow.
+
+The default client path builds Python dicts with `response.json()` and converts them with
+`pd.DataFrame(...)`, materializing every payload twice. Here the body bytes are parsed by
+pyarrow's columnar JSON reader into an Arrow table, which pandas then wraps without a copy
+(every column has a pd.ArrowDtype). pd.concat of such frames chains the Arrow chunks instead
+of copying them, so stitching pages together stays cheap.
+
+    TellusClient(key, use_arrow=True)     # and LicorClient, HoboLinkClient and their async versions
+
+Time columns are kept as strings, so they are converted exactly as on the default path.
+A body the reader cannot handle (e.g. a column mixing numbers and strings) falls back to
+the default path.
+"""
+import io, json, logging
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pajson
+
+logger = logging.getLogger(__name__)
+
+STRING_COLS = ("timestamp",)  # left for pd.to_datetime, which keeps timezone information as the default path does
+
+
+def read_records(body: bytes, key: str | None = None, string_cols: tuple[str, ...] = STRING_COLS) -> pa.Table:
+    """Parse a JSON list of records into an Arrow table.
+
+    :param body: response body. either a list of records, or an object holding one under key
+    :param key: field of the object holding the records. None when the body is the list itself
+    :param string_cols: record fields read as strings rather than inferred
+    """
+    if key is None:
+        key = "records"
+        body = b'{"records":' + body + b"}"  # the reader expects objects, one per line
+
+    # the whole body is a single line, read as one block
+    document = body.replace(b"\n", b" ").replace(b"\r", b" ")
+    explicit = pa.schema([(key, pa.list_(pa.struct([(col, pa.string()) for col in string_cols])))])
+    table = pajson.read_json(
+        io.BytesIO(document),
+        read_options=pajson.ReadOptions(block_size=len(document) + 1),
+        parse_options=pajson.ParseOptions(explicit_schema=explicit, unexpected_field_behavior="infer"),
+    )
+
+    records = pc.list_flatten(table.column(key))
+    if pa.types.is_null(records.type):  # empty list
+        return pa.table({})
+    batches = [pa.RecordBatch.from_struct_array(chunk) for chunk in records.chunks]
+    table = pa.Table.from_batches(batches)
+    absent = [col for col in string_cols if table.column(col).null_count == table.num_rows]  # only added by the explicit schema
+    return table.drop_columns(absent)
+
+
+def records_frame(body: bytes, key: str | None = None, string_cols: tuple[str, ...] = STRING_COLS) -> pd.DataFrame:
+    """Parse a JSON list of records into a dataframe with Arrow backed columns.
+
+    Parameters as in read_records. Falls back to json.loads and pd.DataFrame when pyarrow cannot
+    read the body.
+    """
+    try:
+        table = read_records(body, key, string_cols)
+    except pa.ArrowInvalid as error:
+        logger.debug(f"Arrow JSON reader failed, using the default decoder: {error}")
+        parsed = json.loads(body)
+        return pd.DataFrame(parsed if key is None else parsed[key])
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
@@ -0,0 +1,331 @@
+import asyncio, datetime, json, logging, sys, time
+
+import aiohttp
+import pandas as pd
+
+from hobolink import HoboLinkClient
+import rate_limit
+from instrumentation import emit, timed_decode
+from stitching import stitch
+from licor import LicorClient
+from sensecap import SenseCAPClient
+from tellus import TellusClient
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncResponse:
+    """Minimal stand-in for `requests.Response` holding an already read body."""
+
+    def __init__(self, status_code: int, body: bytes, headers=None) -> None:
+        self.status_code = status_code
+        self.content = body
+        self.headers = headers or {}
+
+    @property
+    def text(self) -> str:
+        return self.content.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncServicePool:
+    """Shared HTTP sessions and concurrency limits, one of each per service.
+
+    Use as an async context manager so that connections are closed on exit:
+
+        async with AsyncServicePool() as pool:
+            tellus = AsyncTellusClient(TELLUS_KEY, pool)
+    """
+    DEFAULT_LIMITS = {"tellus": 4, "licor": 4, "hobolink": 2, "sensecap": 4}
+
+    def __init__(self, limits: dict[str, int] | None = None) -> None:
+        """
+        :param limits: maximum concurrent requests per service, overriding DEFAULT_LIMITS
+        """
+        self.limits = {**self.DEFAULT_LIMITS, **(limits or {})}
+        self._sessions = {}
+        self._semaphores = {}
+        self._in_flight = rate_limit.AsyncInFlight()
+
+    async def __aenter__(self) -> "AsyncServicePool":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+    def _session(self, service: str) -> aiohttp.ClientSession:
+        if service not in self._sessions:
+            connector = aiohttp.TCPConnector(limit=self.limits[service])
+            self._sessions[service] = aiohttp.ClientSession(connector=connector)
+            self._semaphores[service] = asyncio.Semaphore(self.limits[service])
+        return self._sessions[service]
+
+    async def request(self, service: str, method: str, url: str, params: dict | None = None, split_depth: int = 0, **kwargs) -> AsyncResponse:
+        """Make a request through the service's session once a slot is available.
+
+        Requests share the service's rate limit with the synchronous clients and are retried when
+        throttled (429). An identical GET already in flight is shared instead of sent again.
+
+        :param service: "tellus", "licor", "hobolink" or "sensecap"
+        :param method: HTTP method
+        :param url: full request url
+        :param params: query parameters. values are converted to strings as aiohttp requires
+        :param split_depth: how many times the requested range has been split. reported to instrumentation
+
+        :return: response with the body read
+        """
+        if params is not None:
+            params = {key: str(value) for key, value in params.items()}
+        endpoint = url.rsplit("/", 1)[-1]
+        output, shared = await self._in_flight.run(rate_limit.request_key(method, url, params=params, **kwargs),
+                                                   lambda: self._send(service, method, url, endpoint, params, split_depth, kwargs))
+        if shared:
+            emit("coalesced", service, endpoint=endpoint, split_depth=split_depth)
+        return output
+
+    async def _send(self, service: str, method: str, url: str, endpoint: str, params: dict | None, split_depth: int, kwargs: dict) -> AsyncResponse:
+        session = self._session(service)
+        for attempt in range(rate_limit.MAX_THROTTLE_RETRIES + 1):
+            async with self._semaphores[service]:
+                bucket = rate_limit.bucket(service)
+                waited = bucket.reserve() if bucket else 0
+                if waited:
+                    emit("rate_limited", service, endpoint=endpoint, seconds=waited)
+                    await asyncio.sleep(waited)
+
+                emit("request_start", service, endpoint=endpoint, split_depth=split_depth)
+                start = time.perf_counter()
+                async with session.request(method, url, params=params, **kwargs) as response:
+                    output = AsyncResponse(response.status, await response.read(), response.headers)
+                emit("request_end", service, endpoint=endpoint, split_depth=split_depth, status=output.status_code,
+                     seconds=time.perf_counter() - start, bytes=len(output.content))
+
+            if output.status_code != 429 or attempt == rate_limit.MAX_THROTTLE_RETRIES:
+                return output
+            delay = rate_limit.retry_after(output)
+            logger.warning(f"{service} throttled the request (429). Retrying in {delay:g}s...")
+            if bucket: bucket.pause(delay)
+            else: await asyncio.sleep(delay)
+
+
+class AsyncTellusClient(TellusClient):
+    """Asynchronous counterpart of TellusClient. Network methods are coroutines."""
+
+    def __init__(self, api_key, pool: AsyncServicePool, use_arrow: bool = False) -> None:
+        super().__init__(api_key, use_arrow=use_arrow)
+        self.pool = pool
+
+    async def _get(self, endpoint: str, payload: dict, split_depth: int = 0) -> AsyncResponse:
+        return await self.pool.request("tellus", "GET", f"{self.BASE_URL}/{endpoint}", params=payload, split_depth=split_depth, headers=self.HEADER)
+
+    async def retrieve_data(self, start_time: str, end_time: str, devices: list, metrics: list, long_format: bool=True) -> pd.DataFrame:
+        """See TellusClient.retrieve_data"""
+        api_output = await self._retrieve_data(start_time, end_time, devices, metrics)
+        return self._format_output(api_output, start_time, metrics, long_format)
+
+    async def _retrieve_data(self, start_time: str, end_time: str, devices: list, metrics: list, split_depth: int = 0) -> pd.DataFrame:
+        """See TellusClient._retrieve_data. Sub requests of a split are retrieved concurrently."""
+        payload = self._data_payload(start_time, end_time, devices, metrics)
+
+        sub_requests = self._plan_ahead(start_time, end_time, devices, metrics)
+        if sub_requests:
+            logger.info(f"TELLUS data pull is expected to be too large for {start_time} to {end_time}. Splitting into {len(sub_requests)} requests...")
+            emit("split", "tellus", split_depth=split_depth + 1, reason="planned", parts=len(sub_requests))
+            return await self._retrieve_split(sub_requests, split_depth)
+
+        logger.info(f"Retrieving TELLUS Data from {start_time} to {end_time}...")
+        response = await self._get("data", payload, split_depth)
+
+        if response.status_code == 200:
+            data = timed_decode("tellus", lambda: self._decode_data(response))
+            logger.info(f"Success: Retrieved {data.shape[0]} records from {start_time} to {end_time}")
+            self._learn(data, start_time, end_time)
+            return data
+
+        elif response.status_code == 403:
+            logger.warning(response.json()['detail'])
+            return pd.DataFrame()
+
+        elif response.status_code == 413:
+            sub_requests = self._plan_split(start_time, end_time, devices, metrics)
+            logger.warning(f"TELLUS data pull is too large (413 error) for {start_time} to {end_time}. Splitting into {len(sub_requests)} requests...")
+            emit("split", "tellus", split_depth=split_depth + 1, reason="413", parts=len(sub_requests))
+            return await self._retrieve_split(sub_requests, split_depth)
+        else:
+            logger.error(f"{response.status_code}: {response.json()['detail']}")
+            sys.exit(1)
+
+    async def _retrieve_split(self, sub_requests: list[tuple[list, list, str, str]], split_depth: int) -> pd.DataFrame:
+        """See TellusClient._retrieve_split. Sub requests are retrieved concurrently."""
+        results = await asyncio.gather(*(
+            self._retrieve_data(sub_start, sub_end, sub_devices, sub_metrics, split_depth + 1)
+            for sub_devices, sub_metrics, sub_start, sub_end in sub_requests
+        ))
+        combined_data = self._combine_split([(sub_request[1], data) for sub_request, data in zip(sub_requests, results)])
+        logger.info(f"Successfully combined data: {combined_data.shape[0]} total records")
+        return combined_data
+
+    async def retrieve_device_metrics(self, device_id: str) -> dict:
+        """See TellusClient.retrieve_device_metrics"""
+        response = await self._get("schema", {"key": self.api_key, "deviceId": device_id})
+
+        if response.status_code == 200:
+            return self._parse_schema(response.json())
+
+        elif response.status_code == 403:
+            logger.warning(response.json()['msg'])
+
+        else:
+            logger.error(f"{response.status_code}: {response.json()['msg']}")
+            sys.exit(1)
+
+    async def retrieve_raw_request_data(self, device_ids: list[str], endpoint: str="data", metrics: list[str]=[],
+                                        start_time: str="", end_time: str="") -> tuple[AsyncResponse, dict]:
+        """See TellusClient.retrieve_raw_request_data"""
+        payload = {
+            "key": self.api_key,
+            "deviceId": ",".join(device_ids)
+        }
+        if metrics != []: payload["metric"] = ",".join(metrics)
+        if start_time != str():
+            payload["start"] = start_time
+            payload["end"] = end_time or pd.Timestamp.now().isoformat()
+
+        return await self._get(endpoint, payload), payload
+
+
+class AsyncLicorClient(LicorClient):
+    """Asynchronous counterpart of LicorClient. Network methods are coroutines."""
+
+    def __init__(self, api_key: str, pool: AsyncServicePool, logging_interval: float = 60, use_arrow: bool = False) -> None:
+        super().__init__(api_key, logging_interval=logging_interval, use_arrow=use_arrow)
+        self.pool = pool
+
+    async def retrieve_data(self, start_time: str, end_time: str, devices: list[str]) -> pd.DataFrame:
+        """See LicorClient.retrieve_data"""
+        window = (datetime.datetime.fromisoformat(start_time), datetime.datetime.fromisoformat(end_time), devices)
+        frames = await self._retrieve_windows([window])
+        if len(frames) > 1:
+            combined_df = self._stitch(frames)
+            logger.info(f"Successfully combined data: {combined_df.shape[0]} total records")
+            return combined_df
+        return frames[0]
+
+    async def _retrieve_windows(self, windows: list, split_depth: int = 0) -> list[pd.DataFrame]:
+        """See LicorClient._retrieve_windows. Concurrency is bounded by the pool's LICOR limit."""
+        responses = await asyncio.gather(*(self._request(*window, split_depth) for window in windows))
+
+        frames = []
+        for window, df in zip(windows, responses):
+            sub_windows = self._replan(window, df, split_depth)
+            if sub_windows: frames.extend(await self._retrieve_windows(sub_windows, split_depth + 1))
+            else: frames.append(df)
+        return frames
+
+    async def _request(self, dt_start, dt_end, devices: list[str], split_depth: int = 0) -> pd.DataFrame:
+        header, payload = self._request_args(dt_start, dt_end, devices)
+
+        logger.info(f"Retrieving LICOR Data from {payload['start_date_time']} to {payload['end_date_time']}...")
+        response = await self.pool.request("licor", "GET", self.BASE_URL, params=payload, split_depth=split_depth, headers=header)
+        return self._handle_response(response)
+
+
+class AsyncHoboLinkClient(HoboLinkClient):
+    """Asynchronous counterpart of HoboLinkClient. Network methods are coroutines."""
+
+    def __init__(self, client_id: str, client_secret: str, user_id: str, pool: AsyncServicePool, use_arrow: bool = False) -> None:
+        super().__init__(client_id, client_secret, user_id, use_arrow=use_arrow)
+        self.pool = pool
+
+    async def _get_auth_token(self) -> str:
+        """See HoboLinkClient._get_auth_token"""
+        token_response = await self.pool.request(
+            "hobolink", "POST", self.AUTH_SERVER,
+            data=self.TOKEN_PAYLOAD,
+            ssl=False,
+            allow_redirects=False,
+            auth=aiohttp.BasicAuth(self.client_id, self.client_secret),
+        )
+
+        if token_response.status_code != 200:
+            logger.error("Failed to obtain token from the OAuth 2.0 server")
+            sys.exit(1)
+
+        return token_response.json()['access_token']
+
+    async def retrieve_data(self, start_time: str, end_time: str, logger_sn: str) -> pd.DataFrame:
+        """See HoboLinkClient.retrieve_data"""
+        return await self._retrieve_data(start_time, end_time, logger_sn)
+
+    async def _retrieve_data(self, start_time: str, end_time: str, logger_sn: str, split_depth: int = 0) -> pd.DataFrame:
+        endpoint, payload = self._request_args(start_time, end_time, logger_sn)
+        header = {
+            'Authorization': 'Bearer ' + await self._get_auth_token()
+        }
+
+        logger.info(f"Retrieving HoboLINK Data from {payload['start_date_time']} to {payload['end_date_time']}...")
+        response = await self.pool.request("hobolink", "GET", endpoint, params=payload, split_depth=split_depth, headers=header)
+
+        if response.status_code == 200:
+            data = timed_decode("hobolink", lambda: self._decode_observations(response))
+            logger.info(f"Success: Retrieved {data.shape[0]} records from {payload['start_date_time']} to {payload['end_date_time']}")
+
+            if data.shape[0] == self.RECORD_CAP:
+                logger.warning(f"HoboLINK record cap reached ({self.RECORD_CAP:,} records) for {payload['start_date_time']} to {payload['end_date_time']}. Splitting range...")
+                emit("split", "hobolink", split_depth=split_depth + 1, reason="record cap", parts=2)
+                remaining_data = await self._retrieve_data(self._next_start(data, start_time), end_time, logger_sn, split_depth + 1)
+                data = stitch([data, remaining_data], self.KEY_COLS)
+                logger.info(f"Successfully combined data: {data.shape[0]} total records")
+
+            return data
+        else:
+            self._report_error(response.status_code, response.json())
+
+
+class AsyncSenseCAPClient(SenseCAPClient):
+    """Asynchronous counterpart of SenseCAPClient. Network methods are coroutines."""
+
+    def __init__(self, api_id: str, api_key: str, pool: AsyncServicePool) -> None:
+        super().__init__(api_id, api_key)
+        self.pool = pool
+        self.basic_auth = aiohttp.BasicAuth(api_id, api_key)
+
+    async def _get(self, endpoint: str, params: dict | None = {}) -> dict:
+        response = await self.retrieve_raw_request_data(endpoint, params)
+        if response.status_code >= 400:
+            raise RuntimeError(f"SenseCAP HTTP error: {response.status_code} for {endpoint}")
+        return self._check_payload(response.json())
+
+    async def retrieve_device_ids(self) -> dict[str, str]:
+        return self._parse_device_ids(await self._get("device/list_euis"))
+
+    async def latest_data_point(self, device_id, channel_index="", measurement_id=""):
+        payload = self._latest_payload(device_id, channel_index, measurement_id)
+        return self._parse_latest((await self._get("view_latest_telemetry_data", payload))["data"])
+
+    async def get_historic_data(self, device_id, time_start="", time_end="", channel_index="", sensor_id="", record_limit=0):
+        """See SenseCAPClient.get_historic_data"""
+        payload = self._historic_payload(device_id, time_start, time_end, channel_index, sensor_id, record_limit)
+        response = await self._get("list_telemetry_data", payload)
+        return timed_decode("sensecap", lambda: self._parse_historic(response["data"]["list"]))
+
+    async def get_aggregate_data(self, device_id, time_start="", time_end="", channel_index="", sensor_id="", interval=0):
+        """See SenseCAPClient.get_aggregate_data"""
+        payload = self._aggregate_payload(device_id, time_start, time_end, channel_index, sensor_id, interval)
+        response = await self._get("aggregate_chart_points", payload)
+        return timed_decode("sensecap", lambda: self._parse_aggregate(response["data"]))
+
+    async def list_device_channels(self, device_eui: str) -> list[dict]:
+        return self._parse_channels(await self._get(f"channel/list/{device_eui}"))
+
+    async def retrieve_raw_request_data(self, endpoint: str, payload: dict | None = None) -> AsyncResponse:
+        """See SenseCAPClient.retrieve_raw_request_data"""
+        url = f"{self.BASE_URL}/{endpoint}"
+        return await self.pool.request("sensecap", "GET", url, params=payload or {}, auth=self.basic_auth)
@@ -0,0 +1,74 @@
+"""Startup cost of the modules used by short scheduled jobs.
+
+Each module is imported in a fresh interpreter, so timings include every dependency it pulls
+in. A module fails when its import takes longer than its budget, or when it loads one of the
+optional heavy dependencies (plotting, scipy, dotenv, aiohttp) that should only be imported
+where they are used.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 10 --scale 1.5
+
+Exits with status 1 when any module fails.
+"""
+import argparse, json, statistics, subprocess, sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# module: import budget in seconds. pandas alone takes most of each budget
+BUDGETS = {
+    "fetch_and_store": 0.15,
+    "instrumentation": 0.4,
+    "tellus": 1.0,
+    "licor": 1.0,
+    "hobolink": 1.0,
+    "sensecap": 1.0,
+    "ingest_daemon": 1.0,
+    "combo": 1.2,
+}
+HEAVY_MODULES = ["matplotlib", "seaborn", "scipy", "dotenv", "aiohttp"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat: int) -> dict:
+    """Median import time over fresh interpreters, and the heavy modules the import loaded."""
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                   cwd=REPO_DIR, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {"module": module, "error": completed.stderr.strip().splitlines()[-1]}
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {"module": module, "seconds": statistics.median(run["seconds"] for run in runs), "heavy": runs[0]["heavy"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", choices=sorted(BUDGETS), default=list(BUDGETS))
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module. the median is reported")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier applied to every budget, for slower machines")
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'module':<18}{'import ms':>10}{'budget ms':>10}  status")
+    for module in args.modules:
+        result = measure(module, args.repeat)
+        budget = BUDGETS[module] * args.scale
+        if "error" in result:
+            status = f"SKIPPED ({result['error']})"
+            print(f"{module:<18}{'-':>10}{budget * 1000:>10.0f}  {status}")
+            continue
+        problems = []
+        if result["seconds"] > budget: problems.append("over budget")
+        if result["heavy"]: problems.append("loads " + ", ".join(result["heavy"]))
+        failures += bool(problems)
+        print(f"{module:<18}{result['seconds'] * 1000:>10.0f}{budget * 1000:>10.0f}  {'; '.join(problems) or 'ok'}")
+
+    sys.exit(1 if failures else 0)
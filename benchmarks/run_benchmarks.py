@@ -0,0 +1,278 @@
+"""Benchmarks for the retrieval and processing hot paths.
+
+Each case builds a synthetic dataset of the requested size, then times the operation and
+records its peak traced memory. Fetch cases run against the local stand-in server in
+mock_server.py, started in its own process, so no credentials or network access are needed.
+
+    python benchmarks/run_benchmarks.py --sizes 1e4 1e5 1e6
+    python benchmarks/run_benchmarks.py --save-baseline
+    python benchmarks/run_benchmarks.py --compare
+
+Comparing against a saved baseline exits with status 1 when any case is slower than the
+baseline by more than the tolerance.
+"""
+import argparse, contextlib, json, logging, socket, subprocess, sys, time, tracemalloc
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(REPO_DIR / "workflows"))
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+BENCHMARKS = {}
+
+
+def benchmark(name: str, max_rows: int | None = None):
+    """Register a benchmark case.
+
+    The decorated function receives the row count and returns a zero-argument callable
+    performing the timed work. Setup done before returning is not timed.
+
+    :param name: case name used in reports and baselines
+    :param max_rows: largest size the case is run at. used for operations that scale poorly
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, max_rows)
+        return setup
+    return register
+
+
+### SYNTHETIC DATA ###
+def synthetic_wide(rows: int, metrics: list[str]) -> pd.DataFrame:
+    """Tellus style wide output with one column per metric."""
+    devices = 4
+    per_device = max(1, rows // devices)
+    times = pd.date_range("2025-01-01", periods=per_device, freq="1min", tz="UTC")
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        "timestamp": np.tile(times, devices),
+        "deviceId": np.repeat([f"DEVICE{i}" for i in range(devices)], per_device),
+        "longitude": -86.24,
+        "latitude": 41.70,
+        "nickname": "bench",
+    })
+    for metric in metrics:
+        data[metric] = rng.normal(20, 5, data.shape[0])
+    return data
+
+
+def synthetic_signal(rows: int) -> pd.Series:
+    """Picarro style methane signal sampled every 6 seconds."""
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2025-09-15", periods=rows, freq="6s")
+    return pd.Series(2.0 + 0.1 * np.sin(np.arange(rows) / 500) + rng.normal(0, 0.01, rows), index=index)
+
+
+### PROCESSING CASES ###
+@benchmark("tellus.long_format")
+def bench_long_format(rows: int):
+    from tellus import TellusClient
+    metrics = ["sunrise.co2", "bme280.pressure", "pms5003t.d2_5"]
+    data = synthetic_wide(rows // len(metrics), metrics)
+    return lambda: TellusClient.long_format(data, metrics)
+
+
+@benchmark("utils.extract_time_period")
+def bench_extract_time_period(rows: int):
+    from utils import extract_time_period
+    data = synthetic_wide(rows, ["sunrise.temperature"])
+    return lambda: extract_time_period(data, "02:00", "04:00")
+
+
+@benchmark("smoothing.simple_moving_average", max_rows=10**5)
+def bench_simple_moving_average(rows: int):
+    from smoothing_comparison import simple_moving_average
+    data = synthetic_signal(rows)
+    return lambda: simple_moving_average(data, 50)
+
+
+@benchmark("smoothing.lowpass_butterworth")
+def bench_lowpass_butterworth(rows: int):
+    from smoothing_comparison import lowpass_butterworth
+    data = synthetic_signal(rows)
+    return lambda: lowpass_butterworth(data, 1/6, 1/120)
+
+
+def synthetic_transect(rows: int) -> pd.DataFrame:
+    """Picarro style mobile samples scattered around campus."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Latitude": 41.70 + rng.normal(0, 0.01, rows),
+        "Longitude": -86.24 + rng.normal(0, 0.01, rows),
+        "CH4": rng.normal(2.0, 0.1, rows),
+    })
+
+
+@benchmark("spatial.hex_bin")
+def bench_hex_bin(rows: int):
+    from spatial import hex_bin
+    data = synthetic_transect(rows)
+    return lambda: hex_bin(data, 50)
+
+
+@benchmark("spatial.nearest_station")
+def bench_nearest_station(rows: int):
+    from spatial import StationIndex
+    data = synthetic_transect(rows)
+    stations = synthetic_transect(50).rename(columns={"Latitude": "latitude", "Longitude": "longitude"})
+    stations["deviceId"] = [f"STATION{i}" for i in range(len(stations))]
+    index = StationIndex(stations)
+    return lambda: index.match(data, max_distance_m=500)
+
+
+@benchmark("correlation.compare")
+def bench_compare(rows: int):
+    from correlation import compare
+    metrics = [f"sensor{i}" for i in range(8)]
+    data = synthetic_wide(rows // len(metrics), metrics)
+    series = {f"{device}:{metric}": pd.Series(rows[metric].to_numpy(), index=rows["timestamp"])
+              for device, rows in data.groupby("deviceId") for metric in metrics}
+    return lambda: compare(series, "5min", max_lag=12)
+
+
+@benchmark("qc.apply_qc")
+def bench_apply_qc(rows: int):
+    from qc import apply_qc
+    from tellus import TellusClient
+    metrics = ["sunrise.co2", "sunrise.temperature", "bme280.pressure"]
+    data = TellusClient.long_format(synthetic_wide(rows // len(metrics), metrics), metrics)
+    return lambda: apply_qc(data)
+
+
+### FETCH CASES ###
+@contextlib.contextmanager
+def mock_server(**settings):
+    """Run the stand-in server in a separate process so that it does not compete for the GIL."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    flags = [f"--{key.replace('_', '-')}={value}" for key, value in settings.items()]
+    process = subprocess.Popen([sys.executable, str(REPO_DIR / "mock_server.py"), f"--port={port}", *flags],
+                               cwd=REPO_DIR, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):  # wait for the server to accept connections
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+@benchmark("tellus.fetch_decode")
+def bench_tellus_fetch(rows: int, use_arrow: bool = False):
+    from mock_server import point_clients_at
+    from tellus import TellusClient
+    url = STACK.enter_context(mock_server(tellus_max_cells=400000))
+    client = TellusClient("bench", use_arrow=use_arrow)
+    point_clients_at(url, client)
+    end = pd.Timestamp("2024-01-01T00:00:00+00:00") + pd.Timedelta(minutes=rows - 1)
+    return lambda: client.retrieve_data("2024-01-01T00:00:00+00:00", end.isoformat(), ["DEVICE0"], ["sunrise.co2"])
+
+
+@benchmark("licor.fetch_paged")
+def bench_licor_fetch(rows: int, use_arrow: bool = False):
+    from licor import LicorClient
+    from mock_server import point_clients_at
+    url = STACK.enter_context(mock_server())
+    client = LicorClient("bench", use_arrow=use_arrow)
+    point_clients_at(url, client)
+    end = pd.Timestamp("2024-01-01T00:00:00") + pd.Timedelta(minutes=rows - 1)
+    return lambda: client.retrieve_data("2024-01-01T00:00:00", end.isoformat(), ["LOGGER0"])
+
+
+# Arrow buffers are allocated outside the Python heap, so tracemalloc under-reports their peak memory
+@benchmark("tellus.fetch_decode_arrow")
+def bench_tellus_fetch_arrow(rows: int):
+    return bench_tellus_fetch(rows, use_arrow=True)
+
+
+@benchmark("licor.fetch_paged_arrow")
+def bench_licor_fetch_arrow(rows: int):
+    return bench_licor_fetch(rows, use_arrow=True)
+
+
+STACK = contextlib.ExitStack()  # keeps fetch case servers alive until the run completes
+
+
+### RUNNER ###
+def run_case(name: str, rows: int, repeat: int) -> dict:
+    setup, _ = BENCHMARKS[name]
+    operation = setup(rows)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+
+    # memory is measured in a separate run since tracing slows allocation heavy code
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    seconds = min(timings)
+    return {"case": name, "rows": rows, "seconds": seconds, "rows_per_s": rows / seconds, "peak_mb": peak / 2**20}
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """Describe every case slower than its baseline by more than the tolerance."""
+    regressions = []
+    for result in results:
+        key = f"{result['case']}@{result['rows']}"
+        if key not in baseline: continue
+        ratio = result["seconds"] / baseline[key]["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{key}: {ratio:.2f}x slower than baseline")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval and processing hot paths.")
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1e4, 1e5, 1e6], help="row counts, up to 1e7")
+    parser.add_argument("--cases", nargs="+", choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case. the fastest is reported")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="fail when slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing, e.g. 0.2 = 20%%")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)  # keep client progress messages out of the report
+
+    results = []
+    with STACK:
+        for name in args.cases:
+            max_rows = BENCHMARKS[name][1]
+            for rows in sorted(int(size) for size in args.sizes):
+                if max_rows is not None and rows > max_rows: continue
+                try:
+                    result = run_case(name, rows, args.repeat)
+                except ImportError as error:
+                    print(f"{name:<34} skipped: {error}")
+                    break
+                results.append(result)
+                print(f"{name:<34} {rows:>10,} rows  {result['seconds']:>9.4f} s  {result['rows_per_s']:>14,.0f} rows/s  {result['peak_mb']:>9.1f} MB")
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update({f"{result['case']}@{result['rows']}": result for result in results})
+        args.baseline.write_text(json.dumps(baseline, indent=2))
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"No baseline found at {args.baseline}")
+            sys.exit(1)
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print("Regression:", regression)
+        sys.exit(1 if regressions else 0)
@@ -1,9 +1,6 @@
-import datetime, os, requests, sys
+import asyncio, datetime, logging, os, requests, sys
 
-from dotenv import load_dotenv
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 
 from hobolink import HoboLinkClient
 from licor import LicorClient
@@ -11,39 +8,51 @@ from sensecap import SenseCAPClient
 from tellus import TellusClient
 from utils import require_env
 
-load_dotenv()
-
 #### MANUAL SETTINGS ###
 # Utilize ISO 8601 Standard YYYY-mm-ddTHH:MM:SS+HH:MM
 START_TIME = "2025-09-01T00:00:00+05:00" #The time after the "+" is timezone information
 END_TIME = datetime.datetime.now(datetime.timezone.utc).isoformat()
 TELLUS_METRICS = ["bme280.pressure", "sunrise.co2","pms5003t.d2_5"]
 
-### TELLUS SETTINGS ###
-TELLUS_KEY = require_env("TELLUS_KEY")
-FYE_1 = require_env("DEVICE_ID_FYE1")
-FYE_2 = require_env("DEVICE_ID_FYE2")
-LUCY_CIL = require_env("DEVICE_ID_CIL")
-
-### HOBOLINK SETTINGS ###
+### ENDPOINTS ###
 HOBOLINK_AUTH_SERVER = "https://webservice.hobolink.com/ws/auth/token"
 HOBOLINK_API = "https://webservice.hobolink.com/ws/data/file/JSON/user"
-LOGGER_SN = os.environ.get("LOGGER_ID")
-USER_ID = os.environ.get("USER_ID")
-CLIENT_ID = os.environ.get("CLIENT_ID")
-CLIENT_SECRET = os.environ.get("CLIENT_SECRET")
-
-### LICOR SETTINGS ###
 LICOR_API = "https://api.licor.cloud/v1/data"
-LICOR_KEY = os.environ.get("LICOR_KEY")
-IRISH_ONE = os.environ.get("DEVICE_ID_IRISH_ONE")
-IRISH_TWO = os.environ.get("DEVICE_ID_IRISH_TWO")
-IRISH_THREE = os.environ.get("DEVICE_ID_IRISH_THREE")
 
-### SENSECAP SETTINGS ###
-SENSE_CAP_USER_ID = require_env("SENSE_CAP_USER_ID")
-SENSE_CAP_API_KEY = require_env("SENSE_CAP_API_KEY")
-SENSE_CAP_DEVICE_ID = require_env("SENSE_CAP_DEVICE_ID")
+def load_settings() -> dict[str, str]:
+    """Read credentials and device IDs from the environment and .env file.
+
+    Called on use rather than at import, so importing this module needs neither dotenv nor a complete .env.
+
+    :return: setting name paired to its value. optional settings may be None
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    return {
+        ### TELLUS SETTINGS ###
+        "TELLUS_KEY": require_env("TELLUS_KEY"),
+        "FYE_1": require_env("DEVICE_ID_FYE1"),
+        "FYE_2": require_env("DEVICE_ID_FYE2"),
+        "LUCY_CIL": require_env("DEVICE_ID_CIL"),
+
+        ### HOBOLINK SETTINGS ###
+        "LOGGER_SN": os.environ.get("LOGGER_ID"),
+        "USER_ID": os.environ.get("USER_ID"),
+        "CLIENT_ID": os.environ.get("CLIENT_ID"),
+        "CLIENT_SECRET": os.environ.get("CLIENT_SECRET"),
+
+        ### LICOR SETTINGS ###
+        "LICOR_KEY": os.environ.get("LICOR_KEY"),
+        "IRISH_ONE": os.environ.get("DEVICE_ID_IRISH_ONE"),
+        "IRISH_TWO": os.environ.get("DEVICE_ID_IRISH_TWO"),
+        "IRISH_THREE": os.environ.get("DEVICE_ID_IRISH_THREE"),
+
+        ### SENSECAP SETTINGS ###
+        "SENSE_CAP_USER_ID": require_env("SENSE_CAP_USER_ID"),
+        "SENSE_CAP_API_KEY": require_env("SENSE_CAP_API_KEY"),
+        "SENSE_CAP_DEVICE_ID": require_env("SENSE_CAP_DEVICE_ID"),
+    }
 
 ### TIME FORMATS ###
 # HOBOLINK: YYYY-MM-DD HH:mm:SS
@@ -52,6 +61,9 @@ SENSE_CAP_DEVICE_ID = require_env("SENSE_CAP_DEVICE_ID")
 # SENSECAP: unix milleseconds
 
 def plot_temperature(data):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     #UPDATE THIS TO CONVERT TIMESTAMP TO DT_OBJ
     data["timestamp"] = data["timestamp"].apply(datetime.datetime.fromisoformat)
 
@@ -87,11 +99,47 @@ def plot_temperature(data):
     print("\t", "all item graph complete")
     print("Completed", "\n")
 
+async def retrieve_all_sources(start_time: str, end_time: str, tellus_devices: list[str], tellus_metrics: list[str],
+                               licor_devices: list[str], logger_sn: str, sense_cap_device: str,
+                               settings: dict[str, str] | None = None) -> dict[str, pd.DataFrame]:
+    """Retrieve every service concurrently within a single event loop.
+
+    :param start_time: ISO 8601 format YYYY-MM-DDTHH:MM:SS+HH:MM
+    :param end_time: ISO 8601 format YYYY-MM-DDTHH:MM:SS+HH:MM
+    :param tellus_devices: Tellus device IDs
+    :param tellus_metrics: Tellus metrics
+    :param licor_devices: LICOR device IDs
+    :param logger_sn: HoboLINK logger serial number
+    :param sense_cap_device: SenseCAP device eui
+    :param settings: credentials as returned by load_settings. read from the environment when omitted
+
+    :return: service name paired to its data
+    """
+    from async_clients import AsyncHoboLinkClient, AsyncLicorClient, AsyncSenseCAPClient, AsyncServicePool, AsyncTellusClient
+    settings = settings or load_settings()
+
+    async with AsyncServicePool() as pool:
+        tellus_client = AsyncTellusClient(settings["TELLUS_KEY"], pool)
+        licor_client = AsyncLicorClient(settings["LICOR_KEY"], pool)
+        hobolink_client = AsyncHoboLinkClient(settings["CLIENT_ID"], settings["CLIENT_SECRET"], settings["USER_ID"], pool)
+        sense_cap_client = AsyncSenseCAPClient(settings["SENSE_CAP_USER_ID"], settings["SENSE_CAP_API_KEY"], pool)
+
+        results = await asyncio.gather(
+            tellus_client.retrieve_data(start_time, end_time, tellus_devices, tellus_metrics),
+            licor_client.retrieve_data(start_time, end_time, licor_devices),
+            hobolink_client.retrieve_data(start_time, end_time, logger_sn),
+            sense_cap_client.get_historic_data(sense_cap_device, time_start=start_time, time_end=end_time),
+        )
+
+    return dict(zip(["tellus", "licor", "hobolink", "sensecap"], results))
+
 if __name__ == "__main__":
-    hobolink_client = HoboLinkClient(CLIENT_ID, CLIENT_SECRET, USER_ID)
+    logging.basicConfig(level=logging.INFO, format="\t%(message)s")
+    settings = load_settings()
+    hobolink_client = HoboLinkClient(settings["CLIENT_ID"], settings["CLIENT_SECRET"], settings["USER_ID"])
     
     print("Retrieving HoboLINK Data...")
-    data = hobolink_client.retrieve_data(START_TIME, END_TIME, LOGGER_SN)
+    data = hobolink_client.retrieve_data(START_TIME, END_TIME, settings["LOGGER_SN"])
     print("Successful", "\n")
 
     tellusDevices = ["B8D61ABC8E6C"]
@@ -101,15 +149,15 @@ if __name__ == "__main__":
         "sunrise.temperature"
     ]
 
-    tellusDevices = [FYE_1, FYE_2, LUCY_CIL]
-    tellus_client = TellusClient(TELLUS_KEY)
+    tellusDevices = [settings["FYE_1"], settings["FYE_2"], settings["LUCY_CIL"]]
+    tellus_client = TellusClient(settings["TELLUS_KEY"])
     print("TELLUS retrieval started...")
     tellus_df = tellus_client.retrieve_data(START_TIME, END_TIME, tellusDevices, metrics)
     print("Successful", "\n")
 
-    licorDevices = [IRISH_ONE, IRISH_TWO, IRISH_THREE]
-    licorNameMap = {IRISH_ONE:"irishOne", IRISH_TWO:"irishTwo", IRISH_THREE:"irishThree"}
-    licor_client = LicorClient(LICOR_KEY)
+    licorDevices = [settings["IRISH_ONE"], settings["IRISH_TWO"], settings["IRISH_THREE"]]
+    licorNameMap = {settings["IRISH_ONE"]:"irishOne", settings["IRISH_TWO"]:"irishTwo", settings["IRISH_THREE"]:"irishThree"}
+    licor_client = LicorClient(settings["LICOR_KEY"])
     print("LICOR data retrieval started...")
     licor_df = licor_client.retrieve_data(START_TIME, END_TIME, licorDevices)
     print("Successful", "\n")
\ No newline at end of file
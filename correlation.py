@@ -0,0 +1,250 @@
+"""Intercomparison of instruments: correlation, time lag and bias between aligned series.
+
+Series from any service are averaged onto a common time grid and packed into one C-contiguous
+float64 matrix with a column per series. Every statistic is then computed for all pairs at
+once with numpy, ignoring times where either series of a pair is missing.
+
+    series = series_from_long(pd.concat([tellus_long, licor_long]), by=["device", "metric"])
+    report = compare(series, interval="5min", max_lag=12)
+
+compare returns one row per pair: overlap, Pearson correlation, mean difference (a - b),
+RMSE, MAE and the lag at which the two series correlate best. Long ranges can be processed
+in chunks of rows (chunk_rows), and the lag search in chunks of pairs (chunk_columns), to
+bound the memory of intermediate arrays.
+"""
+import numpy as np
+import pandas as pd
+
+
+### ALIGNMENT ###
+def series_from_long(data: pd.DataFrame, by: list[str] | str = ["device", "metric"], time_col: str = "timestamp",
+                     value_col: str = "value", separator: str = ":") -> dict[str, pd.Series]:
+    """Split long format data into one time indexed series per group.
+
+    Defaults match ingest_daemon and export output. For TellusClient.retrieve_data output use
+    by=["deviceId", "sensor"], value_col="measurement".
+
+    :param data: one row per reading
+    :param by: columns identifying a series. their values are joined with separator to name it
+    :param time_col: column holding reading times
+    :param value_col: column holding readings
+    :param separator: placed between the values of by in series names
+    """
+    keys = [by] if isinstance(by, str) else by
+    values = pd.to_numeric(data[value_col], errors="coerce").to_numpy(dtype=float)
+    readings = pd.Series(values, index=pd.DatetimeIndex(data[time_col]))
+    series = {}
+    for group, rows in data.groupby(keys, sort=True).indices.items():
+        name = separator.join(str(part) for part in (group if isinstance(group, tuple) else (group,)))
+        series[name] = readings.iloc[rows]
+    return series
+
+
+def align(series: dict[str, pd.Series], interval: str | pd.Timedelta = "5min", start=None,
+          end=None) -> tuple[np.ndarray, pd.DatetimeIndex, list[str]]:
+    """Average each series onto a common regular grid.
+
+    :param series: name paired to readings indexed by time. timezone aware and naive times must not be mixed
+    :param interval: grid spacing
+    :param start: first grid time. the earliest reading, floored to the interval, by default
+    :param end: last time included. the latest reading by default
+
+    :return: C-contiguous float64 matrix (grid times x series) with NaN where a series has no
+        readings, the grid times, and the series names in column order
+    """
+    interval = pd.Timedelta(interval)
+    names = list(series)
+    indexes = [pd.DatetimeIndex(series[name].index) for name in names]
+    timezone = next((index.tz for index in indexes if index.tz is not None), None)
+    as_ns = [_utc_nanoseconds(index) for index in indexes]
+
+    first = min((times.min() for times in as_ns if len(times)), default=0) if start is None else _utc_nanoseconds(pd.DatetimeIndex([start]))[0]
+    last = max((times.max() for times in as_ns if len(times)), default=0) if end is None else _utc_nanoseconds(pd.DatetimeIndex([end]))[0]
+    step = interval.value
+    first -= first % step
+    rows = max(0, (last - first) // step + 1)
+
+    matrix = np.full((rows, len(names)), np.nan)
+    for column, (name, times) in enumerate(zip(names, as_ns)):
+        values = np.asarray(series[name], dtype=float)
+        bins = (times - first) // step
+        keep = (bins >= 0) & (bins < rows) & ~np.isnan(values)
+        counts = np.bincount(bins[keep], minlength=rows)
+        sums = np.bincount(bins[keep], weights=values[keep], minlength=rows)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            matrix[:, column] = sums / counts  # 0 / 0 leaves empty bins NaN
+
+    grid = pd.DatetimeIndex(first + step * np.arange(rows, dtype=np.int64), tz="UTC")
+    grid = grid.tz_convert(timezone) if timezone is not None else grid.tz_localize(None)
+    return matrix, grid, names
+
+
+def _utc_nanoseconds(index: pd.DatetimeIndex) -> np.ndarray:
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    return index.as_unit("ns").asi8
+
+
+### PAIRWISE STATISTICS ###
+def _row_chunks(rows: int, chunk_rows: int | None) -> range:
+    return range(0, rows, chunk_rows or max(rows, 1))
+
+
+def correlation_matrix(matrix: np.ndarray, min_periods: int = 3, chunk_rows: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """Pearson correlation of every pair of columns over the rows where both are present.
+
+    Sums are accumulated chunk by chunk with matrix products, so memory beyond the input is
+    about chunk_rows x columns.
+
+    :param matrix: align output
+    :param min_periods: pairs overlapping on fewer rows get NaN
+    :param chunk_rows: rows processed at a time. all at once by default
+
+    :return: correlation and overlap count, both columns x columns
+    """
+    columns = matrix.shape[1]
+    center = np.nan_to_num(np.nanmean(matrix, axis=0)) if matrix.size else np.zeros(columns)  # centering avoids cancellation for large offsets such as CO2 in ppm
+    count, sum_x, sum_xx, sum_xy = (np.zeros((columns, columns)) for _ in range(4))
+    for first in _row_chunks(matrix.shape[0], chunk_rows):
+        chunk = matrix[first:first + (chunk_rows or matrix.shape[0])] - center
+        present = (~np.isnan(chunk)).astype(float)
+        filled = np.nan_to_num(chunk)
+        count += present.T @ present
+        sum_x += filled.T @ present  # [i, j]: sum of column i over rows where j is present
+        sum_xx += (filled ** 2).T @ present
+        sum_xy += filled.T @ filled
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = count * sum_xy - sum_x * sum_x.T
+        variance = (count * sum_xx - sum_x ** 2) * (count * sum_xx - sum_x ** 2).T
+        correlation = np.clip(covariance / np.sqrt(variance), -1, 1)
+    correlation[count < min_periods] = np.nan
+    return correlation, count.astype(np.int64)
+
+
+def bias_matrices(matrix: np.ndarray, chunk_rows: int | None = None) -> dict[str, np.ndarray]:
+    """Mean difference, RMSE and MAE of every pair of columns, as [i, j] = column i - column j.
+
+    :param matrix: align output
+    :param chunk_rows: rows processed at a time. all at once by default
+
+    :return: "mean_diff", "rmse" and "mae", each columns x columns. NaN where a pair never overlaps
+    """
+    columns = matrix.shape[1]
+    count, total, squares, absolute = (np.zeros((columns, columns)) for _ in range(4))
+    for first in _row_chunks(matrix.shape[0], chunk_rows):
+        chunk = matrix[first:first + (chunk_rows or matrix.shape[0])]
+        for column in range(columns):  # each pass covers one column against all others
+            difference = chunk[:, [column]] - chunk
+            present = ~np.isnan(difference)
+            difference = np.where(present, difference, 0)
+            count[column] += present.sum(axis=0)
+            total[column] += difference.sum(axis=0)
+            squares[column] += (difference ** 2).sum(axis=0)
+            absolute[column] += np.abs(difference).sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {"mean_diff": total / count, "rmse": np.sqrt(squares / count), "mae": absolute / count}
+
+
+def lag_matrix(matrix: np.ndarray, max_lag: int | None = None, min_periods: int = 3,
+               chunk_columns: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """Lag, in grid steps, at which each pair of columns correlates best, by FFT cross-correlation.
+
+    The sums behind a Pearson correlation over the rows both columns have at a lag are all
+    cross-correlations of the values, their squares and the presence masks, so every lag is
+    computed at once per pair. A positive lag at [i, j] means column j follows column i, i.e.
+    column j at t + lag matches column i at t.
+
+    Memory: the spectra of all columns are held at once, about 3 x size x columns float64 where
+    size is rows + max_lag rounded up to a power of two. Each pass then inverts six sums for
+    chunk_columns pairs at full padded length, about 6 x size x chunk_columns float64 more.
+
+    :param matrix: align output
+    :param max_lag: largest lag searched in either direction. a quarter of the rows by default
+    :param min_periods: lags overlapping on fewer rows are not considered
+    :param chunk_columns: pairs inverted at a time. all remaining columns at once by default
+
+    :return: best lag (int) and correlation at that lag, both columns x columns
+    """
+    rows, columns = matrix.shape
+    if max_lag is None:
+        max_lag = rows // 4
+    max_lag = min(max_lag, max(rows - 1, 0))
+
+    present = ~np.isnan(matrix)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        standardized = (matrix - np.nanmean(matrix, axis=0)) / np.nanstd(matrix, axis=0)  # centering avoids cancellation as in correlation_matrix
+    standardized = np.where(present & np.isfinite(standardized), standardized, 0)
+
+    size = 1 << int(np.ceil(np.log2(max(rows + max_lag, 2))))  # zero padding keeps lags up to max_lag from wrapping around
+    spectra = np.fft.rfft(standardized, n=size, axis=0)
+    square_spectra = np.fft.rfft(standardized ** 2, n=size, axis=0)
+    mask_spectra = np.fft.rfft(present.astype(float), n=size, axis=0)
+    lags = np.r_[0:max_lag + 1, -max_lag:0]  # positions of lags 0..max_lag then -max_lag..-1 in the ifft output
+
+    def cross(first, second, column, others):  # sum over t of first[t, column] * second[t + lag, others] for every lag
+        return np.fft.irfft(np.conj(first[:, [column]]) * second[:, others], n=size, axis=0)[lags]
+
+    best_lag = np.zeros((columns, columns), dtype=np.int64)
+    best_correlation = np.full((columns, columns), np.nan)
+    for column in range(columns):  # each pass covers one column against those after it. [j, i] mirrors [i, j]
+        for first in range(column, columns, chunk_columns or columns):
+            others = np.arange(first, min(columns, first + (chunk_columns or columns)))
+            count = np.rint(cross(mask_spectra, mask_spectra, column, others))
+            sum_xy = cross(spectra, spectra, column, others)
+            sum_x, sum_y = cross(spectra, mask_spectra, column, others), cross(mask_spectra, spectra, column, others)
+            sum_xx, sum_yy = cross(square_spectra, mask_spectra, column, others), cross(mask_spectra, square_spectra, column, others)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                correlations = (count * sum_xy - sum_x * sum_y) / np.sqrt((count * sum_xx - sum_x ** 2) * (count * sum_yy - sum_y ** 2))
+            correlations = np.where(count >= min_periods, np.clip(correlations, -1, 1), np.nan)  # FFT rounding can pass 1 slightly
+            valid = ~np.isnan(correlations).all(axis=0)
+            positions = np.argmax(np.where(np.isnan(correlations), -np.inf, correlations), axis=0)
+            best_lag[column, others] = np.where(valid, lags[positions], 0)
+            best_correlation[column, others] = np.where(valid, correlations[positions, np.arange(len(others))], np.nan)
+            best_lag[others, column] = -best_lag[column, others]
+            best_correlation[others, column] = best_correlation[column, others]
+    return best_lag, best_correlation
+
+
+### REPORT ###
+def compare(series: dict[str, pd.Series], interval: str | pd.Timedelta = "5min", max_lag: int | None = None,
+            min_periods: int = 3, chunk_rows: int | None = None, start=None, end=None,
+            chunk_columns: int | None = None) -> pd.DataFrame:
+    """Correlation, lag and bias for every pair of series.
+
+    :param series: name paired to readings indexed by time, e.g. series_from_long output
+    :param interval: grid spacing the series are averaged onto
+    :param max_lag: largest lag searched, in grid steps. a quarter of the grid by default. 0 skips the search
+    :param min_periods: pairs overlapping on fewer grid times get NaN statistics
+    :param chunk_rows: grid rows processed at a time by the correlation and bias sums
+    :param start: first grid time (optional)
+    :param end: last time included (optional)
+    :param chunk_columns: pairs handled at a time by the lag search. see lag_matrix for its memory use
+
+    :return: one row per pair: a, b, overlap, correlation, mean_diff (a - b), rmse, mae, lag
+        (Timedelta by which b follows a) and lag_correlation
+    """
+    matrix, _, names = align(series, interval, start, end)
+    correlation, overlap = correlation_matrix(matrix, min_periods, chunk_rows)
+    bias = bias_matrices(matrix, chunk_rows)
+    if max_lag == 0:
+        lag, lag_correlation = np.zeros_like(overlap), correlation
+    else:
+        lag, lag_correlation = lag_matrix(matrix, max_lag, min_periods, chunk_columns)
+
+    first, second = np.triu_indices(len(names), k=1)
+    report = pd.DataFrame({
+        "a": np.array(names, dtype=object)[first],
+        "b": np.array(names, dtype=object)[second],
+        "overlap": overlap[first, second],
+        "correlation": correlation[first, second],
+        "mean_diff": bias["mean_diff"][first, second],
+        "rmse": bias["rmse"][first, second],
+        "mae": bias["mae"][first, second],
+        "lag": pd.to_timedelta(lag[first, second] * pd.Timedelta(interval).value, unit="ns"),
+        "lag_correlation": lag_correlation[first, second],
+    })
+    too_short = report["overlap"] < min_periods
+    report.loc[too_short, ["mean_diff", "rmse", "mae"]] = np.nan
+    return report
@@ -0,0 +1,224 @@
+"""Export data from any combination of services to Parquet, Arrow or CSV.
+
+    python export.py --start 2025-09-01T00:00:00+00:00 --end 2025-10-01T00:00:00+00:00 \\
+        --tellus DEVICE1 DEVICE2 --metrics sunrise.co2 sunrise.temperature --licor LOGGER1 \\
+        --format parquet --partition-by service date --output exports/september
+
+The time range is retrieved in windows of --chunk-hours. Each window is written as soon as it
+arrives, so memory use is bounded by the window size rather than the export size. Devices are
+retrieved concurrently. Records are written in long format, the same layout ingest_daemon.py
+stores: service, device, metric, timestamp (UTC) and value.
+
+Without --partition-by the output is a single file. With it, the output is a directory of
+hive style partitions (e.g. service=tellus/date=2025-09-01/part-3f2a9c1e-0-0.parquet) that
+pandas, pyarrow, DuckDB and Spark read as one dataset. File names carry a token unique to each
+run, so exporting into an existing directory adds files and never replaces those of earlier runs.
+
+Credentials are read from the environment and .env file, as in the README.
+"""
+import argparse, datetime, logging, sys, threading, uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from ingest_daemon import SERVICES, SOURCE_TYPES, Source, TellusSource, client_from_env
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"parquet": "parquet", "arrow": "arrow", "csv": "csv"} # format name paired to file extension
+PARTITION_COLS = ["service", "device", "metric", "date"]
+
+
+### WRITING ###
+class ExportWriter:
+    """Appends long format chunks to a single file or a partitioned dataset. Safe to share between threads."""
+
+    def __init__(self, output: str | Path, file_format: str = "parquet", partition_by: list[str] | None = None) -> None:
+        """
+        :param output: file path, or directory when partitioning
+        :param file_format: "parquet", "arrow" or "csv"
+        :param partition_by: columns from PARTITION_COLS used as directory levels (optional)
+        """
+        import pyarrow as pa
+
+        if file_format not in FORMATS:
+            raise ValueError(f"Format must be one of {list(FORMATS)}, got: {file_format}")
+        unknown = set(partition_by or []) - set(PARTITION_COLS)
+        if unknown:
+            raise ValueError(f"Can only partition by {PARTITION_COLS}, got: {sorted(unknown)}")
+
+        self.output = Path(output)
+        self.file_format = file_format
+        self.partition_by = partition_by or []
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._chunks = 0
+        self._run = uuid.uuid4().hex[:8] # keeps file names of separate runs into one directory apart
+        self._writer = None
+
+        columns = [("service", pa.string()), ("device", pa.string()), ("metric", pa.string()),
+                   ("timestamp", pa.timestamp("ns", tz="UTC")), ("value", pa.float64())]
+        if "date" in self.partition_by:
+            columns.append(("date", pa.string()))
+        self.schema = pa.schema(columns)
+
+    def write(self, data: pd.DataFrame) -> None:
+        """Append records with the columns of LONG_COLS plus service."""
+        if data.empty:
+            return
+        import pyarrow as pa
+
+        if "date" in self.partition_by:
+            data = data.assign(date=data["timestamp"].dt.strftime("%Y-%m-%d"))
+        table = pa.Table.from_pandas(data[self.schema.names], schema=self.schema, preserve_index=False)
+
+        with self._lock:
+            if self.partition_by:
+                self._write_partitions(table)
+            else:
+                if self._writer is None:
+                    self._writer = self._open_file()
+                self._writer.write_table(table)
+            self._chunks += 1
+            self.rows += table.num_rows
+
+    def close(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def __enter__(self) -> "ExportWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _open_file(self):
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        if self.file_format == "parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(self.output, self.schema)
+        if self.file_format == "arrow":
+            import pyarrow.ipc as ipc
+            return ipc.new_file(self.output, self.schema)
+        import pyarrow.csv as pcsv
+        return pcsv.CSVWriter(self.output, self.schema)
+
+    def _write_partitions(self, table) -> None:
+        """Write one chunk as new files in each partition it touches. Earlier chunks are left in place."""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        dataset_format = {"parquet": "parquet", "arrow": "ipc", "csv": "csv"}[self.file_format]
+        partitioning = ds.partitioning(pa.schema([self.schema.field(name) for name in self.partition_by]), flavor="hive")
+        ds.write_dataset(table, self.output, format=dataset_format, partitioning=partitioning,
+                         basename_template=f"part-{self._run}-{self._chunks}-{{i}}.{FORMATS[self.file_format]}",
+                         existing_data_behavior="overwrite_or_ignore")
+
+
+### RETRIEVAL ###
+def time_windows(start: datetime.datetime, end: datetime.datetime, chunk: datetime.timedelta) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
+    """Consecutive windows covering start to end. Neighbouring windows share their boundary."""
+    bounds = list(pd.date_range(start, end, freq=chunk))
+    if bounds[-1] < pd.Timestamp(end):
+        bounds.append(pd.Timestamp(end))
+    if len(bounds) == 1:
+        bounds.append(bounds[0])
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def export_source(source: Source, windows: list[tuple[pd.Timestamp, pd.Timestamp]], writer: ExportWriter) -> int:
+    """Retrieve one device window by window, writing each window as it arrives.
+
+    :return: records written
+    """
+    written = 0
+    for index, (since, until) in enumerate(windows):
+        data = source.poll(since, until)
+        if index:
+            data = data[data["timestamp"] > since]  # records at a shared boundary belong to the earlier window
+        writer.write(data.assign(service=source.service))
+        written += len(data)
+        logger.info(f"{source.name}: {since.isoformat()} to {until.isoformat()}, {len(data)} records")
+    return written
+
+
+def run_export(sources: list[Source], start: datetime.datetime, end: datetime.datetime, writer: ExportWriter,
+               chunk: datetime.timedelta = datetime.timedelta(days=1), max_concurrency: int = 4) -> dict[str, int | None]:
+    """Export every source concurrently.
+
+    :param sources: devices to export
+    :param start: first time included, timezone aware. converted to UTC
+    :param end: last time included, timezone aware. converted to UTC
+    :param writer: destination
+    :param chunk: length of each retrieval window
+    :param max_concurrency: devices retrieved at the same time
+
+    :return: records written per source. None for sources that failed
+    """
+    # sources expect UTC. Tellus shifts timestamps by the request's offset while keeping the UTC label
+    windows = time_windows(start.astimezone(datetime.timezone.utc), end.astimezone(datetime.timezone.utc), chunk)
+
+    def safe_export(source):
+        try:
+            return export_source(source, windows, writer)
+        except (Exception, SystemExit): # clients exit on API errors
+            logger.exception(f"{source.name}: export failed")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        results = dict(zip([source.name for source in sources], pool.map(safe_export, sources)))
+    return results
+
+
+def _parse_time(value: str) -> datetime.datetime:
+    """ISO 8601 time converted to UTC. Times without timezone information are taken as UTC."""
+    parsed = datetime.datetime.fromisoformat(value)
+    return parsed.astimezone(datetime.timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export service data to Parquet, Arrow or CSV.")
+    parser.add_argument("--start", required=True, type=_parse_time, help="ISO 8601 start time")
+    parser.add_argument("--end", type=_parse_time, default=datetime.datetime.now(datetime.timezone.utc), help="ISO 8601 end time. default now")
+    parser.add_argument("--tellus", nargs="+", default=[], metavar="DEVICE", help="Tellus device IDs")
+    parser.add_argument("--metrics", nargs="+", default=[], help="Tellus metrics")
+    parser.add_argument("--licor", nargs="+", default=[], metavar="LOGGER", help="LI-COR logger serial numbers")
+    parser.add_argument("--hobolink", nargs="+", default=[], metavar="LOGGER", help="HOBOlink logger serial numbers")
+    parser.add_argument("--sensecap", nargs="+", default=[], metavar="EUI", help="SenseCAP device EUIs")
+    parser.add_argument("--output", required=True, type=Path, help="output file, or directory when partitioning")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--partition-by", nargs="+", choices=PARTITION_COLS, default=[])
+    parser.add_argument("--chunk-hours", type=float, default=24, help="length of each retrieval window")
+    parser.add_argument("--concurrency", type=int, default=4, help="devices retrieved at the same time")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="\t%(message)s")
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    if args.tellus and not args.metrics:
+        parser.error("--metrics is required with --tellus")
+
+    sources = []
+    for service in SERVICES:
+        devices = getattr(args, service)
+        if not devices:
+            continue
+        client = client_from_env(service)
+        if client is None:
+            parser.error(f"Credentials for {service} are missing from the environment")
+        for device in devices:
+            if service == "tellus": sources.append(TellusSource(client, device, args.metrics))
+            else: sources.append(SOURCE_TYPES[service](client, device))
+    if not sources:
+        parser.error("Specify devices with at least one of --tellus, --licor, --hobolink or --sensecap")
+
+    with ExportWriter(args.output, args.format, args.partition_by) as writer:
+        results = run_export(sources, args.start, args.end, writer,
+                             datetime.timedelta(hours=args.chunk_hours), args.concurrency)
+
+    logger.info(f"Wrote {writer.rows} records to {args.output}")
+    sys.exit(0 if None not in results.values() else 1)
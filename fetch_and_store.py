@@ -0,0 +1,45 @@
+"""One shot fetch-and-store job for cron and other schedulers.
+
+Retrieves records newer than each device's watermark and appends them to the local store,
+exactly like one pass of ingest_daemon.py. Only the modules the run needs are imported: no
+plotting, scipy or async libraries, and only the clients of the services requested.
+
+    python fetch_and_store.py --services tellus licor
+"""
+import argparse, datetime, logging, sys
+
+SERVICES = ["tellus", "licor", "hobolink", "sensecap"] # same as ingest_daemon.SERVICES, repeated so --help needs no pandas
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Store new records from each configured service, then exit.")
+    parser.add_argument("--services", nargs="+", choices=SERVICES, default=SERVICES)
+    parser.add_argument("--db", default="ingest.sqlite", help="SQLite file for records and watermarks")
+    parser.add_argument("--rollups", default="", help="SQLite file for hourly/daily rollups. disabled by default")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests running at the same time")
+    parser.add_argument("--lookback-hours", type=float, default=24, help="history retrieved for a device seen for the first time")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="\t%(message)s")
+    from dotenv import load_dotenv
+    from ingest_daemon import IngestDaemon, IngestStore, sources_from_env
+    load_dotenv()
+
+    sources = sources_from_env(services=args.services)
+    if not sources:
+        logging.error("No credentials found in the environment for the requested services")
+        return 1
+
+    rollups = None
+    if args.rollups:
+        from rollups import RollupStore
+        rollups = RollupStore(args.rollups)
+
+    daemon = IngestDaemon(sources, IngestStore(args.db), rollups=rollups, max_concurrency=args.concurrency,
+                          initial_lookback=datetime.timedelta(hours=args.lookback_hours))
+    results = daemon.run_once()
+    return 0 if len(results) == len(sources) else 1  # non zero when any source failed
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
-import datetime, json, requests, sys, urllib3
-from dotenv import load_dotenv
+import datetime, json, logging, sys, urllib3
 import pandas as pd
+from instrumentation import emit, instrumented_request, timed_decode
+from stitching import stitch
 from utils import require_env
 
+logger = logging.getLogger(__name__)
+
 
 urllib3.disable_warnings()  # Warnings occur each time a token is generated.
 
@@ -10,34 +13,37 @@ class HoboLinkClient:
     """Client for interacting with the HoboLINK API."""
     AUTH_SERVER = "https://webservice.hobolink.com/ws/auth/token"
     BASE_URL = "https://webservice.hobolink.com/ws/data/file/JSON/user"
+    RECORD_CAP = 100000
+    KEY_COLS = ["logger_sn", "sensor_sn", "timestamp"] # identify a record when joining capped responses
+    TOKEN_PAYLOAD = {'grant_type': 'client_credentials'}
 
-    def __init__(self, client_id: str, client_secret: str, user_id: str) -> None:
+    def __init__(self, client_id: str, client_secret: str, user_id: str, use_arrow: bool = False) -> None:
         """Initialize HoboLINK client with authentication credentials.
         
         :param client_id: OAuth2 client ID provided by Onset Technical Support
         :param client_secret: OAuth2 client secret provided by Onset Technical Support  
         :param user_id: HoboLINK user ID
+        :param use_arrow: decode responses with arrow_json into Arrow backed columns. requires pyarrow
         """
         self.client_id = client_id
         self.client_secret = client_secret
         self.user_id = user_id
+        self.use_arrow = use_arrow
 
     def _get_auth_token(self) -> str:
         """Obtain a new OAuth 2.0 token from the authentication server.
         
         :return: Access token for API requests
         """
-        token_req_payload = {'grant_type': 'client_credentials'}
-
-        token_response = requests.post(self.AUTH_SERVER,
-                                       data=token_req_payload,
-                                       verify=False,
-                                       allow_redirects=False,
-                                       auth=(self.client_id, self.client_secret)
-                                       )
+        token_response = instrumented_request("hobolink", "POST", self.AUTH_SERVER,
+                                              data=self.TOKEN_PAYLOAD,
+                                              verify=False,
+                                              allow_redirects=False,
+                                              auth=(self.client_id, self.client_secret)
+                                              )
 
         if token_response.status_code != 200:
-            print("Failed to obtain token from the OAuth 2.0 server")
+            logger.error("Failed to obtain token from the OAuth 2.0 server")
             sys.exit(1)
 
         tokens = json.loads(token_response.text)
@@ -46,7 +52,7 @@ class HoboLinkClient:
     def retrieve_data(self, start_time: str, end_time: str, logger_sn: str) -> pd.DataFrame:
         """Retrieve data for a specified timespan as a dataframe.
 
-        Warning: HoboLINK returns a maximum of 100,000 records per request.
+        Warning: HoboLINK returns a maximum of 100,000 records per request (RECORD_CAP).
         This function will automatically split the time range and make additional API calls
         to retrieve all data, but large time ranges may take a while.
         If this poses an issue, manual adjustment of ranges is recommended.
@@ -57,55 +63,93 @@ class HoboLinkClient:
 
         :return pd.DataFrame: Pandas dataframe with timestamp, logger data, etc
         """
-        # Convert ISO 8601 format to HoboLINK format (YYYY-MM-DD HH:mm:SS)
-        dt_start = datetime.datetime.fromisoformat(start_time)
-        start_time = dt_start.strftime("%Y-%m-%d %H:%M:%S") #IS THIS ACCOUNTING FOR TIMEZONE INFO
+        return self._retrieve_data(start_time, end_time, logger_sn)
 
-        dt_end = datetime.datetime.fromisoformat(end_time)
-        end_time = dt_end.strftime("%Y-%m-%d %H:%M:%S") #IS THIS ACCOUNTING FOR TIMEZONE INFO
-        
-        endpoint = f"{self.BASE_URL}/{self.user_id}"
-        
-        payload = {
-            "loggers": logger_sn,
-            "start_date_time": start_time,
-            "end_date_time": end_time
-        }
+    def _retrieve_data(self, start_time: str, end_time: str, logger_sn: str, split_depth: int = 0) -> pd.DataFrame:
+        """See retrieve_data. split_depth counts the capped responses preceding this request."""
+        endpoint, payload = self._request_args(start_time, end_time, logger_sn)
         
         header = {
             'Authorization': 'Bearer ' + self._get_auth_token()
         }
         
-        print(f"\tRetrieving HoboLINK Data from {start_time} to {end_time}...")
-        response = requests.get(url=endpoint, headers=header, params=payload, verify=True)
+        logger.info(f"Retrieving HoboLINK Data from {payload['start_date_time']} to {payload['end_date_time']}...")
+        response = instrumented_request("hobolink", "GET", endpoint, split_depth=split_depth, headers=header, params=payload, verify=True)
 
         if response.status_code == 200:
-            data = pd.DataFrame.from_dict(response.json()["observation_list"])
-            print(f"\tSuccess: Retrieved {data.shape[0]} records from {start_time} to {end_time}")
+            data = timed_decode("hobolink", lambda: self._decode_observations(response))
+            logger.info(f"Success: Retrieved {data.shape[0]} records from {payload['start_date_time']} to {payload['end_date_time']}")
             
             # If result set hits the cap, recursively fetch remaining data
-            if data.shape[0] == 100000: 
-                print(f"\tWarning: HoboLINK record cap reached (100,000 records) for {start_time} to {end_time}. Splitting range...")
-                
-                # Find the latest timestamp in the current data
-                latest_timestamp = pd.to_datetime(data["timestamp"], utc=False, errors="coerce").max()
-                new_start_dt = latest_timestamp + datetime.timedelta(seconds=1)  # Advance by one second to avoid duplicate boundary record
-                new_start = new_start_dt.strftime('%Y-%m-%dT%H:%M:%S%z')  # Convert back to ISO 8601 format
+            if data.shape[0] == self.RECORD_CAP: 
+                logger.warning(f"HoboLINK record cap reached ({self.RECORD_CAP:,} records) for {payload['start_date_time']} to {payload['end_date_time']}. Splitting range...")
+                emit("split", "hobolink", split_depth=split_depth + 1, reason="record cap", parts=2)
                 
                 # Recursively fetch remaining data
-                remaining_data = self.retrieve_data(new_start, end_time, logger_sn)
-                data = pd.concat([data, remaining_data], ignore_index=True)
-                print(f"\tSuccessfully combined data: {data.shape[0]} total records")
+                remaining_data = self._retrieve_data(self._next_start(data, start_time), end_time, logger_sn, split_depth + 1)
+                data = stitch([data, remaining_data], self.KEY_COLS)
+                logger.info(f"Successfully combined data: {data.shape[0]} total records")
             
             return data
         else:
-            error_data = response.json()
-            print(f"\t{response.status_code}: {error_data.get('error', 'Unknown error')} {error_data.get('error_description', '')}")
-            if 'message' in error_data:
-                print(f"\t{error_data['message']}")
-            sys.exit(1)
+            self._report_error(response.status_code, response.json())
+
+    def _request_args(self, start_time: str, end_time: str, logger_sn: str) -> tuple[str, dict]:
+        """Endpoint and query parameters for a data request."""
+        # Convert ISO 8601 format to HoboLINK format (YYYY-MM-DD HH:mm:SS)
+        dt_start = datetime.datetime.fromisoformat(start_time)
+        start_time = dt_start.strftime("%Y-%m-%d %H:%M:%S") #IS THIS ACCOUNTING FOR TIMEZONE INFO
+
+        dt_end = datetime.datetime.fromisoformat(end_time)
+        end_time = dt_end.strftime("%Y-%m-%d %H:%M:%S") #IS THIS ACCOUNTING FOR TIMEZONE INFO
+        
+        endpoint = f"{self.BASE_URL}/{self.user_id}"
+        
+        payload = {
+            "loggers": logger_sn,
+            "start_date_time": start_time,
+            "end_date_time": end_time
+        }
+        return endpoint, payload
+
+    def _decode_observations(self, response) -> pd.DataFrame:
+        """Convert a data response to a dataframe."""
+        if self.use_arrow:
+            from arrow_json import records_frame
+            return records_frame(response.content, key="observation_list")
+        return self._parse_observations(response.json())
+
+    @staticmethod
+    def _parse_observations(body: dict) -> pd.DataFrame:
+        """Convert a data response body to a dataframe."""
+        return pd.DataFrame.from_dict(body["observation_list"])
+
+    @staticmethod
+    def _next_start(data: pd.DataFrame, start_time: str) -> str:
+        """ISO 8601 start time for the request following a capped response.
+
+        The request restarts at the latest timestamp received, since the cap may have cut off
+        part of the records sharing that timestamp. Repeated records are removed by stitch.
+        """
+        # Find the latest timestamp in the current data
+        latest_timestamp = pd.to_datetime(data["timestamp"], utc=False, errors="coerce").max()
+        requested_start = pd.to_datetime(start_time)
+        if latest_timestamp.tzinfo is None: requested_start = requested_start.tz_localize(None) # compare wall times
+        if latest_timestamp <= requested_start:
+            latest_timestamp += datetime.timedelta(seconds=1)  # a full page at a single timestamp. advance to guarantee progress
+        return latest_timestamp.strftime('%Y-%m-%dT%H:%M:%S%z')  # Convert back to ISO 8601 format
+
+    @staticmethod
+    def _report_error(status_code: int, error_data: dict) -> None:
+        """Print API error details and exit."""
+        logger.error(f"{status_code}: {error_data.get('error', 'Unknown error')} {error_data.get('error_description', '')}")
+        if 'message' in error_data:
+            logger.error(error_data['message'])
+        sys.exit(1)
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv # only needed when run as a script
+    logging.basicConfig(level=logging.INFO, format="\t%(message)s")
     load_dotenv()
 
     ### HoboLINK SETTINGS ###
@@ -0,0 +1,431 @@
+"""Long running ingestion of new records from every service.
+
+Each source is one service and device. A source is polled on its own interval, with random
+jitter so polls do not line up, from its high-water mark (the latest timestamp stored) to the
+present. Only records newer than the watermark are stored, and the watermark is advanced in the
+same transaction, so a restart continues where the previous run stopped. After the first poll,
+traffic is proportional to new data rather than history.
+
+    store = IngestStore("ingest.sqlite")
+    sources = [TellusSource(TellusClient(key), device_id, ["sunrise.co2"])]
+    IngestDaemon(sources, store, rollups=RollupStore()).run_forever()
+
+Records are stored in long format: service, device, metric, timestamp (ISO 8601 UTC) and value.
+Times without timezone information are taken as UTC.
+"""
+import argparse, datetime, heapq, logging, os, random, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+LONG_COLS = ["timestamp", "device", "metric", "value"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    service TEXT NOT NULL,
+    device TEXT NOT NULL,
+    watermark TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (service, device)
+);
+CREATE TABLE IF NOT EXISTS records (
+    service TEXT NOT NULL,
+    device TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (service, device, metric, timestamp)
+);
+"""
+
+
+### STORAGE ###
+class IngestStore:
+    """Raw records and per device watermarks in SQLite."""
+
+    def __init__(self, path: str | Path = "ingest.sqlite") -> None:
+        """
+        :param path: SQLite database file. ":memory:" keeps the store in memory
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def watermark(self, service: str, device: str) -> pd.Timestamp | None:
+        """Latest stored timestamp for a device, None before the first successful poll."""
+        with self._lock:
+            row = self._connection.execute("SELECT watermark FROM watermarks WHERE service = ? AND device = ?",
+                                           (service, device)).fetchone()
+        return pd.Timestamp(row[0]) if row else None
+
+    def append(self, service: str, device: str, data: pd.DataFrame) -> pd.DataFrame:
+        """Store records not older than the device watermark and advance it.
+
+        Records at the watermark itself are kept unless already stored, since another metric may
+        arrive later for the same timestamp.
+
+        :param service: source service
+        :param device: device the records belong to
+        :param data: long format records with LONG_COLS
+
+        :return: the records that were new
+        """
+        watermark = self.watermark(service, device)
+        if watermark is not None:
+            data = data[data["timestamp"] >= watermark]  # both ends of a request are inclusive
+            data = data[~self._stored_at(service, watermark, data)]
+        if data.empty:
+            return data
+
+        rows = zip([service] * len(data), data["device"], data["metric"],
+                   data["timestamp"].map(pd.Timestamp.isoformat), data["value"].astype(float))
+        latest = data["timestamp"].max().isoformat()
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?, ?)", rows)
+            self._connection.execute(
+                "INSERT INTO watermarks VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (service, device) DO UPDATE SET watermark = excluded.watermark, updated = excluded.updated",
+                (service, device, latest, now),
+            )
+        return data
+
+    def _stored_at(self, service: str, timestamp: pd.Timestamp, data: pd.DataFrame) -> np.ndarray:
+        """Mask of records at timestamp that are already stored, so they are not reported as new twice."""
+        boundary = (data["timestamp"] == timestamp).to_numpy()
+        if not boundary.any():
+            return boundary
+        with self._lock:
+            stored = self._connection.execute("SELECT device, metric FROM records WHERE service = ? AND timestamp = ?",
+                                              (service, timestamp.isoformat())).fetchall()
+        keys = pd.MultiIndex.from_frame(data[["device", "metric"]].astype(str))
+        return boundary & keys.isin(stored)
+
+    def read(self, service: str, device: str | None = None, start: str | None = None, end: str | None = None) -> pd.DataFrame:
+        """Stored records for a service, optionally limited to a device and time range (ISO 8601)."""
+        sql = "SELECT device, metric, timestamp, value FROM records WHERE service = ?"
+        params = [service]
+        if device is not None:
+            sql += " AND device = ?"
+            params.append(device)
+        with self._lock:
+            data = pd.read_sql_query(sql, self._connection, params=params)
+        data["timestamp"] = pd.to_datetime(data["timestamp"], utc=True, format="ISO8601")
+        if start is not None: data = data[data["timestamp"] >= _as_utc(start)]
+        if end is not None: data = data[data["timestamp"] <= _as_utc(end)]
+        return data.sort_values(["device", "metric", "timestamp"]).reset_index(drop=True)
+
+
+### SOURCES ###
+class Source:
+    """One device of one service. Subclasses implement fetch and normalize."""
+    service = ""
+
+    def __init__(self, client, device: str, interval: float = 300) -> None:
+        """
+        :param client: instantiated client for the service
+        :param device: device ID, logger serial number or EUI
+        :param interval: seconds between polls
+        """
+        self.client = client
+        self.device = device
+        self.interval = interval
+
+    @property
+    def name(self) -> str:
+        return f"{self.service}:{self.device}"
+
+    def poll(self, since: pd.Timestamp, until: pd.Timestamp) -> pd.DataFrame:
+        """Records between two UTC times in long format."""
+        raw = self.fetch(since.isoformat(), until.isoformat())
+        if raw is None or raw.empty:
+            return pd.DataFrame(columns=LONG_COLS)
+        data = self.normalize(raw)
+        data["timestamp"] = pd.to_datetime(data["timestamp"], utc=True, format="ISO8601")
+        data["value"] = pd.to_numeric(data["value"], errors="coerce")
+        data["device"] = data["device"].astype(str)
+        data["metric"] = data["metric"].astype(str)
+        return data.dropna(subset=["timestamp", "value"])[LONG_COLS]
+
+    def fetch(self, start_time: str, end_time: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def normalize(self, raw: pd.DataFrame) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class TellusSource(Source):
+    service = "tellus"
+
+    def __init__(self, client, device: str, metrics: list[str], interval: float = 300) -> None:
+        super().__init__(client, device, interval)
+        self.metrics = metrics
+
+    def fetch(self, start_time: str, end_time: str) -> pd.DataFrame:
+        return self.client.retrieve_data(start_time, end_time, [self.device], self.metrics)
+
+    def normalize(self, raw: pd.DataFrame) -> pd.DataFrame:
+        return pd.DataFrame({"timestamp": raw["timestamp"], "device": raw["deviceId"],
+                             "metric": raw["sensor"], "value": raw["measurement"]})
+
+
+class LicorSource(Source):
+    service = "licor"
+
+    def fetch(self, start_time: str, end_time: str) -> pd.DataFrame:
+        return self.client.retrieve_data(start_time, end_time, [self.device])
+
+    def normalize(self, raw: pd.DataFrame) -> pd.DataFrame:
+        return _normalize_logger_records(raw, self.device)
+
+
+class HoboLinkSource(Source):
+    service = "hobolink"
+
+    def fetch(self, start_time: str, end_time: str) -> pd.DataFrame:
+        return self.client.retrieve_data(start_time, end_time, self.device)
+
+    def normalize(self, raw: pd.DataFrame) -> pd.DataFrame:
+        return _normalize_logger_records(raw, self.device)
+
+
+class SenseCAPSource(Source):
+    service = "sensecap"
+
+    def fetch(self, start_time: str, end_time: str) -> pd.DataFrame:
+        return self.client.get_historic_data(self.device, time_start=start_time, time_end=end_time)
+
+    def normalize(self, raw: pd.DataFrame) -> pd.DataFrame:
+        return pd.DataFrame({"timestamp": raw["timestamp"], "device": self.device,
+                             "metric": raw["channel_index"].astype(str) + "." + raw["measurement_id"].astype(str),
+                             "value": raw["measurement"]})
+
+
+def _normalize_logger_records(raw: pd.DataFrame, device: str) -> pd.DataFrame:
+    """LI-COR and HOBOlink records: one row per sensor reading, identified by sensor serial number when present."""
+    metric = raw["sensor_sn"] if "sensor_sn" in raw.columns else raw.get("sensor_measurement_type", pd.Series("value", index=raw.index))
+    value = raw["si_value"] if "si_value" in raw.columns else raw["value"]
+    loggers = raw["logger_sn"] if "logger_sn" in raw.columns else device
+    return pd.DataFrame({"timestamp": raw["timestamp"], "device": loggers, "metric": metric, "value": value})
+
+
+### SCHEDULING ###
+class IngestDaemon:
+    """Poll every source on its own interval, appending new records to an IngestStore."""
+
+    def __init__(self, sources: list[Source], store: IngestStore, rollups=None, max_concurrency: int = 4,
+                 jitter: float = 0.1, initial_lookback: datetime.timedelta = datetime.timedelta(days=1),
+                 max_backoff: float = 3600, qc_rules: dict[str, dict] | None = None) -> None:
+        """
+        :param sources: devices to poll
+        :param store: where records and watermarks are kept
+        :param rollups: rollups.RollupStore updated with each batch of new records (optional)
+        :param max_concurrency: polls running at the same time
+        :param jitter: fraction of each interval added or removed at random
+        :param initial_lookback: history retrieved for a device without a watermark
+        :param max_backoff: longest delay between retries of a failing source, in seconds
+        :param qc_rules: qc.apply_qc rules. when given, only records passing every check feed the rollups
+        """
+        self.sources = sources
+        self.store = store
+        self.rollups = rollups
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self.initial_lookback = initial_lookback
+        self.max_backoff = max_backoff
+        self.qc_rules = qc_rules
+        self._failures = {source.name: 0 for source in sources}
+        self._stop = threading.Event()
+
+    def poll_once(self, source: Source) -> int:
+        """Retrieve and store new records for one source.
+
+        :return: number of new records
+        """
+        now = pd.Timestamp.now(tz="UTC").floor("s")
+        since = self.store.watermark(source.service, source.device)
+        if since is None:
+            since = now - self.initial_lookback
+
+        data = source.poll(since, now)
+        new_records = self.store.append(source.service, source.device, data)
+        if self.rollups is not None and not new_records.empty:
+            clean_records = new_records
+            if self.qc_rules is not None:
+                from qc import apply_qc
+                flagged = apply_qc(new_records, self.qc_rules, value_col="value", sensor_col="metric", group_cols=["device", "metric"])
+                clean_records = new_records[flagged["qc_flags"].to_numpy() == 0]
+            self.rollups.ingest(source.service, clean_records, device_col="device", metric_col="metric", value_col="value")
+        logger.info(f"{source.name}: {len(new_records)} new records since {since.isoformat()}")
+        return len(new_records)
+
+    def run_once(self) -> dict[str, int]:
+        """Poll every source once, within the concurrency limit.
+
+        :return: new records per source. failed sources are omitted
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = {source.name: pool.submit(self._safe_poll, source) for source in self.sources}
+        return {name: future.result() for name, future in futures.items() if future.result() is not None}
+
+    def run_forever(self) -> None:
+        """Poll until stop() is called. Failing sources are retried with exponential backoff."""
+        due = [(time.monotonic() + random.uniform(0, self.jitter) * source.interval, index) for index, source in enumerate(self.sources)]
+        heapq.heapify(due)
+        running = set()
+        lock = threading.Lock()
+
+        def finished(index, future):
+            source = self.sources[index]
+            delay = self._next_delay(source, ok=future.result() is not None)
+            with lock:
+                running.discard(index)
+                heapq.heappush(due, (time.monotonic() + delay, index))
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            while not self._stop.is_set():
+                with lock:
+                    ready = []
+                    while due and due[0][0] <= time.monotonic():
+                        ready.append(heapq.heappop(due)[1])
+                    wait = due[0][0] - time.monotonic() if due else 1.0
+                for index in ready:
+                    if index in running:
+                        continue
+                    with lock:
+                        running.add(index)
+                    future = pool.submit(self._safe_poll, self.sources[index])
+                    future.add_done_callback(lambda future, index=index: finished(index, future))
+                self._stop.wait(max(0.05, min(wait, 1.0)))
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _safe_poll(self, source: Source) -> int | None:
+        """poll_once, logging failures. Clients exit on API errors, so SystemExit is caught too."""
+        try:
+            return self.poll_once(source)
+        except (Exception, SystemExit):
+            logger.exception(f"{source.name}: poll failed")
+            return None
+
+    def _next_delay(self, source: Source, ok: bool) -> float:
+        self._failures[source.name] = 0 if ok else self._failures[source.name] + 1
+        delay = source.interval * (1 + random.uniform(-self.jitter, self.jitter))
+        if self._failures[source.name]:
+            delay = min(self.max_backoff, delay * 2 ** self._failures[source.name])
+        return delay
+
+
+def _as_utc(value: str) -> pd.Timestamp:
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+
+
+### CONFIGURATION ###
+SERVICES = ["tellus", "licor", "hobolink", "sensecap"]
+SOURCE_TYPES = {"tellus": TellusSource, "licor": LicorSource, "hobolink": HoboLinkSource, "sensecap": SenseCAPSource}
+CREDENTIALS = { # environment variables each client needs, in constructor order
+    "tellus": ["TELLUS_KEY"],
+    "licor": ["LICOR_KEY"],
+    "hobolink": ["CLIENT_ID", "CLIENT_SECRET", "USER_ID"],
+    "sensecap": ["SENSE_CAP_USER_ID", "SENSE_CAP_API_KEY"],
+}
+
+
+def client_from_env(service: str):
+    """Client for a service built from environment credentials, None when any are missing.
+
+    The client module is imported only when its credentials are present.
+    """
+    values = [os.environ.get(name) for name in CREDENTIALS[service]]
+    if not all(values):
+        return None
+    if service == "tellus":
+        from tellus import TellusClient as client_type
+    elif service == "licor":
+        from licor import LicorClient as client_type
+    elif service == "hobolink":
+        from hobolink import HoboLinkClient as client_type
+    else:
+        from sensecap import SenseCAPClient as client_type
+    return client_type(*values)
+
+
+def sources_from_env(interval: float = 300, services: list[str] | None = None) -> list[Source]:
+    """Sources for every service whose credentials are present in the environment (see README).
+
+    Client modules are imported only for the services used.
+
+    :param interval: seconds between polls of each source
+    :param services: limit to these services. all of SERVICES when omitted
+    """
+    services = services or SERVICES
+    sources = []
+
+    if "tellus" in services and (client := client_from_env("tellus")):
+        metrics = os.environ.get("TELLUS_METRICS", "sunrise.co2,sunrise.temperature").split(",")
+        for name in ["DEVICE_ID_FYE1", "DEVICE_ID_FYE2", "DEVICE_ID_CIL"]:
+            if os.environ.get(name): sources.append(TellusSource(client, os.environ[name], metrics, interval))
+
+    if "licor" in services and (client := client_from_env("licor")):
+        for name in ["DEVICE_ID_IRISH_ONE", "DEVICE_ID_IRISH_TWO", "DEVICE_ID_IRISH_THREE"]:
+            if os.environ.get(name): sources.append(LicorSource(client, os.environ[name], interval))
+
+    if "hobolink" in services and os.environ.get("LOGGER_ID") and (client := client_from_env("hobolink")):
+        sources.append(HoboLinkSource(client, os.environ["LOGGER_ID"], max(interval, 900)))  # HOBOlink issues a token per request
+
+    if "sensecap" in services and os.environ.get("SENSE_CAP_DEVICE_ID") and (client := client_from_env("sensecap")):
+        sources.append(SenseCAPSource(client, os.environ["SENSE_CAP_DEVICE_ID"], interval))
+
+    return sources
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuously ingest new records from every configured service.")
+    parser.add_argument("--db", default="ingest.sqlite", help="SQLite file for records and watermarks")
+    parser.add_argument("--rollups", default="rollups.sqlite", help="SQLite file for hourly/daily rollups. empty to disable")
+    parser.add_argument("--interval", type=float, default=300, help="seconds between polls of each source")
+    parser.add_argument("--concurrency", type=int, default=4, help="polls running at the same time")
+    parser.add_argument("--lookback-hours", type=float, default=24, help="history retrieved for a device seen for the first time")
+    parser.add_argument("--services", nargs="+", choices=SERVICES, default=SERVICES)
+    parser.add_argument("--qc", action="store_true", help="keep records failing qc.DEFAULT_RULES out of the rollups")
+    parser.add_argument("--once", action="store_true", help="poll every source once and exit. see also fetch_and_store.py")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="\t%(message)s")
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    sources = sources_from_env(args.interval, args.services)
+    if not sources:
+        parser.error("No credentials found in the environment. See README for the variables used.")
+
+    rollups = None
+    if args.rollups:
+        from rollups import RollupStore
+        rollups = RollupStore(args.rollups)
+    qc_rules = None
+    if args.qc:
+        from qc import DEFAULT_RULES
+        qc_rules = DEFAULT_RULES
+
+    daemon = IngestDaemon(sources, IngestStore(args.db), rollups=rollups, max_concurrency=args.concurrency,
+                          initial_lookback=datetime.timedelta(hours=args.lookback_hours), qc_rules=qc_rules)
+    if args.once:
+        daemon.run_once()
+    else:
+        logger.info(f"Polling {len(sources)} sources every {args.interval:g}s. Ctrl+C to stop.")
+        try:
+            daemon.run_forever()
+        except KeyboardInterrupt:
+            daemon.stop()
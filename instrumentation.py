@@ -0,0 +1,192 @@
+"""Request level instrumentation shared by the API clients.
+
+Clients report events through `emit`. Any callable registered with `add_listener` receives
+each event as a dict with at least "event", "service" and "time" keys:
+
+    request_start  endpoint, split_depth
+    request_end    endpoint, split_depth, status, seconds, bytes
+    decode         records, seconds                 (JSON to DataFrame conversion)
+    split          split_depth, reason, parts       (a range was divided into more requests)
+    rate_limited   endpoint, seconds                (a request waited for the service's rate limit)
+    coalesced      endpoint, split_depth            (an identical request in flight was shared instead of sent)
+
+`StatsAggregator` is a ready made listener summarising latency and throughput per service.
+"""
+import logging, math, threading, time
+
+import requests
+
+import rate_limit
+
+logger = logging.getLogger(__name__)
+
+_listeners = []
+_listeners_lock = threading.Lock()
+_in_flight = rate_limit.InFlight()
+
+
+def add_listener(callback) -> None:
+    """Register a callable receiving every event dict."""
+    with _listeners_lock:
+        _listeners.append(callback)
+
+
+def remove_listener(callback) -> None:
+    with _listeners_lock:
+        _listeners.remove(callback)
+
+
+def emit(event: str, service: str, **fields) -> None:
+    """Send an event to every listener. Listener errors are logged and never reach the client."""
+    if not _listeners:
+        return
+    payload = {"event": event, "service": service, "time": time.time(), **fields}
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(payload)
+        except Exception:
+            logger.exception("Instrumentation listener failed")
+
+
+def instrumented_request(service: str, method: str, url: str, split_depth: int = 0, **kwargs) -> requests.Response:
+    """Make a request with `requests`, emitting request_start and request_end events.
+
+    The request waits for the service's rate limit, and is retried after the Retry-After period
+    when throttled (429). An identical GET already in flight is shared instead of sent again.
+
+    :param service: "tellus", "licor", "hobolink" or "sensecap"
+    :param method: HTTP method
+    :param url: full request url
+    :param split_depth: how many times the requested range has been split
+    :param kwargs: passed through to `requests.request`
+    """
+    endpoint = url.rsplit("/", 1)[-1]
+    response, shared = _in_flight.run(rate_limit.request_key(method, url, **kwargs),
+                                      lambda: _send(service, method, url, endpoint, split_depth, kwargs))
+    if shared:
+        emit("coalesced", service, endpoint=endpoint, split_depth=split_depth)
+    return response
+
+
+def _send(service: str, method: str, url: str, endpoint: str, split_depth: int, kwargs: dict) -> requests.Response:
+    for attempt in range(rate_limit.MAX_THROTTLE_RETRIES + 1):
+        bucket = rate_limit.bucket(service)
+        waited = bucket.acquire() if bucket else 0
+        if waited:
+            emit("rate_limited", service, endpoint=endpoint, seconds=waited)
+
+        emit("request_start", service, endpoint=endpoint, split_depth=split_depth)
+        start = time.perf_counter()
+        response = requests.request(method, url, **kwargs)
+        emit("request_end", service, endpoint=endpoint, split_depth=split_depth, status=response.status_code,
+             seconds=time.perf_counter() - start, bytes=len(response.content))
+
+        if response.status_code != 429 or attempt == rate_limit.MAX_THROTTLE_RETRIES:
+            return response
+        delay = rate_limit.retry_after(response)
+        logger.warning(f"{service} throttled the request (429). Retrying in {delay:g}s...")
+        if bucket: bucket.pause(delay)
+        else: time.sleep(delay)
+
+
+def timed_decode(service: str, convert):
+    """Run a JSON to DataFrame conversion, emitting a decode event.
+
+    :param service: service the payload came from
+    :param convert: zero argument callable performing the conversion
+
+    :return: the conversion output
+    """
+    start = time.perf_counter()
+    output = convert()
+    emit("decode", service, records=len(output), seconds=time.perf_counter() - start)
+    return output
+
+
+class StatsAggregator:
+    """Listener collecting per service latency, payload and decode statistics.
+
+        stats = StatsAggregator()
+        add_listener(stats)
+        client.retrieve_data(...)
+        print(stats.report())
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._services = {}
+
+    def __call__(self, event: dict) -> None:
+        with self._lock:
+            stats = self._services.setdefault(event["service"], {
+                "latencies": [], "bytes": 0, "records": 0, "decode_seconds": 0.0,
+                "errors": 0, "throttled": 0, "coalesced": 0, "rate_limited_seconds": 0.0,
+                "max_split_depth": 0, "first": None, "last": None,
+            })
+            stats["first"] = event["time"] if stats["first"] is None else min(stats["first"], event["time"])
+            stats["last"] = event["time"] if stats["last"] is None else max(stats["last"], event["time"])
+
+            if event["event"] == "request_end":
+                stats["latencies"].append(event["seconds"])
+                stats["bytes"] += event["bytes"]
+                if event["status"] == 429: stats["throttled"] += 1
+                elif event["status"] >= 400: stats["errors"] += 1
+            elif event["event"] == "decode":
+                stats["records"] += event["records"]
+                stats["decode_seconds"] += event["seconds"]
+            elif event["event"] == "coalesced":
+                stats["coalesced"] += 1
+            elif event["event"] == "rate_limited":
+                stats["rate_limited_seconds"] += event["seconds"]
+            if "split_depth" in event:
+                stats["max_split_depth"] = max(stats["max_split_depth"], event["split_depth"])
+
+    def reset(self) -> None:
+        with self._lock:
+            self._services.clear()
+
+    def summary(self) -> dict[str, dict]:
+        """Per service request count, p50/p95 latency in seconds, bytes, records, throughput, requests
+        saved by coalescing and time spent waiting for the rate limit."""
+        output = {}
+        with self._lock:
+            for service, stats in self._services.items():
+                latencies = sorted(stats["latencies"])
+                wall_seconds = max(stats["last"] - stats["first"], 1e-9)
+                output[service] = {
+                    "requests": len(latencies),
+                    "errors": stats["errors"],
+                    "throttled": stats["throttled"],
+                    "coalesced": stats["coalesced"],
+                    "rate_limited_seconds": stats["rate_limited_seconds"],
+                    "p50_latency": _percentile(latencies, 50),
+                    "p95_latency": _percentile(latencies, 95),
+                    "bytes": stats["bytes"],
+                    "records": stats["records"],
+                    "decode_seconds": stats["decode_seconds"],
+                    "max_split_depth": stats["max_split_depth"],
+                    "records_per_s": stats["records"] / wall_seconds,
+                    "bytes_per_s": stats["bytes"] / wall_seconds,
+                }
+        return output
+
+    def report(self) -> str:
+        """Summary formatted as a table."""
+        lines = [f"{'service':<10}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'MB':>9}{'records':>11}{'records/s':>12}{'decode s':>10}{'depth':>7}"]
+        for service, stats in self.summary().items():
+            lines.append(
+                f"{service:<10}{stats['requests']:>9}{stats['errors'] + stats['throttled']:>8}"
+                f"{stats['p50_latency'] * 1000:>9.1f}{stats['p95_latency'] * 1000:>9.1f}{stats['bytes'] / 2**20:>9.2f}"
+                f"{stats['records']:>11,}{stats['records_per_s']:>12,.0f}{stats['decode_seconds']:>10.3f}{stats['max_split_depth']:>7}"
+            )
+        return "\n".join(lines)
+
+
+def _percentile(ordered: list[float], percent: float) -> float:
+    """Nearest rank percentile of an already sorted list. 0 when empty."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[rank]
@@ -1,22 +1,43 @@
-import datetime, requests, sys
-from dotenv import load_dotenv
+import datetime, logging, sys
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+from instrumentation import emit, instrumented_request, timed_decode
+from splitting import fallback_split, plan_split
+from stitching import stitch
 from utils import require_env
 
+logger = logging.getLogger(__name__)
+
 class LicorClient:
     """Client class for interacting with the LI-COR API."""
     BASE_URL = "https://api.licor.cloud/v1/data"
-
-    def __init__(self, api_key: str) -> None:
+    RECORD_CAP = 100000
+    TIME_COL = "timestamp"
+    LOGGER_COL = "logger_sn"
+    SENSOR_COL = "sensor_sn"
+    SPACING_TOLERANCE = 1.5  # spacing above this multiple of the logging interval indicates downsampling
+    WINDOW_FILL = 0.8  # fraction of the record cap planned windows aim for, leaving headroom for uneven data
+
+    def __init__(self, api_key: str, logging_interval: float = 60, max_workers: int = 4, use_arrow: bool = False) -> None:
+        """
+        :param api_key: LICOR API token
+        :param logging_interval: seconds between records on the loggers being queried
+        :param max_workers: concurrent requests used when a range is split
+        :param use_arrow: decode responses with arrow_json into Arrow backed columns. requires pyarrow
+        """
         self.api_key = api_key
+        self.logging_interval = logging_interval
+        self.max_workers = max_workers
+        self.use_arrow = use_arrow
 
     def retrieve_data(self, start_time: str, end_time: str, devices: list[str]) -> pd.DataFrame:
         """Retrieve data for a specified timespan as a dataframe.
 
         Warning: LICOR reduces the granularity of results to fit a 100,000 record cap.
-        This function will automatically split the time range and make additional API calls
-        to retrieve all data, but large time ranges may take a while.
-        If this poses an issue, manual adjustment of ranges is recommended.
+        This function compares the spacing of the returned samples to the logging interval.
+        When a response has been downsampled, the request is split by logger or into time windows,
+        whichever needs fewer calls to stay under the cap at full resolution, and the parts are
+        retrieved concurrently.
         
         :param start_time: ISO 8601 format YYYY-MM-DDTHH:MM:SS+H:MM
         :param end_time: ISO 8601 format YYYY-MM-DDTHH:MM:SS+H:MM
@@ -24,11 +45,66 @@ class LicorClient:
 
         :return: Pandas dataframe with timestamp, location, device nickname, data, etc
         """
-        # Convert ISO 8601 format to LICOR format (YYYY-MM-DD HH:mm:SS)
         dt_start = datetime.datetime.fromisoformat(start_time)
-        start_time = dt_start.strftime("%Y-%m-%d %H:%M:%S") #IS THIS ACCOUNTING FOR TIMEZONE INFO
-
         dt_end = datetime.datetime.fromisoformat(end_time)
+
+        frames = self._retrieve_windows([(dt_start, dt_end, devices)])
+        if len(frames) > 1:
+            combined_df = self._stitch(frames)  # single concatenation regardless of split depth
+            logger.info(f"Successfully combined data: {combined_df.shape[0]} total records")
+            return combined_df
+        return frames[0]
+
+    def _retrieve_windows(self, windows: list[tuple[datetime.datetime, datetime.datetime, list[str]]], split_depth: int = 0) -> list[pd.DataFrame]:
+        """Retrieve each window concurrently, replanning any window that comes back downsampled.
+
+        :param windows: start, end and device IDs of each request
+        :param split_depth: number of times the original range has been split
+
+        :return: one full resolution dataframe per final window
+        """
+        if len(windows) == 1:
+            responses = [self._request(*windows[0], split_depth)]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                responses = list(pool.map(lambda window: self._request(*window, split_depth), windows))
+
+        frames = []
+        for window, df in zip(windows, responses):
+            sub_windows = self._replan(window, df, split_depth)
+            if sub_windows: frames.extend(self._retrieve_windows(sub_windows, split_depth + 1))
+            else: frames.append(df)
+        return frames
+
+    def _replan(self, window: tuple[datetime.datetime, datetime.datetime, list[str]], df: pd.DataFrame, split_depth: int = 0) -> list[tuple[datetime.datetime, datetime.datetime, list[str]]]:
+        """Windows to retrieve in place of a downsampled response. Empty when the response is full resolution."""
+        if not self._is_downsampled(df):
+            return []
+        sub_windows = self._plan_windows(df, *window)
+        logger.warning(f"LICOR data from {window[0]} to {window[1]} is downsampled. Splitting into {len(sub_windows)} requests...")
+        emit("split", "licor", split_depth=split_depth + 1, reason="downsampled", parts=len(sub_windows))
+        return sub_windows
+
+    def _request(self, dt_start: datetime.datetime, dt_end: datetime.datetime, devices: list[str], split_depth: int = 0) -> pd.DataFrame:
+        """Make a single API call.
+
+        :param dt_start: start of the time range
+        :param dt_end: end of the time range
+        :param devices: device IDs
+        :param split_depth: number of times the original range has been split
+
+        :return: api output as a dataframe
+        """
+        header, payload = self._request_args(dt_start, dt_end, devices)
+
+        logger.info(f"Retrieving LICOR Data from {payload['start_date_time']} to {payload['end_date_time']}...")
+        response = instrumented_request("licor", "GET", self.BASE_URL, split_depth=split_depth, params=payload, headers=header)
+        return self._handle_response(response)
+
+    def _request_args(self, dt_start: datetime.datetime, dt_end: datetime.datetime, devices: list[str]) -> tuple[dict, dict]:
+        """Headers and query parameters for a single API call."""
+        # Convert to LICOR format (YYYY-MM-DD HH:mm:SS)
+        start_time = dt_start.strftime("%Y-%m-%d %H:%M:%S") #IS THIS ACCOUNTING FOR TIMEZONE INFO
         end_time = dt_end.strftime("%Y-%m-%d %H:%M:%S") #IS THIS ACCOUNTING FOR TIMEZONE INFO
 
         header = {
@@ -39,43 +115,95 @@ class LicorClient:
             "start_date_time": start_time,
             "end_date_time": end_time
         }
+        return header, payload
 
-        print(f"\tRetrieving LICOR Data from {start_time} to {end_time}...")
-        response = requests.get(url=self.BASE_URL, params=payload, headers=header)
+    def _handle_response(self, response) -> pd.DataFrame:
+        """Convert a response to a dataframe, exiting on API errors.
 
+        :param response: object with `status_code`, `content` and `json()`, as returned by requests
+        """
         if response.status_code == 200:
-            df = pd.DataFrame(response.json()["data"])
+            df = timed_decode("licor", lambda: self._decode_data(response))
+            logger.info(f"Success: Retrieved {df.shape[0]} records")
+            return df
+        else:
+            body = response.json()
+            logger.error(f"{response.status_code}: {body.get('error', 'Unknown error')} {body.get('error_description', '')}")
+            if 'message' in body:
+                logger.error(body['message'])
+            sys.exit(1)
 
-            if df.shape[0] == 100000:  # If result set hits the cap, recursively fetch remaining data
-                print(f"\tWarning: LICOR data pull is maxed out ({df.shape[0]} records). Splitting range...")
+    def _decode_data(self, response) -> pd.DataFrame:
+        if self.use_arrow:
+            from arrow_json import records_frame
+            return records_frame(response.content, key="data")
+        return pd.DataFrame(response.json()["data"])
 
-                # Calculate midpoint
-                start_dt = pd.to_datetime(start_time)
-                end_dt = pd.to_datetime(end_time)
-                time_diff = end_dt - start_dt
+    def _stitch(self, frames: list[pd.DataFrame]) -> pd.DataFrame:
+        """Combine window responses, dropping records returned by both windows at a shared boundary."""
+        return stitch(frames, [self.LOGGER_COL, self.SENSOR_COL, self.TIME_COL], self.TIME_COL)
 
-                mid_dt = start_dt + time_diff / 2
-                mid_time = mid_dt.strftime('%Y-%m-%d %H:%M:%S')  # LICOR format
+    def _sample_spacing(self, df: pd.DataFrame) -> float | None:
+        """Median spacing between distinct sample times in seconds, for the logger sampled most finely.
+        None when it cannot be measured.
 
-                # Recursively fetch split requests
-                first_half = self.retrieve_data(start_time, mid_time, devices)
-                second_half = self.retrieve_data(mid_time, end_time, devices)
+        Spacing is measured per logger, since interleaving loggers with offset clocks would shrink the pooled gaps.
+        """
+        if self.TIME_COL not in df.columns:
+            return None
+        samples = pd.DataFrame({
+            "logger": df[self.LOGGER_COL].to_numpy() if self.LOGGER_COL in df.columns else "",
+            "time": pd.to_datetime(df[self.TIME_COL]).to_numpy(),
+        }).drop_duplicates().sort_values(["logger", "time"])
+        gaps = samples.groupby("logger", sort=False)["time"].diff()
+        medians = gaps.groupby(samples["logger"], sort=False).median().dropna()
+        if medians.empty:
+            return None
+        return medians.min().total_seconds()
+
+    def _is_downsampled(self, df: pd.DataFrame) -> bool:
+        """Determine whether LICOR lowered the granularity of a response."""
+        if df.shape[0] >= self.RECORD_CAP:
+            return True
+        spacing = self._sample_spacing(df)
+        if spacing is None or spacing <= self.logging_interval * self.SPACING_TOLERANCE:
+            return False
+        # sparse data that would fit under the cap at full resolution is a logging gap, not downsampling
+        return df.shape[0] * spacing / self.logging_interval > self.RECORD_CAP
+
+    def _plan_windows(self, df: pd.DataFrame, dt_start: datetime.datetime, dt_end: datetime.datetime, devices: list[str]) -> list[tuple[datetime.datetime, datetime.datetime, list[str]]]:
+        """Split a request by logger and time so that each part stays under the record cap at full resolution.
+
+        :param df: downsampled response for the request
+        :param dt_start: start of the time range
+        :param dt_end: end of the time range
+        :param devices: device IDs
 
-                # Combine the results
-                combined_df = pd.concat([first_half, second_half], ignore_index=True)
-                print(f"\tSuccessfully combined data: {combined_df.shape[0]} total records")
-                return combined_df
-            else:
-                print(f"\tSuccess: Retrieved {df.shape[0]} records")
-                return df
+        :return: start, end and device IDs of each request
+        """
+        spacing = self._sample_spacing(df)
+        if spacing is None:
+            plan = fallback_split(devices)  # density unknown. fall back to halving
         else:
-            print(f"\t {response.status_code}: {response.json().get('error', 'Unknown error')} {response.json().get('error_description', '')}")
-            if 'message' in response.json():
-                print("\t", response.json()['message'])
-            sys.exit(1)
+            scale = spacing / self.logging_interval  # full resolution records per returned record
+            if self.LOGGER_COL in df.columns:
+                counts = df[self.LOGGER_COL].value_counts()
+                device_rows = {device: counts.get(device, 0) * scale for device in devices}
+            else:
+                device_rows = {device: df.shape[0] * scale / len(devices) for device in devices}
+            plan = plan_split(device_rows, self.RECORD_CAP * self.WINDOW_FILL)
+
+        windows = []
+        for sub_devices, _, window_count in plan:
+            step = (dt_end - dt_start) / window_count
+            boundaries = [dt_start + step * i for i in range(window_count)] + [dt_end]
+            windows.extend((start, end, sub_devices) for start, end in zip(boundaries[:-1], boundaries[1:]))
+        return windows
 
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv # only needed when run as a script
+    logging.basicConfig(level=logging.INFO, format="\t%(message)s")
     load_dotenv()
 
     ### LICOR SETTINGS ###
@@ -0,0 +1,177 @@
+import json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from sensecap import SenseCAPClient
+from tellus import TellusClient
+
+DEFAULT_CACHE_PATH = Path(".cache") / "metadata.json"
+DEFAULT_TTL = 24 * 60 * 60  # seconds. device lists and schemas rarely change
+
+
+class MetadataRegistry:
+    """Cache for device and schema metadata shared by the Tellus and SenseCAP clients.
+
+    Entries are held in memory and mirrored to a JSON file so that repeated workflow
+    starts do not call `/schema` or the SenseCAP device endpoints. Entries older than
+    the TTL are refetched on next use. Use `invalidate` to force a refresh.
+
+    Clients given to the registry, or built with `registry=`, answer `retrieve_device_metrics`,
+    `retrieve_device_ids` and `list_device_channels` from the cache:
+
+        client = TellusClient(TELLUS_KEY, registry=MetadataRegistry())
+    """
+
+    def __init__(self, tellus_client: TellusClient | None = None, sensecap_client: SenseCAPClient | None = None,
+                 ttl: float = DEFAULT_TTL, cache_path: str | Path | None = DEFAULT_CACHE_PATH, max_workers: int = 8) -> None:
+        """
+        :param tellus_client: client used to look up Tellus schemas (optional)
+        :param sensecap_client: client used to look up SenseCAP devices and channels (optional)
+        :param ttl: seconds before a cached entry is considered stale
+        :param cache_path: JSON file backing the cache. None keeps the cache in memory only
+        :param max_workers: concurrent lookups used by batched calls
+        """
+        self.tellus_client = None
+        self.sensecap_client = None
+        self.ttl = ttl
+        self.cache_path = Path(cache_path) if cache_path is not None else None
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        for client in (tellus_client, sensecap_client):
+            if client is not None: self.attach(client)
+
+    def attach(self, client: TellusClient | SenseCAPClient) -> None:
+        """Use a client for lookups and route its metadata calls through this registry."""
+        if isinstance(client, TellusClient): self.tellus_client = client
+        elif isinstance(client, SenseCAPClient): self.sensecap_client = client
+        else: raise TypeError(f"Only TellusClient and SenseCAPClient have metadata, got: {type(client).__name__}")
+        client.registry = self
+
+    ### CACHE MANAGEMENT ###
+    def _load(self) -> dict:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, "r") as infile:
+                return json.load(infile)
+        except (OSError, json.JSONDecodeError):
+            return {}  # a corrupt cache is treated as empty and rewritten on next store
+
+    def _save(self) -> None:
+        if self.cache_path is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.cache_path.with_suffix(".tmp")
+        with open(temp_path, "w") as outfile:
+            json.dump(self._entries, outfile)
+        os.replace(temp_path, self.cache_path)  # atomic so concurrent readers never see a partial file
+
+    def _lookup(self, key: str):
+        """Return the cached value for a key, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return entry["value"]
+
+    def _store(self, values: dict) -> None:
+        """Store several key/value pairs and persist them with a single write."""
+        now = time.time()
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = {"fetched_at": now, "value": value}
+            self._save()
+
+    def invalidate(self, service: str | None = None, device_id: str | None = None) -> None:
+        """Drop cached entries so that they are refetched on next use.
+
+        :param service: "tellus" or "sensecap". When omitted every service is cleared
+        :param device_id: limit invalidation to a single device
+        """
+        with self._lock:
+            for key in list(self._entries):
+                key_service, _, key_device = key.split(":", 2)
+                if service is not None and key_service != service: continue
+                if device_id is not None and key_device != device_id: continue
+                del self._entries[key]
+            self._save()
+
+    def _batched(self, keys: dict[str, str], fetch) -> dict:
+        """Resolve many keys at once, fetching only the ones not cached.
+
+        :param keys: cache key paired to the device id it describes
+        :param fetch: callable retrieving the value for a single device id
+
+        :return: device id paired to its value
+        """
+        output, missing = {}, {}
+        for key, device_id in keys.items():
+            value = self._lookup(key)
+            if value is None: missing[key] = device_id
+            else: output[device_id] = value
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                fetched = dict(zip(missing, pool.map(fetch, missing.values())))
+            fetched = {key: value for key, value in fetched.items() if value is not None}  # failed lookups are not cached
+            self._store(fetched)
+            output.update({missing[key]: value for key, value in fetched.items()})
+
+        return output
+
+    ### TELLUS ###
+    def tellus_metrics(self, device_ids: list[str]) -> dict[str, dict]:
+        """Get the metrics available for each device, calling `/schema` only for uncached devices.
+
+        :param device_ids: Tellus device ids
+
+        :return: device id paired to its metrics and their descriptions
+        """
+        if self.tellus_client is None:
+            raise RuntimeError("MetadataRegistry requires a TellusClient for Tellus lookups")
+        keys = {f"tellus:schema:{device_id}": device_id for device_id in device_ids}
+        return self._batched(keys, self.tellus_client._retrieve_device_metrics)
+
+    def validate_metrics(self, device_ids: list[str], metrics: list[str]) -> None:
+        """Ensure that every metric requested is offered by every device.
+
+        :param device_ids: Tellus device ids
+        :param metrics: metrics to be requested
+        :raises ValueError: occurs when a device does not support a metric
+        """
+        schemas = self.tellus_metrics(device_ids)
+        for device_id in device_ids:
+            if device_id not in schemas: continue  # schema could not be retrieved. defer to the data request
+            unknown = [metric for metric in metrics if metric not in schemas[device_id]]
+            if unknown:
+                raise ValueError(f"Device {device_id} does not support metrics: {', '.join(unknown)}")
+
+    ### SENSECAP ###
+    def sensecap_device_ids(self) -> dict[str, list]:
+        """Get SenseCAP gateway and node ids.
+
+        :return: gateways and nodes associated with the account
+        """
+        if self.sensecap_client is None:
+            raise RuntimeError("MetadataRegistry requires a SenseCAPClient for SenseCAP lookups")
+        key = "sensecap:devices:all"
+        devices = self._lookup(key)
+        if devices is None:
+            devices = self.sensecap_client._retrieve_device_ids()
+            if devices["gateways"] or devices["nodes"]:
+                self._store({key: devices})
+        return devices
+
+    def sensecap_channels(self, device_euis: list[str]) -> dict[str, list[dict]]:
+        """Get the channels of each SenseCAP device, fetching only uncached devices.
+
+        :param device_euis: device extended unique identifiers
+
+        :return: device eui paired to its channel list
+        """
+        if self.sensecap_client is None:
+            raise RuntimeError("MetadataRegistry requires a SenseCAPClient for SenseCAP lookups")
+        keys = {f"sensecap:channels:{device_eui}": device_eui for device_eui in device_euis}
+        return self._batched(keys, self.sensecap_client._list_device_channels)
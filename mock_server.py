@@ -0,0 +1,365 @@
+"""Local stand-in for the Tellus, LI-COR, HOBOlink and SenseCAP APIs.
+
+Serves synthetic data so that clients can be exercised and benchmarked without credentials.
+A record mode forwards requests to the real services and saves each response as a fixture,
+and a replay mode serves those fixtures back.
+
+    with MockAPIServer(MockSettings(latency=0.05)) as server:
+        client = TellusClient("any key")
+        point_clients_at(server.url, client)
+        data = client.retrieve_data(start, end, ["DEVICE1"], ["sunrise.co2"])
+
+Run directly to serve on a fixed port: python mock_server.py --port 8000 --mode synthetic
+"""
+import argparse, base64, datetime, hashlib, json, threading, time, zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import requests
+
+from hobolink import HoboLinkClient
+from licor import LicorClient
+from sensecap import SenseCAPClient
+from tellus import TellusClient
+
+UPSTREAMS = {
+    "/data": "https://api.tellusensors.com",
+    "/schema": "https://api.tellusensors.com",
+    "/v1/": "https://api.licor.cloud",
+    "/ws/": "https://webservice.hobolink.com",
+    "/openapi/": "https://sensecap.seeed.cc",
+}
+SECRET_PARAMS = {"key"}  # query parameters left out of fixture keys and files
+MOCK_TOKEN = "mock-token"
+TELLUS_METRICS = ["bme280.pressure", "bme280.temperature", "sunrise.co2", "sunrise.temperature",
+                  "pms5003t.d2_5", "pms5003t.temperature"] + TellusClient.all_analog_devices
+
+
+class MockSettings:
+    """Behaviour of the stand-in server."""
+
+    def __init__(self, mode: str = "synthetic", latency: float = 0.0, sample_interval: int = 60,
+                 tellus_max_cells: int = 400000, record_cap: int = 100000, throttle_every: int = 0,
+                 retry_after: int = 1, fixture_dir: str | Path = "fixtures") -> None:
+        """
+        :param mode: "synthetic", "record" or "replay"
+        :param latency: seconds added to every response
+        :param sample_interval: seconds between synthetic samples for each device
+        :param tellus_max_cells: Tellus responses with more values than this (rows x columns) return 413
+        :param record_cap: LI-COR downsamples and HOBOlink truncates above this many records
+        :param throttle_every: every Nth request returns 429. 0 disables throttling
+        :param retry_after: seconds sent in the Retry-After header of 429 responses
+        :param fixture_dir: where record mode writes and replay mode reads fixtures
+        """
+        if mode not in ("synthetic", "record", "replay"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.mode = mode
+        self.latency = latency
+        self.sample_interval = sample_interval
+        self.tellus_max_cells = tellus_max_cells
+        self.record_cap = record_cap
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.fixture_dir = Path(fixture_dir)
+
+
+### SYNTHETIC DATA ###
+def _parse_time(value: str) -> datetime.datetime:
+    """Parse ISO 8601, "YYYY-MM-DD HH:MM:SS" or unix milliseconds into a UTC datetime."""
+    try:
+        return datetime.datetime.fromtimestamp(float(value) / 1000, datetime.timezone.utc)
+    except ValueError:
+        parsed = datetime.datetime.fromisoformat(value.replace(" ", "T"))
+        if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.astimezone(datetime.timezone.utc)
+
+
+def _sample_times(start: str, end: str, interval: int, step: int = 1) -> np.ndarray:
+    """Unix seconds of every sample between two times, aligned to the interval."""
+    start_s = int(_parse_time(start).timestamp())
+    end_s = int(_parse_time(end).timestamp())
+    first = -(-start_s // interval) * interval
+    return np.arange(first, end_s + 1, interval * step, dtype=np.int64)
+
+
+def _sample_count(start: str, end: str, interval: int) -> int:
+    return _sample_times(start, end, interval).shape[0]
+
+
+def _series(name: str, times: np.ndarray) -> np.ndarray:
+    """Deterministic daily cycle with noise, seeded by the series name."""
+    seed = zlib.crc32(name.encode())
+    noise = np.random.default_rng(seed).normal(0, 0.5, times.shape[0])
+    return np.round(20 + (seed % 10) + 5 * np.sin(times * 2 * np.pi / 86400) + noise, 3)
+
+
+def _iso(times: np.ndarray, sep: str = "T", suffix: str = "Z") -> list[str]:
+    stamps = np.datetime_as_string(times.astype("datetime64[s]"), unit="s")
+    return [stamp.replace("T", sep) + suffix for stamp in stamps]
+
+
+def tellus_data(params: dict, settings: MockSettings) -> tuple[int, object]:
+    devices = params.get("deviceId", "").split(",")
+    metrics = params.get("metric", "").split(",")
+    count = _sample_count(params["start"], params["end"], settings.sample_interval) * len(devices)
+    if count * (len(TellusClient.META_COLS) + len(metrics)) > settings.tellus_max_cells:
+        return 413, {"detail": "Request entity too large"}
+
+    times = _sample_times(params["start"], params["end"], settings.sample_interval)
+    stamps = _iso(times)
+    records = []
+    for index, device in enumerate(devices):
+        values = {metric: _series(device + metric, times).tolist() for metric in metrics}
+        for row, stamp in enumerate(stamps):
+            record = {"timestamp": stamp, "deviceId": device, "longitude": -86.24 + index / 100,
+                      "latitude": 41.70 + index / 100, "nickname": f"mock-{device}"}
+            record.update({metric: values[metric][row] for metric in metrics})
+            records.append(record)
+    return 200, records
+
+
+def tellus_schema(params: dict, settings: MockSettings) -> tuple[int, object]:
+    return 200, {"fields": [{"name": metric, "description": f"mock {metric}"} for metric in TELLUS_METRICS]}
+
+
+def _long_records(loggers: list[str], times: np.ndarray, sep: str) -> list[dict]:
+    stamps = _iso(times, sep=sep, suffix="")
+    records = []
+    for logger in loggers:
+        values = _series(logger, times).tolist()
+        records.extend({"timestamp": stamp, "logger_sn": logger, "value": value} for stamp, value in zip(stamps, values))
+    return records
+
+
+def licor_data(params: dict, settings: MockSettings) -> tuple[int, object]:
+    loggers = params.get("loggers", "").split(",")
+    count = _sample_count(params["start_date_time"], params["end_date_time"], settings.sample_interval) * len(loggers)
+    step = max(1, -(-count // settings.record_cap))  # LI-COR lowers granularity to fit the cap
+    times = _sample_times(params["start_date_time"], params["end_date_time"], settings.sample_interval, step)
+    return 200, {"data": _long_records(loggers, times, sep=" ")}
+
+
+def hobolink_data(params: dict, settings: MockSettings) -> tuple[int, object]:
+    loggers = params.get("loggers", "").split(",")
+    times = _sample_times(params["start_date_time"], params["end_date_time"], settings.sample_interval)
+    records = _long_records(loggers, times, sep=" ")[:settings.record_cap]  # HOBOlink truncates at the cap
+    for record in records:
+        record.update({"sensor_measurement_type": "Temperature", "unit": "°C"})
+    return 200, {"observation_list": records}
+
+
+def sensecap(path: str, params: dict, settings: MockSettings) -> tuple[int, object]:
+    ok = {"code": "0", "msg": "success"}
+    device = params.get("device_eui", "2CF7F1C000000000")
+    now_ms = str(int(time.time() * 1000))
+    if path == "device/list_euis":
+        return 200, {**ok, "data": {"gateway": ["2CF7F1C0GATEWAY0"], "node": [device]}}
+    if path.startswith("channel/list/"):
+        return 200, {**ok, "data": [{"channel_index": 1, "measurement_ids": ["4097", "4098"]}]}
+    if path == "view_latest_telemetry_data":
+        return 200, {**ok, "data": [{"channel_index": 1, "points": [{"measurement_id": "4097", "measurement_value": 21.5, "time": now_ms}]}]}
+
+    start = params.get("time_start", str(int(time.time() * 1000) - 86400000))
+    end = params.get("time_end", now_ms)
+    times = _sample_times(start, end, settings.sample_interval)
+    if path == "list_telemetry_data":
+        values = _series(device, times).tolist()
+        return 200, {**ok, "data": {"list": [[[1, "4097"]], [[[value, stamp] for value, stamp in zip(values, _iso(times))]]]}}
+    if path == "aggregate_chart_points":
+        hourly = times[::max(1, 3600 // settings.sample_interval)]
+        values = _series(device, hourly).tolist()
+        return 200, {**ok, "data": [{"channel": 1, "lists": [{"time": stamp, "measurement_id": "4097", "average_value": value}
+                                                              for stamp, value in zip(_iso(hourly), values)]}]}
+    return 404, {**ok, "code": "404", "msg": f"Unknown endpoint {path}"}
+
+
+### REQUEST HANDLING ###
+class _Handler(BaseHTTPRequestHandler):
+    server: "MockAPIServer"
+
+    def log_message(self, format, *args) -> None:
+        pass  # keep benchmark output clean
+
+    def do_GET(self) -> None:
+        self._handle()
+
+    def do_POST(self) -> None:
+        self._handle()
+
+    def _handle(self) -> None:
+        settings = self.server.settings
+        if settings.latency: time.sleep(settings.latency)
+
+        split = urlsplit(self.path)
+        params = dict(parse_qsl(split.query))
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+
+        if self.server.should_throttle():
+            self._send(429, {"detail": "Too many requests"}, {"Retry-After": str(settings.retry_after)})
+        elif settings.mode == "synthetic":
+            self._send(*self._synthetic(split.path, params))
+        elif settings.mode == "record":
+            self._record(split, params, body)
+        else:
+            self._replay(split.path, params)
+
+    def _synthetic(self, path: str, params: dict) -> tuple[int, object]:
+        settings = self.server.settings
+        if path == "/data": return tellus_data(params, settings)
+        if path == "/schema": return tellus_schema(params, settings)
+        if path == "/v1/data": return licor_data(params, settings)
+        if path == "/ws/auth/token":
+            if not self.headers.get("Authorization", "").startswith("Basic "):
+                return 401, {"error": "invalid_client"}
+            return 200, {"access_token": MOCK_TOKEN, "token_type": "bearer"}
+        if path.startswith("/ws/data/file/JSON/user/"):
+            if self.headers.get("Authorization") != f"Bearer {MOCK_TOKEN}":
+                return 401, {"error": "invalid_token"}
+            return hobolink_data(params, settings)
+        if path.startswith("/openapi/"): return sensecap(path[len("/openapi/"):], params, settings)
+        return 404, {"detail": f"Unknown endpoint {path}"}
+
+    def _record(self, split, params: dict, body: bytes) -> None:
+        upstream = next((host for prefix, host in UPSTREAMS.items() if split.path.startswith(prefix)), None)
+        if upstream is None:
+            self._send(404, {"detail": f"No upstream for {split.path}"})
+            return
+
+        forward_headers = {key: value for key, value in self.headers.items() if key.lower() not in ("host", "content-length")}
+        response = requests.request(self.command, f"{upstream}{self.path}", headers=forward_headers, data=body or None, allow_redirects=False)
+        self.server.save_fixture(self.command, split.path, params, response.status_code, response.content)
+        self._send_raw(response.status_code, response.content)
+
+    def _replay(self, path: str, params: dict) -> None:
+        fixture = self.server.load_fixture(self.command, path, params)
+        if fixture is None:
+            self._send(404, {"detail": f"No fixture recorded for {self.command} {path}"})
+        else:
+            self._send_raw(fixture["status"], base64.b64decode(fixture["body"]))
+
+    def _send(self, status: int, payload: object, headers: dict | None = None) -> None:
+        self._send_raw(status, json.dumps(payload).encode(), headers)
+
+    def _send_raw(self, status: int, body: bytes, headers: dict | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """Threaded HTTP server emulating every service on a single host."""
+    daemon_threads = True
+
+    def __init__(self, settings: MockSettings | None = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        """
+        :param settings: server behaviour. defaults to synthetic data with no latency
+        :param host: interface to bind
+        :param port: port to bind. 0 picks a free port
+        """
+        super().__init__((host, port), _Handler)
+        self.settings = settings or MockSettings()
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockAPIServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "MockAPIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def should_throttle(self) -> bool:
+        with self._count_lock:
+            self.request_count += 1
+            count = self.request_count
+        return bool(self.settings.throttle_every) and count % self.settings.throttle_every == 0
+
+    ### FIXTURES ###
+    def _fixture_path(self, method: str, path: str, params: dict) -> Path:
+        public_params = sorted((key, value) for key, value in params.items() if key not in SECRET_PARAMS)
+        digest = hashlib.sha1(json.dumps([method, path, public_params]).encode()).hexdigest()[:16]
+        return self.settings.fixture_dir / f"{path.strip('/').replace('/', '_')}-{digest}.json"
+
+    def save_fixture(self, method: str, path: str, params: dict, status: int, body: bytes) -> None:
+        fixture_path = self._fixture_path(method, path, params)
+        fixture_path.parent.mkdir(parents=True, exist_ok=True)
+        fixture = {
+            "method": method,
+            "path": path,
+            "params": {key: value for key, value in params.items() if key not in SECRET_PARAMS},
+            "status": status,
+            "body": base64.b64encode(body).decode(),
+        }
+        with open(fixture_path, "w") as outfile:
+            json.dump(fixture, outfile)
+
+    def load_fixture(self, method: str, path: str, params: dict) -> dict | None:
+        fixture_path = self._fixture_path(method, path, params)
+        if not fixture_path.exists():
+            return None
+        with open(fixture_path, "r") as infile:
+            return json.load(infile)
+
+
+def point_clients_at(base_url: str, *clients) -> None:
+    """Redirect client instances to a stand-in server.
+
+    :param base_url: server root, e.g. MockAPIServer.url
+    :param clients: any mix of TellusClient, LicorClient, HoboLinkClient and SenseCAPClient
+    """
+    for client in clients:
+        if isinstance(client, TellusClient):
+            client.BASE_URL = base_url
+        elif isinstance(client, LicorClient):
+            client.BASE_URL = f"{base_url}/v1/data"
+        elif isinstance(client, HoboLinkClient):
+            client.AUTH_SERVER = f"{base_url}/ws/auth/token"
+            client.BASE_URL = f"{base_url}/ws/data/file/JSON/user"
+        elif isinstance(client, SenseCAPClient):
+            client.BASE_URL = f"{base_url}/openapi"
+        else:
+            raise TypeError(f"Unsupported client: {type(client).__name__}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the sensor APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mode", choices=["synthetic", "record", "replay"], default="synthetic")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--sample-interval", type=int, default=60, help="seconds between synthetic samples")
+    parser.add_argument("--tellus-max-cells", type=int, default=400000, help="Tellus returns 413 above this many values")
+    parser.add_argument("--record-cap", type=int, default=100000, help="LI-COR/HOBOlink record cap")
+    parser.add_argument("--throttle-every", type=int, default=0, help="return 429 for every Nth request")
+    parser.add_argument("--fixtures", default="fixtures", help="fixture directory for record/replay")
+    args = parser.parse_args()
+
+    settings = MockSettings(mode=args.mode, latency=args.latency, sample_interval=args.sample_interval,
+                            tellus_max_cells=args.tellus_max_cells, record_cap=args.record_cap,
+                            throttle_every=args.throttle_every, fixture_dir=args.fixtures)
+    server = MockAPIServer(settings, args.host, args.port)
+    print(f"Serving {args.mode} responses on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
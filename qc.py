@@ -0,0 +1,147 @@
+"""Quality control flags for sensor data from any of the services.
+
+`apply_qc` adds a `qc_flags` bitmask column. A row with qc_flags == 0 passed every check.
+
+    RANGE       value outside the sensor's [min, max]
+    RATE        change from the previous reading faster than max_rate (units per second)
+    FLAT        part of a run of at least flat_count identical consecutive readings
+    DUPLICATE   repeats the timestamp of an earlier row for the same device and sensor
+    REGRESSION  timestamp earlier than the row received before it for the same device and sensor
+    MISSING     value is missing or not numeric, or the timestamp is missing
+
+Checks are configured per sensor with a dict of rules. Keys left out of a rule, and sensors
+without a rule, skip that check. The "*" rule applies to sensors without their own:
+
+    rules = {"sunrise.co2": {"min": 0, "max": 10000, "max_rate": 50, "flat_count": 60}, "*": {"flat_count": 120}}
+    data = apply_qc(tellus_client.retrieve_data(...), rules)
+    clean = data[data["qc_flags"] == 0]
+
+Every check is a grouped vectorized operation on the whole frame, so cost grows linearly
+with row count.
+"""
+import enum
+
+import numpy as np
+import pandas as pd
+
+
+class QCFlag(enum.IntFlag):
+    RANGE = 1
+    RATE = 2
+    FLAT = 4
+    DUPLICATE = 8
+    REGRESSION = 16
+    MISSING = 32
+
+
+# starting points for common sensors. adjust for local conditions
+DEFAULT_RULES = {
+    "sunrise.co2": {"min": 300, "max": 10000, "max_rate": 20, "flat_count": 60},  # ppm
+    "sunrise.temperature": {"min": -40, "max": 60, "max_rate": 0.1, "flat_count": 180},  # °C
+    "bme280.temperature": {"min": -40, "max": 60, "max_rate": 0.1, "flat_count": 180},  # °C
+    "pms5003t.temperature": {"min": -40, "max": 60, "max_rate": 0.1, "flat_count": 180},  # °C
+    "bme280.pressure": {"min": 85000, "max": 110000, "max_rate": 10},  # Pa
+    "pms5003t.d2_5": {"min": 0, "max": 1000},  # µg/m³. clean air legitimately reads 0 for long periods
+    "Temperature": {"min": -40, "max": 60, "max_rate": 0.1, "flat_count": 180},  # HOBOlink, °C
+}
+
+
+def apply_qc(data: pd.DataFrame, rules: dict[str, dict] = DEFAULT_RULES, time_col: str = "timestamp",
+             value_col: str = "measurement", sensor_col: str = "sensor", group_cols: list[str] | None = None,
+             flag_col: str = "qc_flags") -> pd.DataFrame:
+    """Flag suspect rows. Defaults match TellusClient.retrieve_data long format output.
+
+    Rows are compared with their neighbours in time within each device and sensor. Row order is
+    treated as arrival order for the REGRESSION check.
+
+    :param data: one row per reading
+    :param rules: sensor name paired to its checks: min, max, max_rate, flat_count
+    :param time_col: column holding reading times
+    :param value_col: column holding readings
+    :param sensor_col: column naming the sensor a rule is looked up by
+    :param group_cols: columns identifying one stream. device and sensor columns by default
+    :param flag_col: name of the added column
+
+    :return: copy of data with a uint8 bitmask column
+    """
+    if group_cols is None:
+        group_cols = [col for col in ["deviceId", "device", "logger_sn", "sensor_sn"] if col in data.columns][:1] + [sensor_col]
+    n = len(data)
+    flags = np.zeros(n, dtype=np.uint8)
+    if n == 0:
+        return data.assign(**{flag_col: flags})
+
+    times = _as_nanoseconds(data[time_col])
+    values = pd.to_numeric(data[value_col], errors="coerce").to_numpy(dtype=float)
+    groups = data.groupby(group_cols, sort=False, dropna=False).ngroup().to_numpy()
+    sensor_codes, sensor_names = pd.factorize(data[sensor_col], use_na_sentinel=False)  # rules are looked up once per sensor
+
+    missing_time = times == np.iinfo(np.int64).min  # NaT
+    flags[np.isnan(values) | missing_time] |= np.uint8(QCFlag.MISSING)
+
+    ### RANGE ###
+    low, high = _rule_values(sensor_codes, sensor_names, rules, "min"), _rule_values(sensor_codes, sensor_names, rules, "max")
+    with np.errstate(invalid="ignore"):
+        flags[(values < low) | (values > high)] |= np.uint8(QCFlag.RANGE)
+
+    ### ARRIVAL ORDER CHECKS ###
+    arrival = np.argsort(groups, kind="stable")  # rows of each stream in the order received
+    same_stream = groups[arrival][1:] == groups[arrival][:-1]
+    timed = ~missing_time[arrival]
+    regressed = same_stream & timed[1:] & timed[:-1] & (times[arrival][1:] < times[arrival][:-1])
+    flags[arrival[1:][regressed]] |= np.uint8(QCFlag.REGRESSION)
+
+    duplicated = pd.DataFrame({"group": groups, "time": times}).duplicated(keep="first").to_numpy()
+    flags[duplicated] |= np.uint8(QCFlag.DUPLICATE)
+
+    ### TIME ORDER CHECKS ###
+    order = np.lexsort((times, groups))  # by stream, then time. ties keep arrival order
+    ordered_values = values[order]
+    continues = groups[order][1:] == groups[order][:-1]
+
+    max_rate = _rule_values(sensor_codes, sensor_names, rules, "max_rate")[order][1:]
+    seconds = np.diff(times[order]) / 1e9
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.abs(np.diff(ordered_values)) / seconds
+        too_fast = continues & (seconds > 0) & (rate > max_rate)
+    flags[order[1:][too_fast]] |= np.uint8(QCFlag.RATE)
+
+    flat_count = _rule_values(sensor_codes, sensor_names, rules, "flat_count")[order]
+    new_run = np.r_[True, ~continues | (ordered_values[1:] != ordered_values[:-1])]
+    run_ids = np.cumsum(new_run) - 1
+    run_lengths = np.bincount(run_ids)[run_ids]
+    flags[order[run_lengths >= flat_count]] |= np.uint8(QCFlag.FLAT)
+
+    return data.assign(**{flag_col: flags})
+
+
+def summarize_qc(data: pd.DataFrame, by: list[str] | str = "sensor", flag_col: str = "qc_flags") -> pd.DataFrame:
+    """Rows, rows passing and rows raising each flag per group.
+
+    :param data: output of apply_qc
+    :param by: grouping columns
+    :param flag_col: bitmask column
+    """
+    flags = data[flag_col].to_numpy()
+    counts = pd.DataFrame({flag.name.lower(): (flags & flag) > 0 for flag in QCFlag}, index=data.index)
+    counts["passed"] = flags == 0
+    counts["rows"] = 1
+    keys = [by] if isinstance(by, str) else by
+    return counts.groupby([data[key] for key in keys]).sum()[["rows", "passed"] + [flag.name.lower() for flag in QCFlag]]
+
+
+def _rule_values(sensor_codes: np.ndarray, sensor_names, rules: dict[str, dict], key: str) -> np.ndarray:
+    """One rule setting per row. Checks that are not configured get a value that never triggers."""
+    never = {"min": -np.inf, "max": np.inf, "max_rate": np.inf, "flat_count": np.inf}[key]
+    default = rules.get("*", {}).get(key, never)
+    per_sensor = np.array([rules.get(name, {}).get(key, default) if name != "*" else default for name in sensor_names], dtype=float)
+    return per_sensor[sensor_codes]
+
+
+def _as_nanoseconds(column: pd.Series) -> np.ndarray:
+    """Reading times as int64 nanoseconds since the epoch (UTC). Missing times become NaT's integer value."""
+    if not pd.api.types.is_datetime64_any_dtype(column):
+        column = pd.to_datetime(column, utc=True, format="ISO8601")
+    if column.dt.tz is not None:
+        column = column.dt.tz_convert(None)
+    return column.to_numpy("datetime64[ns]").view(np.int64)
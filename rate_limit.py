@@ -0,0 +1,185 @@
+"""Client side rate limiting and request coalescing, shared by every client in the process.
+
+Each service has one TokenBucket. Every request, from any client, thread or event loop,
+takes a token from its service's bucket first, so that workflows running side by side stay
+within the vendor's quota together. A 429 response empties the bucket for the Retry-After
+period before the request is retried.
+
+Identical GET requests (same url, parameters, headers and credentials) that are in flight at
+the same time are coalesced: the first is sent and every other caller receives its response.
+Completed responses are not cached.
+
+    rate_limit.set_rate_limit("tellus", 2, burst=4)   # requests per second
+    rate_limit.set_rate_limit("licor", None)          # no limit
+"""
+import email.utils, threading, time
+from concurrent.futures import Future
+
+DEFAULT_LIMITS = {  # requests per second and burst size
+    "tellus": (5, 10),
+    "licor": (5, 10),
+    "hobolink": (1, 2),  # every data request is preceded by a token request
+    "sensecap": (5, 10),
+}
+MAX_THROTTLE_RETRIES = 3  # attempts after a 429 before the response is returned to the client
+DEFAULT_RETRY_AFTER = 1.0  # seconds, when a 429 response does not say
+
+
+class TokenBucket:
+    """Thread-safe token bucket. Callers reserve tokens and are told how long to wait for them.
+
+    Reservations may take the bucket below zero, so waiting callers are served in the order
+    they reserved rather than racing for each refill.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        """
+        :param rate: tokens added per second
+        :param capacity: most tokens held, i.e. the largest burst. rate by default
+        """
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got: {rate}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take tokens, returning the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take tokens, sleeping until they are available. Returns the seconds slept."""
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """Grant nothing for the next seconds, e.g. after a 429 response."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+_buckets = {service: TokenBucket(rate, burst) for service, (rate, burst) in DEFAULT_LIMITS.items()}
+_buckets_lock = threading.Lock()
+
+
+def set_rate_limit(service: str, rate: float | None, burst: float | None = None) -> None:
+    """Replace a service's limit.
+
+    :param service: "tellus", "licor", "hobolink" or "sensecap"
+    :param rate: requests per second. None removes the limit
+    :param burst: requests allowed at once after an idle period. rate by default
+    """
+    with _buckets_lock:
+        if rate is None: _buckets.pop(service, None)
+        else: _buckets[service] = TokenBucket(rate, burst)
+
+
+def bucket(service: str) -> TokenBucket | None:
+    """The service's bucket. None when it is not limited."""
+    with _buckets_lock:
+        return _buckets.get(service)
+
+
+def retry_after(response) -> float:
+    """Seconds to wait after a 429 response, from its Retry-After header (seconds or HTTP date)."""
+    value = (getattr(response, "headers", None) or {}).get("Retry-After")
+    if value is None:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+### COALESCING ###
+def request_key(method: str, url: str, **kwargs) -> tuple | None:
+    """Identity of a request for coalescing. None for requests that must not be shared (anything but GET)."""
+    if method.upper() != "GET":
+        return None
+    return (url, *(_freeze(kwargs.get(name)) for name in ["params", "headers", "auth", "data", "json"]))
+
+
+def _freeze(value):
+    """Hashable equivalent of request arguments."""
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if hasattr(value, "username") and hasattr(value, "password"):  # requests and aiohttp basic auth
+        return ("auth", value.username, value.password)
+    if value is None or isinstance(value, (str, int, float, bool, bytes)):
+        return value
+    return repr(value)
+
+
+class InFlight:
+    """Runs one call per key at a time. Callers arriving while it runs share its result."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def run(self, key, call) -> tuple[object, bool]:
+        """
+        :param key: request_key output. None runs the call without sharing
+        :param call: zero argument callable
+
+        :return: the call's result, and whether it was shared from another caller
+        """
+        if key is None:
+            return call(), False
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = call()
+            future.set_result(result)
+            return result, False
+        except BaseException as error:  # e.g. connection errors. waiting callers receive the same error
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncInFlight:
+    """InFlight for coroutines. Belongs to a single event loop."""
+
+    def __init__(self) -> None:
+        self._calls = {}
+
+    async def run(self, key, call) -> tuple[object, bool]:
+        """See InFlight.run. call returns an awaitable."""
+        import asyncio  # only loaded by the async clients
+
+        if key is None:
+            return await call(), False
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = self._calls[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), shared  # a cancelled caller does not cancel the request others wait on
@@ -0,0 +1,166 @@
+"""Hourly and daily aggregates of sensor data, maintained incrementally in SQLite.
+
+Each bucket stores count, sum, sum of squares, min and max per service, device and metric.
+These combine exactly, so ingesting a new batch only updates the buckets it touches and any
+longer period (a night, a week, a month) can be answered by summing buckets.
+
+    store = RollupStore("rollups.sqlite")
+    store.ingest("tellus", client.retrieve_data(start, end, devices, metrics))
+    daily = store.query("tellus", "day", "2025-01-01", "2025-12-31", metrics=["sunrise.temperature"])
+
+Buckets are aligned to UTC: naive timestamps are taken as UTC and a daily bucket is a UTC day.
+Hourly buckets can be regrouped into local days with `aggregate`.
+
+Ingestion assumes each raw record is seen once. Pair it with watermarked retrieval so that
+overlapping pulls do not count records twice.
+"""
+import sqlite3, threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+GRANULARITIES = {"hour": "h", "day": "D"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    service TEXT NOT NULL,
+    device TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    sum_sq REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (service, device, metric, granularity, bucket)
+);
+CREATE INDEX IF NOT EXISTS rollups_by_bucket ON rollups (service, granularity, bucket);
+"""
+
+UPSERT = """
+INSERT INTO rollups (service, device, metric, granularity, bucket, count, sum, sum_sq, min, max)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (service, device, metric, granularity, bucket) DO UPDATE SET
+    count = count + excluded.count,
+    sum = sum + excluded.sum,
+    sum_sq = sum_sq + excluded.sum_sq,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max)
+"""
+
+
+class RollupStore:
+    """Incrementally maintained hourly and daily aggregates."""
+
+    def __init__(self, path: str | Path = "rollups.sqlite") -> None:
+        """
+        :param path: SQLite database file. ":memory:" keeps the store in memory
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def ingest(self, service: str, data: pd.DataFrame, time_col: str = "timestamp", device_col: str = "deviceId",
+               metric_col: str = "sensor", value_col: str = "measurement") -> int:
+        """Fold long format raw data into the hourly and daily buckets.
+
+        The default column names match TellusClient.retrieve_data output.
+
+        :param service: source service, e.g. "tellus"
+        :param data: one row per measurement
+        :param time_col: column holding measurement times
+        :param device_col: column identifying the device
+        :param metric_col: column identifying the metric
+        :param value_col: column holding numeric values
+
+        :return: number of buckets updated
+        """
+        frame = pd.DataFrame({
+            "timestamp": pd.to_datetime(data[time_col], utc=True),
+            "device": data[device_col].astype(str),
+            "metric": data[metric_col].astype(str),
+            "value": pd.to_numeric(data[value_col], errors="coerce"),
+        }).dropna(subset=["timestamp", "value"])
+        if frame.empty:
+            return 0
+        frame["value_sq"] = frame["value"] ** 2
+
+        rows = []
+        for granularity, frequency in GRANULARITIES.items():
+            frame["bucket"] = frame["timestamp"].dt.floor(frequency)
+            buckets = frame.groupby(["device", "metric", "bucket"], sort=False).agg(
+                count=("value", "size"), sum=("value", "sum"), sum_sq=("value_sq", "sum"),
+                min=("value", "min"), max=("value", "max"),
+            ).reset_index()
+            buckets["bucket"] = buckets["bucket"].map(pd.Timestamp.isoformat)
+            rows.extend(
+                (service, device, metric, granularity, bucket, int(count), float(total), float(total_sq), float(low), float(high))
+                for device, metric, bucket, count, total, total_sq, low, high in buckets.itertuples(index=False)
+            )
+
+        with self._lock, self._connection:
+            self._connection.executemany(UPSERT, rows)
+        return len(rows)
+
+    def query(self, service: str, granularity: str, start: str, end: str,
+              devices: list[str] | None = None, metrics: list[str] | None = None) -> pd.DataFrame:
+        """Read buckets with derived mean and standard deviation.
+
+        :param service: source service
+        :param granularity: "hour" or "day"
+        :param start: first bucket to include, ISO 8601
+        :param end: buckets starting after this are excluded, ISO 8601
+        :param devices: limit to these devices (optional)
+        :param metrics: limit to these metrics (optional)
+
+        :return: one row per device, metric and bucket
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularity must be one of {list(GRANULARITIES)}, got: {granularity}")
+
+        # buckets are stored as UTC ISO 8601 strings, which sort in time order
+        sql = ("SELECT device, metric, bucket, count, sum, sum_sq, min, max FROM rollups "
+               "WHERE service = ? AND granularity = ? AND bucket >= ? AND bucket <= ?")
+        params = [service, granularity, _as_utc(start).isoformat(), _as_utc(end).isoformat()]
+        for column, values in (("device", devices), ("metric", metrics)):
+            if values:
+                sql += f" AND {column} IN ({','.join('?' * len(values))})"
+                params.extend(values)
+
+        with self._lock:
+            data = pd.read_sql_query(sql, self._connection, params=params)
+
+        data["bucket"] = pd.to_datetime(data["bucket"], utc=True)
+        return self._with_moments(data.sort_values(["device", "metric", "bucket"]).reset_index(drop=True))
+
+    def aggregate(self, buckets: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+        """Combine buckets into longer periods.
+
+        :param buckets: output of query, optionally with extra grouping columns added
+        :param by: columns to group by, e.g. ["device", "metric", "date"]
+
+        :return: count, mean, std, min and max for each group
+        """
+        combined = buckets.groupby(by).agg(count=("count", "sum"), sum=("sum", "sum"), sum_sq=("sum_sq", "sum"),
+                                           min=("min", "min"), max=("max", "max")).reset_index()
+        return self._with_moments(combined)
+
+    @staticmethod
+    def _with_moments(data: pd.DataFrame) -> pd.DataFrame:
+        data = data.copy()
+        data["mean"] = data["sum"] / data["count"]
+        variance = (data["sum_sq"] - data["count"] * data["mean"] ** 2) / (data["count"] - 1)
+        data["std"] = np.sqrt(variance.clip(lower=0)).where(data["count"] > 1)
+        return data
+
+
+def _as_utc(value: str) -> pd.Timestamp:
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
@@ -1,53 +1,78 @@
-import datetime, requests
+import datetime, logging, requests
 from requests.auth import HTTPBasicAuth
 import pandas as pd
+from instrumentation import instrumented_request, timed_decode
 from utils import require_env
 
+logger = logging.getLogger(__name__)
+
 class SenseCAPClient:
     BASE_URL = "https://sensecap.seeed.cc/openapi"
 
-    def __init__(self, api_id: str, api_key: str):
+    def __init__(self, api_id: str, api_key: str, registry=None):
+        """
+        :param api_id: SenseCAP API ID
+        :param api_key: SenseCAP API key
+        :param registry: metadata.MetadataRegistry caching device and channel lookups (optional)
+        """
         self.auth = HTTPBasicAuth(api_id, api_key)
+        self.registry = None
+        if registry is not None: registry.attach(self)
 
     def _get(self, endpoint: str, params: dict | None = {}) -> dict:
         url = f"{self.BASE_URL}/{endpoint}"
-        response = requests.get(url, auth=self.auth, params=params)
+        response = instrumented_request("sensecap", "GET", url, auth=self.auth, params=params)
         response.raise_for_status()
-        payload = response.json()
+        return self._check_payload(response.json())
+
+    @staticmethod
+    def _check_payload(payload: dict) -> dict:
+        """Raise on SenseCAP error codes and warn on empty data sets."""
         if isinstance(payload, dict) and str(payload.get("code")) != "0":
             raise RuntimeError(f"SenseCAP API error: {payload.get('msg')} ({payload.get('code')})")
 
         if payload.get("data") == []:
-            print("Warning: Empty data set retrieved.")
+            logger.warning("Empty data set retrieved.")
         return payload
 
     def retrieve_device_ids(self) -> dict[str, str]:
+        if self.registry is not None:
+            return self.registry.sensecap_device_ids()
+        return self._retrieve_device_ids()
+
+    def _retrieve_device_ids(self) -> dict[str, str]:
         end_point = "device/list_euis"
 
-        response = self._get(end_point)
+        return self._parse_device_ids(self._get(end_point))
+
+    @staticmethod
+    def _parse_device_ids(response: dict) -> dict[str, list]:
         devices = {
             "gateways": response.get("data", {}).get("gateway", []) , #get is used to provide a default value incase none is retrieved
             "nodes": response.get("data", {}).get("node", []) 
         }
 
         if devices["gateways"] == [] or devices["nodes"] == []:
-            print("Warning: Device retrieval not successful.")
-            print("Gateways:", devices["gateways"])
-            print("Nodes:", devices["nodes"])
+            logger.warning(f"Device retrieval not successful. Gateways: {devices['gateways']} Nodes: {devices['nodes']}")
 
         return devices
 
     def latest_data_point(self, device_id, channel_index="", measurement_id=""):
         endpoint = "view_latest_telemetry_data"
+        payload = self._latest_payload(device_id, channel_index, measurement_id)
+        return self._parse_latest(self._get(endpoint=endpoint, params=payload)["data"])
 
+    @staticmethod
+    def _latest_payload(device_id, channel_index="", measurement_id="") -> dict:
         payload = {
             "device_eui": device_id,
         }
         if channel_index != "": payload["channel_index"] = channel_index
         if measurement_id != "": payload["measurement_id"] = measurement_id
+        return payload
 
-        sensecap_response = self._get(endpoint=endpoint, params=payload)["data"]
-
+    @staticmethod
+    def _parse_latest(sensecap_response: list) -> pd.DataFrame:
         def construct_df(channel_data):
             df = pd.DataFrame(channel_data["points"])
             df["channel_index"] = channel_data["channel_index"]
@@ -69,7 +94,12 @@ class SenseCAPClient:
         :return dataframe: 
         """
         endpoint = "list_telemetry_data"
+        payload = self._historic_payload(device_id, time_start, time_end, channel_index, sensor_id, record_limit)
+        response = self._get(endpoint=endpoint, params=payload)
+        return timed_decode("sensecap", lambda: self._parse_historic(response["data"]["list"]))
 
+    @staticmethod
+    def _historic_payload(device_id, time_start="", time_end="", channel_index="", sensor_id="", record_limit=0) -> dict:
         payload = {
             "device_eui": device_id,
         }
@@ -79,9 +109,10 @@ class SenseCAPClient:
         if time_start != "": payload["time_start"] = datetime.datetime.fromisoformat(time_start).timestamp() * 1000 #if not specified the default is one day ago
         if time_end != "": payload["time_end"] = datetime.datetime.fromisoformat(time_end).timestamp() * 1000 #if not specified the default is now
         if record_limit != 0: payload["record_limit"] = record_limit
+        return payload
 
-        sensecap_response = self._get(endpoint=endpoint, params=payload)["data"]["list"]
-
+    @staticmethod
+    def _parse_historic(sensecap_response: list) -> pd.DataFrame:
         # the structure of the response is two groups of data
         # one is sensor info, the other is readings
         # each of these is further grouped by the source sensor
@@ -110,7 +141,12 @@ class SenseCAPClient:
         :return dataframe: aggregate data
         """
         endpoint = "aggregate_chart_points"
+        payload = self._aggregate_payload(device_id, time_start, time_end, channel_index, sensor_id, interval)
+        response = self._get(endpoint=endpoint, params=payload)
+        return timed_decode("sensecap", lambda: self._parse_aggregate(response["data"]))
 
+    @staticmethod
+    def _aggregate_payload(device_id, time_start="", time_end="", channel_index="", sensor_id="", interval=0) -> dict:
         payload = {
             "device_eui": device_id,
         }
@@ -120,9 +156,10 @@ class SenseCAPClient:
         if channel_index != "": payload["channel_index"] = channel_index
         if sensor_id != "": payload["measurement_id"] = sensor_id
         if interval != 0: payload["interval"] = interval #default is 60 minutes
+        return payload
 
-        sensecap_response = self._get(endpoint=endpoint, params=payload)["data"]
-
+    @staticmethod
+    def _parse_aggregate(sensecap_response: list) -> pd.DataFrame:
         def construct_df(channel_data):
             sensor_data = channel_data["lists"]
             df = pd.DataFrame(sensor_data)
@@ -134,7 +171,15 @@ class SenseCAPClient:
         return df
 
     def list_device_channels(self, device_eui: str) -> list[dict]:
-        data = self._get(f"channel/list/{device_eui}")
+        if self.registry is not None:
+            return self.registry.sensecap_channels([device_eui])[device_eui]
+        return self._list_device_channels(device_eui)
+
+    def _list_device_channels(self, device_eui: str) -> list[dict]:
+        return self._parse_channels(self._get(f"channel/list/{device_eui}"))
+
+    @staticmethod
+    def _parse_channels(data: dict) -> list[dict]:
         channels = data.get("data", [])
         if not isinstance(channels, list):
             raise RuntimeError("Unexpected response shape for channel list")
@@ -0,0 +1,177 @@
+"""Spatial aggregation of mobile samples and matching to fixed stations.
+
+Mobile Picarro samples (workflows/methane_data_processing.py output: Latitude, Longitude, CH4)
+can be binned onto a square lat/lon grid or hexagonal cells, and matched to their nearest
+fixed station (e.g. generate_geospatial_enabled_average output: deviceId, latitude, longitude).
+
+Distances are computed on a local equirectangular projection in metres. Over the few
+kilometres a transect covers, its error is far below GPS accuracy.
+
+    cells = hex_bin(picarro, size_m=50)
+    stations = StationIndex(generate_geospatial_enabled_average(client, devices, start, end))
+    matched = stations.match(picarro, max_distance_m=500, columns=["weekly_average"])
+"""
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_M = 6371008.8
+DEFAULT_AGGS = ["count", "mean", "min", "max", "std"]
+
+
+### PROJECTION ###
+def project(lat, lon, reference_lat: float) -> tuple[np.ndarray, np.ndarray]:
+    """Latitude and longitude in degrees to x/y metres, scaled for the reference latitude."""
+    x = np.radians(np.asarray(lon, dtype=float)) * EARTH_RADIUS_M * np.cos(np.radians(reference_lat))
+    y = np.radians(np.asarray(lat, dtype=float)) * EARTH_RADIUS_M
+    return x, y
+
+
+def unproject(x, y, reference_lat: float) -> tuple[np.ndarray, np.ndarray]:
+    """Inverse of project. Returns latitude and longitude in degrees."""
+    lat = np.degrees(np.asarray(y, dtype=float) / EARTH_RADIUS_M)
+    lon = np.degrees(np.asarray(x, dtype=float) / (EARTH_RADIUS_M * np.cos(np.radians(reference_lat))))
+    return lat, lon
+
+
+def _reference_lat(lat: pd.Series) -> float:
+    # whole degrees, so that datasets from the same area share a hex grid
+    return float(np.round(np.nanmean(lat)))
+
+
+### BINNING ###
+def grid_bin(data: pd.DataFrame, cell_deg: float, value_col: str = "CH4", lat_col: str = "Latitude",
+             lon_col: str = "Longitude", aggs: list[str] = DEFAULT_AGGS) -> pd.DataFrame:
+    """Aggregate samples on a square latitude/longitude grid.
+
+    :param data: samples with coordinates in degrees
+    :param cell_deg: cell edge length in degrees
+    :param value_col: column aggregated
+    :param lat_col: latitude column
+    :param lon_col: longitude column
+    :param aggs: pandas aggregation names applied to value_col
+
+    :return: one row per occupied cell with its row/column index, center coordinates and aggregates
+    """
+    samples = data.dropna(subset=[lat_col, lon_col])
+    row = np.floor(samples[lat_col].to_numpy(dtype=float) / cell_deg).astype(np.int64)
+    col = np.floor(samples[lon_col].to_numpy(dtype=float) / cell_deg).astype(np.int64)
+
+    cells = _aggregate(samples[value_col], {"row": row, "col": col}, aggs)
+    cells.insert(2, "latitude", (cells["row"] + 0.5) * cell_deg)
+    cells.insert(3, "longitude", (cells["col"] + 0.5) * cell_deg)
+    return cells
+
+
+def hex_bin(data: pd.DataFrame, size_m: float, value_col: str = "CH4", lat_col: str = "Latitude",
+            lon_col: str = "Longitude", aggs: list[str] = DEFAULT_AGGS, reference_lat: float | None = None) -> pd.DataFrame:
+    """Aggregate samples in pointy topped hexagonal cells.
+
+    :param data: samples with coordinates in degrees
+    :param size_m: distance from a cell center to its corners in metres
+    :param value_col: column aggregated
+    :param lat_col: latitude column
+    :param lon_col: longitude column
+    :param aggs: pandas aggregation names applied to value_col
+    :param reference_lat: latitude the projection is scaled for. the data's mean rounded to a whole degree by default
+
+    :return: one row per occupied cell with its axial (q, r) index, center coordinates and aggregates
+    """
+    samples = data.dropna(subset=[lat_col, lon_col])
+    if reference_lat is None:
+        reference_lat = _reference_lat(samples[lat_col])
+    x, y = project(samples[lat_col], samples[lon_col], reference_lat)
+    q, r = _hex_round((np.sqrt(3) / 3 * x - y / 3) / size_m, (2 / 3 * y) / size_m)
+
+    cells = _aggregate(samples[value_col], {"q": q, "r": r}, aggs)
+    center_x = size_m * np.sqrt(3) * (cells["q"] + cells["r"] / 2)
+    center_y = size_m * 1.5 * cells["r"]
+    latitude, longitude = unproject(center_x, center_y, reference_lat)
+    cells.insert(2, "latitude", latitude)
+    cells.insert(3, "longitude", longitude)
+    return cells
+
+
+def _hex_round(q: np.ndarray, r: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Round fractional axial coordinates to the containing hexagon (cube coordinate rounding)."""
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def _aggregate(values: pd.Series, keys: dict[str, np.ndarray], aggs: list[str]) -> pd.DataFrame:
+    grouped = pd.Series(values.to_numpy(dtype=float)).groupby([pd.Series(key, name=name) for name, key in keys.items()], sort=True)
+    return grouped.agg(aggs).reset_index()
+
+
+### NEAREST STATION ###
+class StationIndex:
+    """KD-tree over fixed station locations for nearest station lookups. Requires scipy."""
+
+    def __init__(self, stations: pd.DataFrame, id_col: str = "deviceId", lat_col: str = "latitude", lon_col: str = "longitude") -> None:
+        """
+        :param stations: one row per station. Tellus, LI-COR and HOBOlink stations can be combined with pd.concat
+        :param id_col: column identifying each station
+        :param lat_col: latitude column
+        :param lon_col: longitude column
+        """
+        from scipy.spatial import cKDTree
+
+        stations = stations.dropna(subset=[lat_col, lon_col]).drop_duplicates(subset=id_col).reset_index(drop=True)
+        if stations.empty:
+            raise ValueError("No stations with coordinates were provided")
+
+        self.stations = stations
+        self.id_col = id_col
+        self.reference_lat = float(stations[lat_col].astype(float).mean())
+        x, y = project(stations[lat_col], stations[lon_col], self.reference_lat)
+        self._tree = cKDTree(np.column_stack([x, y]))
+
+    def nearest(self, lat, lon, max_distance_m: float = np.inf, workers: int = -1) -> tuple[np.ndarray, np.ndarray]:
+        """Position in self.stations and distance in metres of the nearest station to each point.
+
+        Points with no station within max_distance_m, or with missing coordinates, get position -1
+        and distance inf.
+
+        :param lat: latitudes in degrees
+        :param lon: longitudes in degrees
+        :param max_distance_m: largest distance a match may have
+        :param workers: threads used by the query. -1 uses every core
+        """
+        x, y = project(lat, lon, self.reference_lat)
+        points = np.column_stack([x, y])
+        finite = np.isfinite(points).all(axis=1)  # the tree rejects NaN coordinates
+        distances = np.full(len(points), np.inf)
+        positions = np.full(len(points), -1, dtype=np.int64)
+        if finite.any():
+            distances[finite], positions[finite] = self._tree.query(points[finite], distance_upper_bound=max_distance_m, workers=workers)
+        positions = np.where(np.isinf(distances), -1, positions)
+        return positions, distances
+
+    def match(self, data: pd.DataFrame, lat_col: str = "Latitude", lon_col: str = "Longitude",
+              max_distance_m: float = np.inf, columns: list[str] | None = None) -> pd.DataFrame:
+        """Add the nearest station and its distance to each sample.
+
+        :param data: samples with coordinates in degrees
+        :param lat_col: latitude column of the samples
+        :param lon_col: longitude column of the samples
+        :param max_distance_m: samples further than this from every station get no station
+        :param columns: station columns to copy onto each sample, e.g. ["weekly_average"]
+
+        :return: copy of data with nearest_station and station_distance_m columns added
+        """
+        positions, distances = self.nearest(data[lat_col].to_numpy(dtype=float), data[lon_col].to_numpy(dtype=float), max_distance_m)
+        matched = positions >= 0
+        nearest = self.stations.iloc[np.where(matched, positions, 0)].reset_index(drop=True)
+
+        output = data.copy()
+        output["nearest_station"] = nearest[self.id_col].where(matched).to_numpy()
+        output["station_distance_m"] = np.where(matched, distances, np.nan)
+        for column in columns or []:
+            output[f"station_{column}"] = nearest[column].where(matched).to_numpy()
+        return output
@@ -0,0 +1,87 @@
+"""Planning how an oversized request is divided into smaller ones.
+
+A request can be split along three dimensions: time, devices and metrics. Splitting by time
+keeps every device and metric together but repeats the request for every window. Splitting
+by device isolates heavy devices so that light ones are retrieved in a single call. Splitting
+by metric repeats the per row columns (timestamp, device, location) in every group. The
+planner estimates the number of calls each option needs and picks the smallest.
+"""
+import math
+
+# (devices, metrics, time windows) for each group of sub requests
+Plan = list[tuple[list[str], list[str] | None, int]]
+
+
+def plan_split(device_rows: dict[str, float], budget: float, metrics: list[str] | None = None, row_overhead: int = 0) -> Plan:
+    """Choose the split needing the fewest calls for a request known to be too large.
+
+    Request size is measured in cells: rows multiplied by columns per row. A row has one column
+    per metric plus row_overhead shared columns. Services without a metric dimension pass
+    metrics=None, and size is then measured in rows.
+
+    :param device_rows: estimated rows each device returns over the full time range
+    :param budget: largest size a single request can have
+    :param metrics: metrics requested, or None
+    :param row_overhead: columns present in every row regardless of the metrics requested
+
+    :return: devices, metrics and number of equal time windows for each group of sub requests
+    """
+    width = row_overhead + len(metrics) if metrics is not None else 1
+    candidates = [
+        _by_device(device_rows, budget, metrics, width),
+        _by_time(device_rows, budget, metrics, width),
+    ]
+    if metrics is not None and len(metrics) > 1:
+        candidates.append(_by_metric(device_rows, budget, metrics, row_overhead))
+
+    # a single call would repeat the request that was already too large
+    candidates = [plan for plan in candidates if count_calls(plan) > 1]
+
+    # min keeps the first of equal candidates: device splits cost nothing extra per row, metric splits do
+    return min(candidates, key=count_calls)
+
+
+def fallback_split(devices: list[str], metrics: list[str] | None = None) -> Plan:
+    """Split used before any response sizes are known. Halves the devices, or the time range for one device."""
+    if len(devices) > 1:
+        half = len(devices) // 2
+        return [(devices[:half], metrics, 1), (devices[half:], metrics, 1)]
+    return [(devices, metrics, 2)]
+
+
+def count_calls(plan: Plan) -> int:
+    return sum(windows for _, _, windows in plan)
+
+
+def _by_time(device_rows: dict[str, float], budget: float, metrics: list[str] | None, width: int) -> Plan:
+    total = sum(device_rows.values()) * width
+    return [(list(device_rows), metrics, max(2, math.ceil(total / budget)))]
+
+
+def _by_device(device_rows: dict[str, float], budget: float, metrics: list[str] | None, width: int) -> Plan:
+    """First fit decreasing bin packing of devices. Devices too large on their own are split by time."""
+    bins, plan = [], []
+    for device, rows in sorted(device_rows.items(), key=lambda item: item[1], reverse=True):
+        cells = rows * width
+        if cells > budget:
+            plan.append(([device], metrics, math.ceil(cells / budget)))
+            continue
+        for group in bins:
+            if group["cells"] + cells <= budget:
+                group["devices"].append(device)
+                group["cells"] += cells
+                break
+        else:
+            bins.append({"devices": [device], "cells": cells})
+
+    plan.extend((group["devices"], metrics, 1) for group in bins)
+    return plan
+
+
+def _by_metric(device_rows: dict[str, float], budget: float, metrics: list[str], row_overhead: int) -> Plan:
+    """Equal sized metric groups, each as large as the budget allows, split by time when one metric is too large."""
+    rows = sum(device_rows.values())
+    group_size = max(1, min(len(metrics), math.floor(budget / rows) - row_overhead)) if rows else len(metrics)
+    windows = max(1, math.ceil(rows * (row_overhead + group_size) / budget)) if rows else 1
+    groups = [metrics[i:i + group_size] for i in range(0, len(metrics), group_size)]
+    return [(list(device_rows), group, windows) for group in groups]
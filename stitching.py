@@ -0,0 +1,47 @@
+"""Joining the responses of a request that was split into several time windows.
+
+The services treat both ends of a time range as inclusive, so a record at a window boundary is
+returned by both neighbouring windows. The windows are concatenated once, ordered by their
+first record, and records whose key was already seen in an earlier window are dropped, so each
+record is assigned to the earliest window containing it.
+"""
+import numpy as np
+import pandas as pd
+
+
+def stitch(frames: list[pd.DataFrame], key_cols: list[str], time_col: str = "timestamp") -> pd.DataFrame:
+    """Concatenate window responses, removing records repeated across window boundaries.
+
+    :param frames: responses for each window. order does not matter
+    :param key_cols: columns identifying a record, e.g. device, sensor and timestamp. missing columns are ignored
+    :param time_col: column holding record times
+
+    :return: combined data with a fresh index
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    if time_col not in frames[0].columns:
+        return pd.concat(frames, ignore_index=True)
+
+    combined = pd.concat(frames, ignore_index=True)
+    times = pd.DatetimeIndex(_as_times(combined[time_col])).asi8  # compared as times, so differently formatted strings still match
+
+    # rows ordered by the first time of their window, keeping the order within each window
+    window = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+    window_first = np.minimum.reduceat(times, np.r_[0, np.cumsum([len(frame) for frame in frames])[:-1]])
+    order = np.argsort(window_first[window], kind="stable")
+    combined = combined.iloc[order].reset_index(drop=True)
+
+    keys = combined[[col for col in key_cols if col in combined.columns and col != time_col]]
+    keys = keys.assign(**{time_col: times[order]})
+    return combined[~keys.duplicated(keep="first").to_numpy()].reset_index(drop=True)
+
+
+def _as_times(column: pd.Series) -> pd.Series:
+    """Record times as UTC datetimes. Columns already holding datetimes are not reparsed."""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column.reset_index(drop=True)
+    return pd.to_datetime(column, utc=True, format="ISO8601").reset_index(drop=True)
@@ -1,16 +1,32 @@
-import datetime, requests, sys
-from dotenv import load_dotenv
+import datetime, logging, requests, sys
 import pandas as pd
+from instrumentation import emit, instrumented_request, timed_decode
+from splitting import fallback_split, plan_split
+from stitching import stitch
 from utils import require_env
 
+logger = logging.getLogger(__name__)
+
 class TellusClient:
     """Client object for interacting with the Tellus API."""
     HEADER = {'x-api-version': 'v2'}
     BASE_URL = 'https://api.tellusensors.com'
     all_analog_devices = [f"analog{i}.ch{j}" for i in range(2) for j in range(8)]
+    META_COLS = ["timestamp", "deviceId", "longitude", "latitude", "nickname"] # present in every row regardless of metrics
 
-    def __init__(self, api_key) -> None:
+    def __init__(self, api_key, use_arrow: bool = False, registry=None) -> None:
+        """
+        :param api_key: TELLUS API key
+        :param use_arrow: decode responses with arrow_json into Arrow backed columns. requires pyarrow
+        :param registry: metadata.MetadataRegistry caching `/schema` lookups (optional)
+        """
         self.api_key = api_key
+        self.use_arrow = use_arrow
+        self.registry = None
+        if registry is not None: registry.attach(self)
+        self._row_rates = {} # device id paired to the most rows per second it has returned
+        self._cell_budget = 0 # largest response (rows x columns) retrieved without a 413
+        self._limit_seen = False # whether any request has returned 413, i.e. whether the budget is near the limit
     
 
     def retrieve_data(self, start_time: str, end_time: str, devices: list, metrics: list, long_format: bool=True) -> pd.DataFrame:
@@ -21,7 +37,16 @@ class TellusClient:
         remaining parameter information detailed in _retrieve_data
         """
         api_output = self._retrieve_data(start_time, end_time, devices, metrics) # baseoutput
+        return self._format_output(api_output, start_time, metrics, long_format)
+
+    def _format_output(self, api_output: pd.DataFrame, start_time: str, metrics: list, long_format: bool) -> pd.DataFrame:
+        """Convert times, correct for the requested timezone and optionally reshape to long format.
+
+        :param api_output: output of _retrieve_data
+        :param start_time: ISO 8601 start time of the request. used for timezone information
 
+        remaining parameter information detailed in retrieve_data
+        """
         if api_output.empty: return api_output # in event of an error return the empty dataframe
 
         dt_obj_conversion = self.standardize_time(api_output) # convert time strings to dt_objs
@@ -36,74 +61,186 @@ class TellusClient:
         else: return dt_obj_conversion
 
 
-    def _retrieve_data(self, start_time: str, end_time: str, devices: list, metrics: list) -> pd.DataFrame:
+    def _retrieve_data(self, start_time: str, end_time: str, devices: list, metrics: list, split_depth: int = 0) -> pd.DataFrame:
         """Retrieve data for a specified timespan as a dataframe.
 
         Warning: TELLUS returns a 413 status code when the requested data set is too large.
-        This function will automatically split the time range and make additional API calls
+        This function will automatically split the request and make additional API calls
         to retrieve all data, but large time ranges may take a while.
+        Splits are made by device, metric or time, whichever needs the fewest calls based on
+        the size of earlier responses. Once a 413 has been seen, requests expected to exceed the
+        largest successful response are split before they are sent.
         If this poses an issue, manual adjustment of ranges is recommended.
         
         :param start_time: ISO 8601 format YYYY-MM-DDTHH:MM:SS+HH:MM
         :param end_time: ISO 8601 format YYYY-MM-DDTHH:MM:SS+HH:MM
         :param devices: device IDs
         :param metrics: metrics 
+        :param split_depth: number of times the original range has been split
 
         :return: Pandas dataframe with timestamp, location, device nickname, data, etc
         """
         endpoint = "data"
         host = f"{self.BASE_URL}/{endpoint}"
+        payload = self._data_payload(start_time, end_time, devices, metrics)
 
-        payload = {
-            "key": self.api_key,
-            "deviceId": ','.join(devices),
-            'start': start_time,
-            'end': end_time,
-            'metric': ",".join(metrics)
-        }
-        print(f"\tRetrieving TELLUS Data from {start_time} to {end_time}...")
-        response = requests.get(url=host, headers=self.HEADER, params=payload)
+        sub_requests = self._plan_ahead(start_time, end_time, devices, metrics)
+        if sub_requests:
+            logger.info(f"TELLUS data pull is expected to be too large for {start_time} to {end_time}. Splitting into {len(sub_requests)} requests...")
+            emit("split", "tellus", split_depth=split_depth + 1, reason="planned", parts=len(sub_requests))
+            return self._retrieve_split(sub_requests, split_depth)
+
+        logger.info(f"Retrieving TELLUS Data from {start_time} to {end_time}...")
+        response = instrumented_request("tellus", "GET", host, split_depth=split_depth, headers=self.HEADER, params=payload)
 
         if response.status_code == 200:
-            data = pd.DataFrame(response.json())
-            print(f"\tSuccess: Retrieved {data.shape[0]} records from {start_time} to {end_time}")
+            data = timed_decode("tellus", lambda: self._decode_data(response))
+            logger.info(f"Success: Retrieved {data.shape[0]} records from {start_time} to {end_time}")
+            self._learn(data, start_time, end_time)
             return data
 
         elif response.status_code == 403: 
-            print(f"Warning: {response.json()['detail']}")
+            logger.warning(response.json()['detail'])
             return pd.DataFrame()
 
         elif response.status_code == 413:
-            print(f"\tWarning: TELLUS data pull is too large (413 error) for {start_time} to {end_time}. Splitting range...")
-            
-            # Calculate midpoint
-            start_dt = pd.to_datetime(start_time)
-            end_dt = pd.to_datetime(end_time)
-            time_diff = end_dt - start_dt
-
-            mid_dt = start_dt + time_diff / 2
-            mid_time = mid_dt.strftime('%Y-%m-%dT%H:%M:%S%z') # ISO 8601 format
-            
-            # Recursively fetch split requests
-            first_half = self.retrieve_data(start_time, mid_time, devices, metrics)
-            second_half = self.retrieve_data(mid_time, end_time, devices, metrics)
-            
-            # Combine the results
-            combined_data = pd.concat([first_half, second_half], ignore_index=True)
-            print(f"\tSuccessfully combined data: {combined_data.shape[0]} total records")
-            return combined_data
+            sub_requests = self._plan_split(start_time, end_time, devices, metrics)
+            logger.warning(f"TELLUS data pull is too large (413 error) for {start_time} to {end_time}. Splitting into {len(sub_requests)} requests...")
+            emit("split", "tellus", split_depth=split_depth + 1, reason="413", parts=len(sub_requests))
+            return self._retrieve_split(sub_requests, split_depth)
         else:
-            print(f"\t {response.status_code}: {response.json()['detail']}")
+            logger.error(f"{response.status_code}: {response.json()['detail']}")
             sys.exit(1)
 
+    def _retrieve_split(self, sub_requests: list[tuple[list, list, str, str]], split_depth: int) -> pd.DataFrame:
+        """Retrieve the sub requests of a split and combine them."""
+        # Recursively fetch split requests
+        pieces = [
+            (sub_metrics, self._retrieve_data(sub_start, sub_end, sub_devices, sub_metrics, split_depth + 1))
+            for sub_devices, sub_metrics, sub_start, sub_end in sub_requests
+        ]
+        
+        # Combine the results
+        combined_data = self._combine_split(pieces)
+        logger.info(f"Successfully combined data: {combined_data.shape[0]} total records")
+        return combined_data
+
+
+    def _decode_data(self, response) -> pd.DataFrame:
+        """Convert a `/data` response body to a dataframe."""
+        if self.use_arrow:
+            from arrow_json import records_frame
+            return records_frame(response.content)
+        return pd.DataFrame(response.json())
+
+    def _data_payload(self, start_time: str, end_time: str, devices: list, metrics: list) -> dict:
+        """Query parameters for the `/data` endpoint."""
+        return {
+            "key": self.api_key,
+            "deviceId": ','.join(devices),
+            'start': start_time,
+            'end': end_time,
+            'metric': ",".join(metrics)
+        }
+
+    @staticmethod
+    def _split_range(start_time: str, end_time: str, parts: int) -> list[tuple[str, str]]:
+        """Divide a time range into equal windows.
+
+        :param start_time: ISO 8601 format YYYY-MM-DDTHH:MM:SS+HH:MM
+        :param end_time: ISO 8601 format YYYY-MM-DDTHH:MM:SS+HH:MM
+        :param parts: number of windows
+
+        :return: start and end of each window in ISO 8601 format
+        """
+        start_dt = pd.to_datetime(start_time)
+        step = (pd.to_datetime(end_time) - start_dt) / parts
+        inner = [(start_dt + step * i).strftime('%Y-%m-%dT%H:%M:%S%z') for i in range(1, parts)] # ISO 8601 format
+        boundaries = [start_time] + inner + [end_time]
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def _learn(self, data: pd.DataFrame, start_time: str, end_time: str) -> None:
+        """Record response size and device density for planning later splits."""
+        if data.empty: return
+        self._cell_budget = max(self._cell_budget, data.size)
+
+        span = (pd.to_datetime(end_time) - pd.to_datetime(start_time)).total_seconds()
+        if span <= 0 or "deviceId" not in data.columns: return
+        for device_id, rows in data["deviceId"].value_counts().items():
+            self._row_rates[device_id] = max(self._row_rates.get(device_id, 0), rows / span)
+
+    def _estimate_rows(self, start_time: str, end_time: str, devices: list) -> dict[str, float] | None:
+        """Rows each device is expected to return over a range, from earlier responses. None before any are known."""
+        if not self._row_rates: return None
+        known_rates = [self._row_rates[device_id] for device_id in devices if device_id in self._row_rates]
+        default_rate = max(known_rates or self._row_rates.values()) # assume unseen devices are as dense as the densest known one
+        span = (pd.to_datetime(end_time) - pd.to_datetime(start_time)).total_seconds()
+        return {device_id: self._row_rates.get(device_id, default_rate) * span for device_id in devices}
+
+    def _learned_plan(self, start_time: str, end_time: str, devices: list, metrics: list) -> list | None:
+        """Split sized by the learned cell budget. None when the request is not expected to exceed it."""
+        device_rows = self._estimate_rows(start_time, end_time, devices)
+        if not self._cell_budget or device_rows is None: return None
+        estimate = sum(device_rows.values()) * (len(self.META_COLS) + len(metrics))
+        if estimate <= self._cell_budget: return None
+        return plan_split(device_rows, self._cell_budget, metrics, len(self.META_COLS))
+
+    def _plan_ahead(self, start_time: str, end_time: str, devices: list, metrics: list) -> list[tuple[list, list, str, str]]:
+        """Split a request before sending it when, after an earlier 413, it is expected to be too large.
+
+        :return: devices, metrics, start and end of each sub request. empty when the request should be sent whole
+        """
+        plan = self._learned_plan(start_time, end_time, devices, metrics) if self._limit_seen else None
+        return self._sub_requests(plan, start_time, end_time) if plan else []
+
+    def _plan_split(self, start_time: str, end_time: str, devices: list, metrics: list) -> list[tuple[list, list, str, str]]:
+        """Decide how to divide a request that returned 413.
+
+        :return: devices, metrics, start and end of each sub request
+        """
+        self._limit_seen = True
+        plan = self._learned_plan(start_time, end_time, devices, metrics)
+        if plan is None: # nothing learned yet, or the estimates are contradicted by the 413
+            plan = fallback_split(devices, metrics)
+        return self._sub_requests(plan, start_time, end_time)
+
+    def _sub_requests(self, plan: list, start_time: str, end_time: str) -> list[tuple[list, list, str, str]]:
+        return [
+            (sub_devices, sub_metrics, sub_start, sub_end)
+            for sub_devices, sub_metrics, windows in plan
+            for sub_start, sub_end in self._split_range(start_time, end_time, windows)
+        ]
+
+    def _combine_split(self, pieces: list[tuple[list, pd.DataFrame]]) -> pd.DataFrame:
+        """Join the results of split requests. Pieces holding different metrics are merged column wise.
+
+        :param pieces: metrics requested paired to the retrieved data, for each sub request
+        """
+        by_metrics = {}
+        for sub_metrics, data in pieces:
+            if not data.empty:
+                by_metrics.setdefault(tuple(sub_metrics), []).append(data)
+        if not by_metrics: return pd.DataFrame()
+
+        frames = [stitch(group, ["deviceId", "timestamp"]) for group in by_metrics.values()] # removes records repeated at window boundaries
+        combined_data = frames[0]
+        for data in frames[1:]:
+            combined_data = combined_data.merge(data, on=self.META_COLS, how="outer")
+        return combined_data
 
     def retrieve_device_metrics(self, device_id: str) -> dict:
-        """Get all the metrics available for a given device.
+        """Get all the metrics available for a given device. Served from the registry when one is attached.
         
         :param device_id: The device id.
 
         :return: Metrics paired to their descriptions
         """
+        if self.registry is not None:
+            return self.registry.tellus_metrics([device_id]).get(device_id)
+        return self._retrieve_device_metrics(device_id)
+
+    def _retrieve_device_metrics(self, device_id: str) -> dict:
+        """Call `/schema` for a device. See retrieve_device_metrics"""
         endpoint = "schema"
         host = f"{self.BASE_URL}/{endpoint}"
 
@@ -112,18 +249,16 @@ class TellusClient:
             "deviceId": device_id
         }
 
-        response = requests.get(url=host, headers=self.HEADER, params=payload)
+        response = instrumented_request("tellus", "GET", host, headers=self.HEADER, params=payload)
 
         if response.status_code == 200:
-            data = response.json()["fields"]
-            output = {field["name"]: field["description"] for field in data}
-            return output
+            return self._parse_schema(response.json())
 
         elif response.status_code == 403: 
-            print(f"Warning: {response.json()['msg']}")
+            logger.warning(response.json()['msg'])
 
         else:
-            print(f"\t {response.status_code}: {response.json()['msg']}")
+            logger.error(f"{response.status_code}: {response.json()['msg']}")
             sys.exit(1)
 
     def retrieve_raw_request_data(self, device_ids: list[str],
@@ -156,6 +291,11 @@ class TellusClient:
         response = requests.get(url=host, headers=self.HEADER, params=payload)
         return response, payload
 
+    @staticmethod
+    def _parse_schema(schema: dict) -> dict:
+        """Pair each metric in a `/schema` response to its description."""
+        return {field["name"]: field["description"] for field in schema["fields"]}
+
     @staticmethod
     def long_format(data: pd.DataFrame, metrics: list[str]) -> pd.DataFrame:
         """Combine measurements into a single column. A new column is set up specifying the source sensor.
@@ -167,17 +307,7 @@ class TellusClient:
         """
         split_data = []
         for sensor in metrics:
-            sensor_df = data.loc[
-                :, 
-                [
-                    "timestamp", 
-                    "deviceId", 
-                    "longitude",
-                    "latitude",
-                    "nickname",
-                    sensor
-                ]
-            ]
+            sensor_df = data.loc[:, TellusClient.META_COLS + [sensor]]
             sensor_df.loc[:, "sensor"] = sensor
             sensor_df = sensor_df.rename(columns={sensor:"measurement"})
             split_data.append(sensor_df)
@@ -196,6 +326,8 @@ class TellusClient:
         return data
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv # only needed when run as a script
+    logging.basicConfig(level=logging.INFO, format="\t%(message)s")
     load_dotenv()
 
     ### TELLUS SETTINGS ###
@@ -1,9 +1,10 @@
 import pandas as pd
 from tellus import TellusClient
 from utils import extract_time_period, validate_date
+from qc import apply_qc
 import datetime
 
-def generate_geospatial_enabled_average(client: TellusClient, device_ids: list[str], start_day: str, end_day: str, metrics: list[str]=["sunrise.temperature"], time_zone_delta: int=-5):
+def generate_geospatial_enabled_average(client: TellusClient, device_ids: list[str], start_day: str, end_day: str, metrics: list[str]=["sunrise.temperature"], time_zone_delta: int=-5, qc_rules: dict | None=None):
     """Retrieve average per device for a time period. Retain location data in output.
 
     :param client: instantiated TellusClient object
@@ -12,10 +13,13 @@ def generate_geospatial_enabled_average(client: TellusClient, device_ids: list[s
     :param end_day: format YYYY-MM-DD
     :param metrics: sensors to retrieve data from. sunrise is the default.
     :param time_zone_delta: hour offset for the target timezone
+    :param qc_rules: qc.apply_qc rules. when given, readings failing any check are left out of the averages
 
     :return final_df: all data each day and device provided 
     """
     data = retrieve_data_between_days(client, device_ids=device_ids, start_day=start_day, end_day=end_day, metrics=metrics, time_zone_delta=time_zone_delta)
+    if qc_rules is not None:
+        data = data[apply_qc(data, qc_rules)["qc_flags"] == 0]
     night_data = extract_time_period(data, "02:00", "04:00")
 
     # extract out metadata for each tellus unit
@@ -36,7 +40,7 @@ def generate_geospatial_enabled_average(client: TellusClient, device_ids: list[s
 
     return final_df
 
-def generate_night_temperature_averages(client: TellusClient, device_ids: list[str], start_day: str, end_day: str, metrics: list[str]=["sunrise.temperature"], time_zone_delta: int=-5):
+def generate_night_temperature_averages(client: TellusClient, device_ids: list[str], start_day: str, end_day: str, metrics: list[str]=["sunrise.temperature"], time_zone_delta: int=-5, qc_rules: dict | None=None):
     """Calculate the average temperature from 2am-4am for each day and device provided.
 
     :param client: instantiated TellusClient object
@@ -45,10 +49,13 @@ def generate_night_temperature_averages(client: TellusClient, device_ids: list[s
     :param end_day: format YYYY-MM-DD
     :param metrics: sensors to retrieve data from. sunrise is the default.
     :param time_zone_delta: hour offset for the target timezone
+    :param qc_rules: qc.apply_qc rules. when given, readings failing any check are left out of the averages
 
     :return nightly_averages: the average temperature from 2am-4am for each day and device provided 
     """
     data = retrieve_data_between_days(client, device_ids=device_ids, start_day=start_day, end_day=end_day, metrics=metrics, time_zone_delta=time_zone_delta)
+    if qc_rules is not None:
+        data = data[apply_qc(data, qc_rules)["qc_flags"] == 0]
 
     night_data = extract_time_period(data, "02:00", "04:00")
     night_data["date"] = night_data["timestamp"].dt.date
@@ -69,6 +76,8 @@ def retrieve_data_between_days(client: TellusClient, device_ids: list[str], star
     """
     validate_date(start_day)
     validate_date(end_day)
+    if getattr(client, "registry", None) is not None:  # cached schemas, so restarts do not call `/schema` again
+        client.registry.validate_metrics(device_ids, metrics)
 
     start_time = pd.to_datetime(start_day)
     start_time = start_time.replace(tzinfo=datetime.timezone(datetime.timedelta(hours=time_zone_delta)))
@@ -85,4 +94,34 @@ def retrieve_data_between_days(client: TellusClient, device_ids: list[str], star
             responses.append(data)
 
     complete_df = pd.concat(responses, ignore_index=True)
-    return complete_df
\ No newline at end of file
+    return complete_df
+
+def generate_night_temperature_averages_from_rollups(store, device_ids: list[str], start_day: str, end_day: str, metrics: list[str]=["sunrise.temperature"], time_zone_delta: int=-5):
+    """Calculate the average temperature from 2am-4am for each day and device from hourly rollups. No data is downloaded.
+
+    Uses the 2am and 3am hourly buckets, so a sample exactly at 4:00 is not included.
+
+    :param store: rollups.RollupStore holding ingested Tellus data
+    :param device_ids: devices to include
+    :param start_day: format YYYY-MM-DD
+    :param end_day: format YYYY-MM-DD
+    :param metrics: sensors to include. sunrise is the default.
+    :param time_zone_delta: hour offset for the target timezone
+
+    :return nightly_averages: the average temperature from 2am-4am for each day and device provided
+    """
+    validate_date(start_day)
+    validate_date(end_day)
+
+    time_zone = datetime.timezone(datetime.timedelta(hours=time_zone_delta))
+    start_time = pd.Timestamp(start_day, tz=time_zone)
+    end_time = pd.Timestamp(end_day, tz=time_zone) + pd.Timedelta(hours=23)
+
+    hourly = store.query("tellus", "hour", start_time.isoformat(), end_time.isoformat(), devices=device_ids, metrics=metrics)
+    local_time = hourly["bucket"].dt.tz_convert(time_zone)
+    night = hourly[local_time.dt.hour.isin([2, 3])].copy()
+    night["date"] = local_time[night.index].dt.date
+
+    averages = store.aggregate(night, ["date", "device"])
+    pivot_table = averages.pivot(index="date", columns="device", values="mean").rename_axis(columns="deviceId")
+    return pivot_table
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))  # modules live at the repository root
+sys.path.insert(1, str(ROOT / "workflows"))  # workflows import their neighbours as top level modules
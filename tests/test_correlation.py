@@ -0,0 +1,18 @@
+import numpy as np
+
+from correlation import lag_matrix
+
+
+def test_lag_search_with_gaps_finds_the_shift_and_stays_within_one():
+    rng = np.random.default_rng(0)
+    walk = rng.normal(size=2000).cumsum()
+    matrix = np.column_stack([walk, np.roll(walk, 5) + rng.normal(size=2000) * 0.01, rng.normal(size=2000).cumsum()])
+    matrix[rng.random(matrix.shape) < 0.2] = np.nan
+
+    lag, correlation = lag_matrix(matrix, max_lag=50)
+    chunked_lag, chunked_correlation = lag_matrix(matrix, max_lag=50, chunk_columns=1)
+
+    assert lag[0, 1] == 5 and lag[1, 0] == -5
+    assert np.nanmax(np.abs(correlation)) <= 1
+    assert np.array_equal(lag, chunked_lag)
+    assert np.allclose(correlation, chunked_correlation, equal_nan=True)
@@ -0,0 +1,47 @@
+import datetime
+
+import pandas as pd
+
+from export import ExportWriter, run_export
+from ingest_daemon import TellusSource
+from mock_server import MockAPIServer, MockSettings, point_clients_at
+from tellus import TellusClient
+
+
+def export_csv(server, tmp_path, name, start, end):
+    client = TellusClient("any key")
+    point_clients_at(server.url, client)
+    with ExportWriter(tmp_path / name, "csv") as writer:
+        run_export([TellusSource(client, "DEVICE1", ["sunrise.co2"])], start, end, writer, chunk=datetime.timedelta(hours=12))
+    return pd.read_csv(tmp_path / name)
+
+
+def test_non_utc_start_exports_the_same_records(tmp_path):
+    utc_start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    offset_start = utc_start.astimezone(datetime.timezone(datetime.timedelta(hours=-5)))
+    end = utc_start + datetime.timedelta(days=2)
+
+    with MockAPIServer(MockSettings(sample_interval=60)) as server:
+        utc_export = export_csv(server, tmp_path, "utc.csv", utc_start, end)
+        offset_export = export_csv(server, tmp_path, "offset.csv", offset_start, end)
+
+    assert len(utc_export) == 2 * 24 * 60 + 1
+    assert offset_export["timestamp"].tolist() == utc_export["timestamp"].tolist()
+    assert pd.to_datetime(offset_export["timestamp"]).min() == pd.Timestamp(utc_start)
+
+
+def test_exports_into_one_directory_keep_earlier_files(tmp_path):
+    first_day = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    second_day = first_day + datetime.timedelta(days=1)
+
+    with MockAPIServer(MockSettings(sample_interval=600)) as server:
+        for start in (first_day, second_day):  # two runs, each numbering its chunks from zero
+            client = TellusClient("any key")
+            point_clients_at(server.url, client)
+            with ExportWriter(tmp_path / "dataset", "parquet", ["service"]) as writer:  # both runs write to service=tellus
+                run_export([TellusSource(client, "DEVICE1", ["sunrise.co2"])], start, start + datetime.timedelta(hours=23),
+                           writer, chunk=datetime.timedelta(hours=12))
+
+    exported = pd.read_parquet(tmp_path / "dataset")
+    assert sorted(exported["timestamp"].dt.day.unique()) == [1, 2]
+    assert len(exported) == 2 * (23 * 6 + 1)
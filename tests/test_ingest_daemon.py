@@ -0,0 +1,31 @@
+import pandas as pd
+
+from ingest_daemon import IngestStore
+
+
+def batch(rows):
+    return pd.DataFrame({
+        "device": "DEVICE1",
+        "metric": [metric for metric, _ in rows],
+        "timestamp": pd.to_datetime([time for _, time in rows], utc=True),
+        "value": 1.0,
+    })
+
+
+def test_records_at_the_watermark_arriving_later_are_kept(tmp_path):
+    store = IngestStore(tmp_path / "ingest.db")
+    try:
+        first = store.append("tellus", "DEVICE1", batch([("sunrise.co2", "2025-01-01 00:00"), ("sunrise.co2", "2025-01-01 00:01")]))
+        second = store.append("tellus", "DEVICE1", batch([
+            ("sunrise.co2", "2025-01-01 00:01"),          # already stored
+            ("sunrise.temperature", "2025-01-01 00:01"),  # same timestamp as the watermark, arrived later
+            ("sunrise.co2", "2025-01-01 00:02"),
+        ]))
+        stored = store.read("tellus", "DEVICE1")
+    finally:
+        store.close()
+
+    assert len(first) == 2
+    assert list(zip(second["metric"], second["timestamp"].dt.minute)) == [("sunrise.temperature", 1), ("sunrise.co2", 2)]
+    assert len(stored) == 4
+    assert (stored["metric"] == "sunrise.temperature").sum() == 1
@@ -0,0 +1,14 @@
+import pandas as pd
+
+from licor import LicorClient
+
+
+def test_sample_spacing_is_measured_per_logger():
+    client = LicorClient("any key")
+    times = pd.date_range("2025-01-01", periods=10, freq="60s", tz="UTC")
+    data = pd.DataFrame({  # two loggers sampling every minute, with clocks 30 seconds apart
+        LicorClient.LOGGER_COL: ["A"] * 10 + ["B"] * 10,
+        LicorClient.TIME_COL: list(times) + list(times + pd.Timedelta(seconds=30)),
+    })
+
+    assert client._sample_spacing(data) == 60
@@ -0,0 +1,26 @@
+import instrumentation
+from metadata import MetadataRegistry
+from mock_server import MockAPIServer, MockSettings, point_clients_at
+from tellus import TellusClient
+from tellus_workflows import retrieve_data_between_days
+
+
+def test_second_workflow_start_makes_no_metadata_requests(tmp_path):
+    endpoints = []
+    listener = lambda event: endpoints.append(event["endpoint"]) if event["event"] == "request_start" else None
+    instrumentation.add_listener(listener)
+    try:
+        with MockAPIServer(MockSettings(sample_interval=3600)) as server:
+            for _ in range(2):  # a new client and registry each start, as after a restart
+                client = TellusClient("any key", registry=MetadataRegistry(cache_path=tmp_path / "metadata.json"))
+                point_clients_at(server.url, client)
+                data = retrieve_data_between_days(client, ["DEVICE1"], "2025-01-01", "2025-01-01", ["sunrise.co2"])
+                assert not data.empty
+                endpoints.append("start")
+    finally:
+        instrumentation.remove_listener(listener)
+
+    first, second = " ".join(endpoints).split("start")[:2]
+    assert first.split().count("schema") == 1
+    assert "schema" not in second.split()
+    assert "data" in second.split()
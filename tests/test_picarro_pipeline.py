@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from picarro_pipeline import load_manifest, run_pipeline
+
+
+def write_run(path, start):
+    times = pd.date_range(start, periods=600, freq="s")
+    pd.DataFrame({"timestamp": times, "CH4_dry": 2 + np.random.default_rng(0).random(600), "CO2_dry": 400.0,
+                  "GPS_ABS_LAT": 41.7, "GPS_ABS_LONG": -86.2}).to_csv(path, index=False)
+
+
+def test_changed_run_moving_partition_removes_its_old_output(tmp_path):
+    run, output_dir = tmp_path / "run1.csv", tmp_path / "processed"
+    write_run(run, "2025-01-01 12:00")
+    run_pipeline([run], output_dir, workers=1)
+    write_run(run, "2025-01-05 12:00")  # same run, now dated another day
+    run_pipeline([run], output_dir, workers=1)
+
+    outputs = sorted(path.relative_to(output_dir).as_posix() for path in output_dir.rglob("run1.*"))
+    assert outputs == ["date=2025-01-05/run1.csv"]
+    assert load_manifest(output_dir)[str(run)]["outputs"] == outputs
+    assert not (output_dir / "date=2025-01-01").exists()
@@ -0,0 +1,19 @@
+import pandas as pd
+
+from rollups import RollupStore
+
+
+def test_query_returns_only_buckets_in_range():
+    store = RollupStore(":memory:")
+    times = pd.date_range("2025-01-01", periods=72, freq="h", tz="UTC")
+    store.ingest("tellus", pd.DataFrame({"timestamp": times, "deviceId": "DEVICE1", "sensor": "sunrise.co2", "measurement": 1.0}))
+
+    hourly = store.query("tellus", "hour", "2025-01-02T00:00:00-05:00", "2025-01-02T10:00:00Z")
+    daily = store.query("tellus", "day", "2025-01-02", "2025-01-03")
+    plan = store._connection.execute("EXPLAIN QUERY PLAN SELECT * FROM rollups WHERE service = 'tellus' "
+                                     "AND granularity = 'hour' AND bucket >= '2025' AND bucket <= '2026'").fetchall()
+    store.close()
+
+    assert hourly["bucket"].tolist() == list(pd.date_range("2025-01-02T05:00", "2025-01-02T10:00", freq="h", tz="UTC"))
+    assert daily["bucket"].dt.day.tolist() == [2, 3] and (daily["count"] == 24).all()
+    assert "rollups_by_bucket" in str(plan)
@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+
+from spatial import StationIndex
+
+
+def test_samples_without_coordinates_get_no_station():
+    stations = pd.DataFrame({"deviceId": ["A", "B"], "latitude": [41.70, 41.75], "longitude": [-86.24, -86.20]})
+    samples = pd.DataFrame({"Latitude": [41.701, np.nan, 41.749], "Longitude": [-86.241, -86.22, -86.201]})
+
+    matched = StationIndex(stations).match(samples)
+
+    assert matched["nearest_station"].tolist()[::2] == ["A", "B"]
+    assert pd.isna(matched["nearest_station"].iloc[1])
+    assert np.isnan(matched["station_distance_m"].iloc[1])
+    assert (matched["station_distance_m"].iloc[::2] < 200).all()
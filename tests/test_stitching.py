@@ -0,0 +1,14 @@
+import pandas as pd
+
+from stitching import stitch
+
+
+def test_boundary_records_are_kept_once_from_the_earliest_window():
+    early = pd.DataFrame({"deviceId": ["A", "A", "B"], "value": [1, 2, 3],
+                          "timestamp": ["2025-01-01T00:00:00Z", "2025-01-01T01:00:00Z", "2025-01-01T01:00:00Z"]})
+    late = pd.DataFrame({"deviceId": ["A", "B", "A"], "value": [9, 9, 4],  # the boundary repeated in another format
+                         "timestamp": ["2025-01-01T01:00:00+00:00", "2025-01-01T01:00:00.000Z", "2025-01-01T02:00:00Z"]})
+
+    stitched = stitch([late, early], ["deviceId", "timestamp"])
+
+    assert stitched["value"].tolist() == [1, 2, 3, 4]
@@ -0,0 +1,24 @@
+import instrumentation
+from mock_server import MockAPIServer, MockSettings, point_clients_at
+from tellus import TellusClient
+
+METRICS = ["sunrise.co2", "sunrise.temperature", "bme280.pressure"]
+
+
+def test_unseen_devices_are_split_before_sending_after_a_413():
+    statuses = []
+    listener = lambda event: statuses.append(event["status"]) if event["event"] == "request_end" else None
+    client = TellusClient("any key")
+    instrumentation.add_listener(listener)
+    try:
+        with MockAPIServer(MockSettings(sample_interval=60, tellus_max_cells=20000)) as server:
+            point_clients_at(server.url, client)
+            first = client.retrieve_data("2025-01-01T00:00:00+00:00", "2025-01-03T00:00:00+00:00", ["DEVICE1", "DEVICE2", "DEVICE3"], METRICS)
+            first_statuses, statuses[:] = list(statuses), []
+            second = client.retrieve_data("2025-01-01T00:00:00+00:00", "2025-01-03T00:00:00+00:00", ["DEVICE4", "DEVICE5", "DEVICE6"], METRICS)
+    finally:
+        instrumentation.remove_listener(listener)
+
+    assert 413 in first_statuses
+    assert statuses and 413 not in statuses
+    assert len(second) == len(first)
@@ -1,8 +1,11 @@
 import datetime, json, os, requests, sys, urllib3
 from datetime import datetime as dt, timedelta
+import numpy as np
 import pandas as pd
 urllib3.disable_warnings()  # Warnings occur each time a token is generated.
 
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+
 def get_new_token(auth_server_url, client_id, client_secret):
     """Obtain a new OAuth 2.0 token from the authentication server."""
     
@@ -32,24 +35,49 @@ def require_env(var_name):
         raise RuntimeError(f"Environment variable {var_name} is required")
     return value
 
-def extract_time_period(data: pd.DataFrame, start_time: str, end_time: str, time_col: str="timestamp") -> pd.DataFrame:
+def extract_time_period(data: pd.DataFrame, start_time: str, end_time: str, time_col: str | None="timestamp") -> pd.DataFrame:
     """Remove data from dataset that falls outside a specified daily period.
 
+    Both ends are included. When end_time is earlier than start_time the period wraps past
+    midnight, e.g. 22:00 to 04:00.
+
     :param data: TellusClient output
     :param start_time: start of the desired time period. format: HH:MM:SS
     :param end_time: end of the desired time period. format: HH:MM:SS
+    :param time_col: column holding datetimes. None uses the DatetimeIndex
+    """
+    return extract_time_periods(data, [(start_time, end_time)], time_col)
+
+def extract_time_periods(data: pd.DataFrame, windows: list[tuple[str, str]], time_col: str | None="timestamp") -> pd.DataFrame:
+    """Remove data from dataset that falls outside all of several daily periods.
+
+    Times of day are compared as integer nanoseconds since midnight (local wall time for timezone
+    aware data), so no per row time objects are created.
+
+    :param data: TellusClient output
+    :param windows: start and end of each period, as in extract_time_period
+    :param time_col: column holding datetimes. None uses the DatetimeIndex
     """
-    # generated relevant data
-    start_tobj = pd.to_datetime(start_time).time()
-    end_tobj = pd.to_datetime(end_time).time()
-    data_times = data[time_col].dt.time
+    times = pd.DatetimeIndex(data.index if time_col is None else data[time_col])
+    if times.tz is not None: times = times.tz_localize(None) # wall clock times
+    time_of_day = np.mod(times.as_unit("ns").asi8, NS_PER_DAY)
 
     # create mask
-    mask = (data_times >= start_tobj) & (data_times <= end_tobj)
+    mask = np.zeros(len(times), dtype=bool)
+    for start_time, end_time in windows:
+        start, end = _time_of_day_ns(start_time), _time_of_day_ns(end_time)
+        if start <= end: mask |= (time_of_day >= start) & (time_of_day <= end)
+        else: mask |= (time_of_day >= start) | (time_of_day <= end) # wraps past midnight
+    mask &= ~times.isna()
 
     # apply mask
     return data[mask]
 
+def _time_of_day_ns(value: str | datetime.time) -> int:
+    """Nanoseconds since midnight for a HH:MM[:SS[.ffffff]] string or time object."""
+    tobj = value if isinstance(value, datetime.time) else pd.to_datetime(value).time()
+    return ((tobj.hour * 60 + tobj.minute) * 60 + tobj.second) * 10**9 + tobj.microsecond * 1000
+
 def validate_date(date_str: str) -> None:
     """Ensures that the date provided is of "YYYY-MM-DD" format.
 
@@ -1,12 +1,14 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import scipy.signal
-import seaborn as sns
-import datetime
 from math import ceil
 
 PICARO_DATA_INPUT_PATH = "C:\\Users\\sevmy\\OneDrive\\Documents\\ND\\Golf Cart\\picaro_data\\picaro_sept_15.csv"
 OUTPUT_PATH = "picaro_methane.csv"
+SAMPLE_INTERVAL = pd.Timedelta("6 seconds")
+MAX_GAP = pd.Timedelta("30 seconds") # longer dropouts are not interpolated. the series is split at them instead
+TIME_ZONE_DELTA = -5 # hours
+FILTER_ORDER = 3
+MIN_FILTER_SAMPLES = 3 * (FILTER_ORDER + 1) + 1 # filtfilt needs more samples than its padding of 3 x filter length
 
 def lowpass_butterworth(data: pd.Series, sampling_freq: int, cutoff_freq: int) -> pd.Series:
     """Apply a buttworth filter to extract out signal below a specified cutt off frequency.
@@ -17,63 +19,135 @@ def lowpass_butterworth(data: pd.Series, sampling_freq: int, cutoff_freq: int) -
 
     :return: background drift
     """
+    import scipy.signal
+
     nyquist_freq = sampling_freq/2
     normalized_cutt_off = cutoff_freq/nyquist_freq
 
     b, a = scipy.signal.butter(
-        N=3, 
+        N=FILTER_ORDER, 
         btype="lowpass", 
         Wn=normalized_cutt_off
     )
 
     extracted_signal = scipy.signal.filtfilt(b, a, data) #filter applied forward & backward to remove time shift
     return extracted_signal
-        
-if __name__ == "__main__":
-    ### IMPORT DATA ###
-    picaro_data = pd.read_csv(PICARO_DATA_FILEPATH).drop("Unnamed: 0", axis=1)
+
+def load_picarro_data(path: str) -> pd.DataFrame:
+    """Read a Picarro run. CSV files are read directly, anything else as whitespace separated instrument output.
+
+    :param path: path to the run
+    :return: raw samples with timestamp converted to datetime objects
+    """
+    if str(path).lower().endswith(".csv"): picaro_data = pd.read_csv(path)
+    else: picaro_data = pd.read_csv(path, sep=r"\s+")
+    picaro_data = picaro_data.drop(columns=["Unnamed: 0"], errors="ignore") # index column left by earlier exports
+    if "timestamp" not in picaro_data.columns: picaro_data["timestamp"] = picaro_data["DATE"] + " " + picaro_data["TIME"] # raw instrument output
     picaro_data["timestamp"] = pd.to_datetime(picaro_data["timestamp"])
-    picaro_data["timestamp"] = picaro_data["timestamp"].apply(lambda entry: entry + datetime.timedelta(hours=-5))
-    core_data = picaro_data[["timestamp", "CH4_dry", "CO2_dry", "GPS_ABS_LAT", "GPS_ABS_LONG"]].set_index("timestamp")
+    return picaro_data
 
-    ### STANDARDIZE TIMES ###
-    frequency = pd.Timedelta("6 seconds")
-    regular_intervals = core_data.resample(frequency).mean().interpolate()
+def process_picarro_data(picaro_data: pd.DataFrame, time_zone_delta: int=TIME_ZONE_DELTA) -> pd.DataFrame:
+    """Resample a Picarro run to regular intervals, denoise it and remove the background methane level.
 
-    ### DENOISE ###
-    sensor_freq = 1/6 #.167
-    cut_off_freq = 1/120 # 1 oscillation per 1 minute
-    regular_intervals["denoised"] = lowpass_butterworth(regular_intervals["CH4_dry"], sensor_freq, cut_off_freq)
+    :param picaro_data: output of load_picarro_data
+    :param time_zone_delta: hour offset for the target timezone
 
-    ### BACKGROUND DRIFT EXTRACTION ###
-    sensor_freq = 1/6 #.167
-    cut_off_freq = 1/7200 # 1 oscillation per 3 hours
-    regular_intervals["CH4_background"] = lowpass_butterworth(regular_intervals["denoised"], sensor_freq, cut_off_freq)
-    regular_intervals["CH4_delta"] = regular_intervals["denoised"] - regular_intervals["CH4_background"]
+    :return: timestamp, Latitude, Longitude, CH4 (methane above background, ppm) and segment (see resample_segments)
+    """
+    picaro_data = picaro_data.assign(timestamp=picaro_data["timestamp"] + pd.Timedelta(hours=time_zone_delta))
+    core_data = picaro_data[["timestamp", "CH4_dry", "CO2_dry", "GPS_ABS_LAT", "GPS_ABS_LONG"]].set_index("timestamp")
 
-    sns.lineplot(data=regular_intervals, x="timestamp", y="CH4_delta")
-    plt.xticks(rotation=30)
-    plt.title("Picaro Methane Data (Background Removed, Lowpass Smoothing)")
-    plt.ylabel("Methane Delta (ppm)")
+    ### STANDARDIZE TIMES ###
+    regular_intervals = resample_segments(core_data, SAMPLE_INTERVAL, MAX_GAP)
+
+    ### FILTER EACH SEGMENT ###
+    filtered = [filter_segment(segment) for _, segment in regular_intervals.groupby("segment", sort=False)]
+    regular_intervals = pd.concat(filtered) if filtered else regular_intervals.assign(CH4_delta=pd.Series(dtype=float))
 
-    output_df = regular_intervals.reset_index()[["timestamp", "GPS_ABS_LAT", "GPS_ABS_LONG", "CH4_delta"]]
+    output_df = regular_intervals.reset_index()[["timestamp", "GPS_ABS_LAT", "GPS_ABS_LONG", "CH4_delta", "segment"]]
     output_df = output_df.rename(columns={
         "GPS_ABS_LAT":"Latitude",
         "GPS_ABS_LONG":"Longitude",
         "CH4_delta":"CH4",
         })
-    output_df.to_csv("picaro_methane.csv")
-
-
-
+    return output_df
 
+def resample_segments(core_data: pd.DataFrame, interval: pd.Timedelta=SAMPLE_INTERVAL, max_gap: pd.Timedelta=MAX_GAP) -> pd.DataFrame:
+    """Average samples onto a regular grid, interpolating only across short gaps.
 
+    Wherever consecutive samples are more than max_gap apart, the series is split into a new segment.
+    Grid points inside those gaps are dropped rather than filled with invented values.
 
+    :param core_data: samples indexed by timestamp
+    :param interval: grid spacing
+    :param max_gap: longest gap that is interpolated
 
+    :return: regular intervals with a "segment" column numbering the continuous runs from 0
+    """
+    core_data = core_data[core_data.index.notna()].sort_index()
+    if core_data.empty: return core_data.assign(segment=pd.Series(dtype="int64"))
+
+    # segment boundaries from the raw sample spacing
+    times = core_data.index.to_numpy()
+    breaks = np.flatnonzero(np.diff(times) > max_gap.to_timedelta64())
+    segment_starts = times[np.r_[0, breaks + 1]]
+    segment_ends = times[np.r_[breaks, len(times) - 1]]
+
+    # a grid point belongs to the last segment starting before its bin ends, if that segment has not ended before it
+    binned = core_data.resample(interval).mean()
+    bins = binned.index.to_numpy()
+    segment = np.searchsorted(segment_starts, bins + interval.to_timedelta64(), side="left") - 1
+    inside = bins <= segment_ends[segment]
+    binned = binned[inside]
+    segment = pd.Series(segment[inside], index=binned.index)
+
+    # interpolate only between values of the same segment. a column missing at a segment edge stays missing
+    interpolated = binned.interpolate()
+    for column in binned.columns:
+        valid_segment = segment.where(binned[column].notna())
+        same_segment = (valid_segment.ffill() == segment) & (valid_segment.bfill() == segment)
+        interpolated[column] = interpolated[column].where(same_segment)
+    interpolated["segment"] = segment
+    return interpolated
+
+def filter_segment(segment: pd.DataFrame) -> pd.DataFrame:
+    """Denoise a continuous segment and remove its background methane level.
+
+    Segments too short for the filter are left unfiltered: denoised is the raw value and, since no
+    background can be estimated, CH4_background and CH4_delta are NaN.
+
+    :param segment: regular intervals of one segment with a CH4_dry column
+    :return: segment with denoised, CH4_background and CH4_delta columns
+    """
+    segment = segment.copy()
+    if len(segment) < MIN_FILTER_SAMPLES:
+        segment["denoised"] = segment["CH4_dry"]
+        segment["CH4_background"] = np.nan
+        segment["CH4_delta"] = np.nan
+        return segment
 
+    ### DENOISE ###
+    sensor_freq = 1/6 #.167
+    cut_off_freq = 1/120 # 1 oscillation per 1 minute
+    segment["denoised"] = lowpass_butterworth(segment["CH4_dry"], sensor_freq, cut_off_freq)
 
+    ### BACKGROUND DRIFT EXTRACTION ###
+    sensor_freq = 1/6 #.167
+    cut_off_freq = 1/7200 # 1 oscillation per 3 hours
+    segment["CH4_background"] = lowpass_butterworth(segment["denoised"], sensor_freq, cut_off_freq)
+    segment["CH4_delta"] = segment["denoised"] - segment["CH4_background"]
+    return segment
 
-    
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
+    picaro_data = load_picarro_data(PICARO_DATA_INPUT_PATH)
+    output_df = process_picarro_data(picaro_data)
 
+    sns.lineplot(data=output_df, x="timestamp", y="CH4")
+    plt.xticks(rotation=30)
+    plt.title("Picaro Methane Data (Background Removed, Lowpass Smoothing)")
+    plt.ylabel("Methane Delta (ppm)")
 
+    output_df.to_csv(OUTPUT_PATH)
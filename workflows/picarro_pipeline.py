@@ -0,0 +1,205 @@
+"""Process many Picarro runs in parallel with methane_data_processing.process_picarro_data.
+
+    python picarro_pipeline.py "drives/2025-*/*.csv" --output processed --workers 8
+
+Inputs may be files, directories (every .csv and .dat inside) or glob patterns. Each run is
+processed in its own process and written to output/date=YYYY-MM-DD/<run name>.<format>, using
+the date of the run's first sample. output/manifest.json records, for every input, the size,
+modification time and SHA-256 hash it was processed at, along with its output files.
+
+On a re-run, inputs with the same size and modification time are skipped. When only the
+modification time changed, the file is hashed, and skipped if its contents are the same.
+--force reprocesses everything.
+"""
+import argparse, datetime, glob, hashlib, json, logging, os, sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from methane_data_processing import MAX_GAP, SAMPLE_INTERVAL, TIME_ZONE_DELTA, load_picarro_data, process_picarro_data
+
+logger = logging.getLogger(__name__)
+
+INPUT_SUFFIXES = {".csv", ".dat"}
+MANIFEST_NAME = "manifest.json"
+
+
+### INPUTS ###
+def find_inputs(patterns: list[str]) -> list[Path]:
+    """Expand files, directories and glob patterns into a sorted list of run files."""
+    paths = set()
+    for pattern in patterns:
+        for match in glob.glob(pattern, recursive=True) or [pattern]:
+            path = Path(match)
+            if path.is_dir():
+                paths.update(child for child in path.iterdir() if child.suffix.lower() in INPUT_SUFFIXES)
+            elif path.is_file():
+                paths.add(path)
+            else:
+                logger.warning(f"No input found at {match}")
+    return sorted(path.resolve() for path in paths)
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as infile:
+        for block in iter(lambda: infile.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+### MANIFEST ###
+def load_manifest(output_dir: Path) -> dict:
+    path = output_dir / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path) as infile:
+        return json.load(infile)
+
+
+def save_manifest(output_dir: Path, manifest: dict) -> None:
+    """Write the manifest atomically so an interrupted run never leaves it half written."""
+    temporary = output_dir / (MANIFEST_NAME + ".tmp")
+    with open(temporary, "w") as outfile:
+        json.dump(manifest, outfile, indent=2, sort_keys=True)
+    os.replace(temporary, output_dir / MANIFEST_NAME)
+
+
+def settings_signature(file_format: str, time_zone_delta: int) -> dict:
+    """Processing settings stored with each entry. A change in any of them invalidates earlier outputs."""
+    return {"format": file_format, "time_zone_delta": time_zone_delta, "sample_interval": str(SAMPLE_INTERVAL),
+            "max_gap": str(MAX_GAP)}
+
+
+def is_unchanged(path: Path, entry: dict | None, settings: dict, output_dir: Path) -> bool:
+    """Whether an input was already processed in its current state with the current settings.
+
+    Size and modification time are compared first. The file is only hashed when its size matches
+    but its modification time does not, and the entry's modification time is refreshed on a match.
+    """
+    if not entry or entry.get("settings") != settings:
+        return False
+    if not all((output_dir / output).exists() for output in entry["outputs"]):
+        return False
+
+    stat = path.stat()
+    if stat.st_size != entry["size"]:
+        return False
+    if stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    if file_hash(path) == entry["sha256"]:
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+    return False
+
+
+### PROCESSING ###
+def remove_outputs(output_dir: Path, outputs: list[str]) -> None:
+    """Delete output files, and partition directories left empty by their removal."""
+    for output in outputs:
+        target = output_dir / output
+        target.unlink(missing_ok=True)
+        if target.parent != output_dir and target.parent.is_dir() and not any(target.parent.iterdir()):
+            target.parent.rmdir()
+
+
+def process_run(path: Path, output_dir: Path, file_format: str, time_zone_delta: int, previous_outputs: list[str] | None = None) -> dict:
+    """Process one run and write its output. Runs in a worker process.
+
+    :param previous_outputs: outputs recorded for the input by an earlier run. removed before the new
+        ones are written, since a changed input may move to another date partition
+
+    :return: manifest entry for the input, without settings
+    """
+    stat = path.stat()
+    sha256 = file_hash(path)
+    output_df = process_picarro_data(load_picarro_data(path), time_zone_delta)
+    remove_outputs(output_dir, previous_outputs or [])
+
+    run_date = output_df["timestamp"].min().strftime("%Y-%m-%d") if not output_df.empty else "unknown"
+    output = Path(f"date={run_date}") / f"{path.stem}.{file_format}"
+    (output_dir / output).parent.mkdir(parents=True, exist_ok=True)
+    if file_format == "parquet": output_df.to_parquet(output_dir / output, index=False)
+    else: output_df.to_csv(output_dir / output, index=False)
+
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256,
+        "outputs": [output.as_posix()],
+        "rows": len(output_df),
+        "processed_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def run_pipeline(inputs: list[Path], output_dir: Path, workers: int | None = None, file_format: str = "csv",
+                 time_zone_delta: int = TIME_ZONE_DELTA, force: bool = False) -> dict[str, str]:
+    """Process every changed input across a process pool, updating the manifest as each run finishes.
+
+    :param inputs: run files
+    :param output_dir: root of the partitioned output
+    :param workers: worker processes. one per core by default
+    :param file_format: "csv" or "parquet"
+    :param time_zone_delta: hour offset for the target timezone
+    :param force: reprocess inputs that are unchanged
+
+    :return: input path paired to "processed", "skipped" or "failed"
+    """
+    names = [path.stem for path in inputs]
+    repeated = sorted({name for name in names if names.count(name) > 1})
+    if repeated:
+        raise ValueError(f"Run names must be unique, since they name the outputs. Repeated: {repeated}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    settings = settings_signature(file_format, time_zone_delta)
+
+    status = {}
+    pending = []
+    for path in inputs:
+        if not force and is_unchanged(path, manifest.get(str(path)), settings, output_dir):
+            status[str(path)] = "skipped"
+        else:
+            pending.append(path)
+    logger.info(f"{len(pending)} runs to process, {len(status)} unchanged")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_run, path, output_dir, file_format, time_zone_delta, manifest.get(str(path), {}).get("outputs", [])): path
+            for path in pending
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                entry = future.result()
+            except Exception:
+                logger.exception(f"{path.name}: processing failed")
+                status[str(path)] = "failed"
+                continue
+            manifest[str(path)] = {**entry, "settings": settings}
+            save_manifest(output_dir, manifest)  # saved after every run so an interrupted pipeline keeps its progress
+            status[str(path)] = "processed"
+            logger.info(f"{path.name}: {entry['rows']} rows written to {entry['outputs'][0]}")
+
+    save_manifest(output_dir, manifest)  # persists refreshed modification times of skipped inputs
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process Picarro runs in parallel.")
+    parser.add_argument("inputs", nargs="+", help="files, directories or glob patterns")
+    parser.add_argument("--output", type=Path, default=Path("processed"), help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes. one per core by default")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--time-zone-delta", type=int, default=TIME_ZONE_DELTA, help="hour offset for the target timezone")
+    parser.add_argument("--force", action="store_true", help="reprocess unchanged inputs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="\t%(message)s")
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        parser.error("No input files found")
+
+    status = run_pipeline(inputs, args.output, args.workers, args.format, args.time_zone_delta, args.force)
+    counts = {outcome: list(status.values()).count(outcome) for outcome in ["processed", "skipped", "failed"]}
+    logger.info(f"Processed {counts['processed']}, skipped {counts['skipped']}, failed {counts['failed']}")
+    sys.exit(1 if counts["failed"] else 0)
@@ -1,7 +1,4 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import scipy.signal
-import seaborn as sns
 import datetime
 from math import ceil
 
@@ -40,6 +37,8 @@ def lowpass_butterworth(data: pd.Series, sampling_freq: int, cutoff_freq: int) -
 
     :return: background drift
     """
+    import scipy.signal
+
     nyquist_freq = sampling_freq/2
     normalized_cutt_off = cutoff_freq/nyquist_freq
 
@@ -54,6 +53,9 @@ def lowpass_butterworth(data: pd.Series, sampling_freq: int, cutoff_freq: int) -
         
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     ### IMPORT DATA ###
     picaro_data = pd.read_csv(DETRENDED_DATA_FILEPATH).drop("Unnamed: 0", axis=1)
     picaro_data["timestamp"] = pd.to_datetime(picaro_data["timestamp"])